@@ -83,8 +83,14 @@ def execute_task(task: ExecutionTask):
 		run_dbastar(str(env), str(result_folder), task.timelimit, mycfg, "scp")
 		visualize_files = [p.name for p in result_folder.glob('result_*')]
 		check_files = [p.name for p in result_folder.glob('result_opt*')]
+	elif task.alg == "dbAstar-ilqr":
+		run_dbastar(str(env), str(result_folder), task.timelimit, mycfg, "ilqr")
+		visualize_files = [p.name for p in result_folder.glob('result_*')]
+		check_files = [p.name for p in result_folder.glob('result_opt*')]
 	elif task.alg == "komo":
-		run_komo_standalone(str(env), str(result_folder), task.timelimit, mycfg["rai_cfg"])
+		run_komo_standalone(str(env), str(result_folder), task.timelimit, mycfg["rai_cfg"],
+			search=mycfg.get("komo_search", "binarySearch"),
+			workers=mycfg.get("search_workers", 1))
 		visualize_files = [p.name for p in result_folder.glob('result_*')]
 		check_files = [p.name for p in result_folder.glob('result_komo*')]
 	elif task.alg == "scp":
@@ -126,6 +132,7 @@ def main():
 		"komo",
 		"dbAstar-komo",
 		# "dbAstar-scp",
+		# "dbAstar-ilqr",
 	]
 	trials = 10
 	timelimit = 5 * 60
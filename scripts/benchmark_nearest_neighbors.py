@@ -0,0 +1,83 @@
+"""Compare the nearest neighbor data structures of db-A* on all benchmark instances
+
+For each instance, db-A* plans with the same motions and delta using each
+data structure ("table" uses the applicability table for the motions). Since
+all of them answer radius queries exactly, the costs should be identical;
+only the planning time differs.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+sys.path.append(os.getcwd())
+from motionplanningutils import DBAstar
+from utils_motion_primitives import load_motions
+
+NEAREST_NEIGHBORS = ["gnat", "sqrtapprox", "grid", "table"]
+
+
+def benchmark_instance(filename_env, motions, nearest_neighbors, delta, trials):
+	dbastar = DBAstar()
+	if nearest_neighbors == "table":
+		dbastar.setApplicabilityTable(True)
+	else:
+		dbastar.setNearestNeighbors(nearest_neighbors)
+	dbastar.loadEnvironment(str(filename_env))
+	dbastar.addMotions(
+		[np.asarray(m["states"], dtype=np.float64) for m in motions],
+		[np.asarray(m["actions"], dtype=np.float64) for m in motions])
+	durations = []
+	cost = None
+	for _ in range(trials):
+		start = time.time()
+		success = dbastar.plan(delta, 1.0, 0.5, True)
+		durations.append(time.time() - start)
+		cost = dbastar.cost() if success else None
+	return {"duration": float(np.median(durations)), "cost": cost, "delta": dbastar.delta()}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--benchmark", default="../benchmark", help="folder with benchmark instances")
+	parser.add_argument("--motions", default="../cloud/motions", help="folder with motion libraries ({robot_type}_sorted.mlib)")
+	parser.add_argument("--num_motions", type=int, default=1000, help="number of motions to use")
+	parser.add_argument("--delta", type=float, default=-10, help="delta (negative to auto-compute with given k)")
+	parser.add_argument("--trials", type=int, default=3, help="number of trials (median duration is reported)")
+	parser.add_argument("--output", default="../results/nearest_neighbors.yaml", help="output file (yaml)")
+	args = parser.parse_args()
+
+	results = dict()
+	for filename_env in sorted(Path(args.benchmark).glob("*/*.yaml")):
+		with open(filename_env) as f:
+			robot_type = yaml.safe_load(f)["robots"][0]["type"]
+		filename_motions = Path(args.motions) / "{}_sorted.mlib".format(robot_type)
+		if not filename_motions.exists():
+			filename_motions = filename_motions.with_suffix(".msgpack")
+		if not filename_motions.exists():
+			print("Skipping {} (no motions for {})".format(filename_env, robot_type))
+			continue
+		motions = load_motions(str(filename_motions))[0:args.num_motions]
+
+		instance = "{}/{}".format(filename_env.parent.name, filename_env.stem)
+		results[instance] = dict()
+		for nearest_neighbors in NEAREST_NEIGHBORS:
+			# auto-computed delta depends on random samples; use the first one for all
+			delta = args.delta if len(results[instance]) == 0 else results[instance][NEAREST_NEIGHBORS[0]]["delta"]
+			results[instance][nearest_neighbors] = benchmark_instance(filename_env, motions, nearest_neighbors, delta, args.trials)
+
+		print(instance)
+		for nearest_neighbors, result in results[instance].items():
+			print("  {:12s} {:8.3f} s  cost: {}".format(nearest_neighbors, result["duration"], result["cost"]))
+
+	Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+	with open(args.output, 'w') as f:
+		yaml.dump(results, f)
+
+
+if __name__ == "__main__":
+	main()
@@ -1,6 +1,8 @@
 import argparse
+import functools
 import yaml
 import numpy as np
+import jax
 
 import sys
 import os
@@ -9,6 +11,52 @@ from motionplanningutils import CollisionChecker, RobotHelper
 import robots
 
 
+@functools.lru_cache(maxsize=None)
+def _compiled_robot(robot_type: str):
+	# dynamics and state limits for all timesteps at once (jax compiles once
+	# per robot type and trajectory length)
+	robot = robots.create_robot(robot_type)
+	return robot, jax.jit(jax.vmap(robot.step)), jax.jit(jax.vmap(robot.valid_state))
+
+
+def check_trajectory(robot_type: str, states, actions, cc=None) -> dict:
+	"""Checks all timesteps of a trajectory at once
+
+	Returns a dict with boolean masks (True if valid) for the dynamics (T-1,
+	whether states[t+1] follows from states[t] and actions[t]), the state
+	limits (T), the action limits (T-1), and, if a CollisionChecker cc is
+	given, collisions (T, up to 3cm violation). "valid" (T) combines them per
+	timestep. Additionally, contains the desired states (T-1) and distances (T)
+	for diagnostics.
+	"""
+	robot, step, valid_state = _compiled_robot(robot_type)
+	states = np.asarray(states)
+	actions = np.asarray(actions)
+	T = states.shape[0]
+
+	states_desired = np.asarray(step(states[:-1], actions))
+	# same as np.allclose(states[t+1], states_desired[t], rtol=0.01, atol=1e-2) for each t
+	dynamics = np.all(np.abs(states[1:] - states_desired) <= 1e-2 + 0.01 * np.abs(states_desired), axis=1)
+	state_limits = np.asarray(valid_state(states))
+	action_limits = np.all((actions <= robot.max_u + 1e-2) & (actions >= robot.min_u - 1e-2), axis=1)
+
+	valid = state_limits.copy()
+	valid[:-1] &= dynamics & action_limits
+	result = {
+		"valid": valid,
+		"dynamics": dynamics,
+		"state_limits": state_limits,
+		"action_limits": action_limits,
+		"states_desired": states_desired,
+	}
+	if cc is not None:
+		dists, _, _ = cc.distance_batch(states)
+		result["collisions"] = dists >= -0.03 # allow up to 3cm violation
+		result["distances"] = dists
+		valid &= result["collisions"]
+	return result
+
+
 def extract_valid_motions(filename_env: str, filename_result: str, validity_checked=False):
 	# read robot type
 	with open(filename_env) as f:
@@ -17,9 +65,6 @@ def extract_valid_motions(filename_env: str, filename_result: str, validity_chec
 	robot_node = env["robots"][0]
 	robot = robots.create_robot(robot_node["type"])
 
-	def check_array(a, b):
-		return np.allclose(a, b, rtol=0.01, atol=1e-2)
-
 	# load result
 	with open(filename_result) as f:
 		result = yaml.safe_load(f)
@@ -31,17 +76,8 @@ def extract_valid_motions(filename_env: str, filename_result: str, validity_chec
 	T = states.shape[0]
 	valid = np.full((T,), True)
 	if not validity_checked:
-		for t in range(T-1):
-			state_desired = robot.step(states[t], actions[t])
-			valid[t] &= check_array(states[t+1], state_desired)
-		# state limits
-		for t in range(T):
-			if not robot.valid_state(states[t]):
-				valid[t] = False
-		# action limits
-		for t in range(T-1):
-			if (actions[t] > robot.max_u + 1e-2).any() or (actions[t] < robot.min_u - 1e-2).any():
-				valid[t] = False
+		# dynamics, state limits, and action limits
+		valid = check_trajectory(robot_node["type"], states, actions)["valid"]
 
 	motions = []
 	start_t = 0
@@ -119,26 +155,24 @@ def check(filename_env: str, filename_result: str, file = None, expected_T=None)
 	
 	success &= check_array(states[0], x0, "start state")
 	success &= check_array(states[-1], xf, "end state")
-	# dynamics
 	T = states.shape[0]
-	for t in range(T-1):
-		state_desired = robot.step(states[t], actions[t])
-		success &= check_array(states[t+1], state_desired, "Wrong dynamics at t={}".format(t))
-	# state limits
-	for t in range(T):
-		if not robot.valid_state(states[t]):
+	if states.shape[1] == len(robot.state_desc) and actions.shape == (T-1, len(robot.action_desc)):
+		checks = check_trajectory(robot_node["type"], states, actions, cc)
+		# dynamics
+		for t in np.flatnonzero(~checks["dynamics"]):
+			check_array(states[t+1], checks["states_desired"][t], "Wrong dynamics at t={}".format(t))
+			success = False
+		# state limits
+		for t in np.flatnonzero(~checks["state_limits"]):
 			print("State invalid at t={} ({})".format(t, states[t]), file=file)
 			success = False
-	# action limits
-	for t in range(T-1):
-		if (actions[t] > robot.max_u + 1e-2).any() or (actions[t] < robot.min_u - 1e-2).any():
+		# action limits
+		for t in np.flatnonzero(~checks["action_limits"]):
 			print("Action outside bounds at t={} ({})".format(t, actions[t]), file=file)
 			success = False
-	# collisions
-	for t in range(T):
-		dist, _, _ = cc.distance(states[t])
-		if dist < -0.03: # allow up to 3cm violation
-			print("Collision at t={} ({})".format(t, dist), file=file)
+		# collisions
+		for t in np.flatnonzero(~checks["collisions"]):
+			print("Collision at t={} ({})".format(t, checks["distances"][t]), file=file)
 			success = False
 
 	if expected_T is not None:
@@ -170,13 +204,9 @@ def compute_delta(filename_env: str, filename_result: str) -> float:
 
 	deltas = []
 	deltas.append(rh.distance(x0, states[0]))
-	# dynamics
-	T = states.shape[0]
-	for t in range(T-1):
-		state_desired = robot.step(states[t], actions[t])
-		delta = rh.distance(state_desired, states[t+1])
-		# print(t, delta, states[t], actions[t], states[t+1], state_desired)
-		deltas.append(delta)
+	# dynamics (all steps at once)
+	states_desired = rh.step_batch(states[:-1], actions, robot.dt)
+	deltas.extend(rh.distance_batch(states_desired, states[1:]))
 	deltas.append(rh.distance(xf, states[-1]))
 	# idx = np.argmax(deltas) + 1
 	# print(idx, states[idx], actions[idx], states[idx+1])
@@ -17,12 +17,8 @@ def TPBVP_fixed_time(robot, x0, xf, T):
 	scp = SCP(robot)
 
 	# initialize with random rollout
-	states = np.empty((T,len(robot.state_desc)))
-	states[0] = x0
-	actions = np.empty((T-1,len(robot.action_desc)))
-	for k in range(T-1):
-		actions[k] = np.random.uniform(robot.min_u, robot.max_u)
-		states[k+1] = robot.step(states[k], actions[k])
+	actions = np.random.uniform(robot.min_u, robot.max_u, (T-1, len(robot.action_desc)))
+	states = np.array(robot.rollout(x0, actions))
 
 	# states = np.tile(x0, (T, 1))
 	# actions = np.zeros((T-1, 2))
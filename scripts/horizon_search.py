@@ -0,0 +1,148 @@
+import subprocess
+import time
+
+
+class Probe:
+	"""Evaluation of a horizon T by a command in a subprocess (exit code 0 on success)
+
+	A negative exit code indicates an internal error (e.g., of main_rai); the
+	command is repeated in that case.
+	"""
+	def __init__(self, T, cmd):
+		self.T = T
+		self.cmd = cmd
+		self.start = time.time()
+		self.process = subprocess.Popen(cmd)
+
+	def poll(self):
+		"""None while running, otherwise whether the probe was successful"""
+		returncode = self.process.poll()
+		if returncode is None:
+			return None
+		if returncode < 0:
+			self.process = subprocess.Popen(self.cmd)
+			return None
+		return returncode == 0
+
+	def cancel(self):
+		self.process.kill()
+		self.process.wait()
+
+
+def search(probe_command, min_T, max_T=None,
+		search="binarySearch",
+		workers=1,
+		start=None,
+		timelimit=None,
+		candidates=None,
+		on_success=None,
+		poll_interval=0.01):
+	"""Finds the smallest horizon T for which probe_command(T) (a command line)
+	succeeds, probing up to workers horizons concurrently
+
+	search is one of
+	  binarySearch:  k-ary search in [min_T, max_T], assuming that all T above a
+	                 successful one succeed; without max_T, T is doubled first
+	  linear:        the candidates (default: min_T, min_T+1, ...) in order
+	  linearReverse: max_T, max_T-1, ..., down to the first failure
+
+	Probes that can't improve the result anymore are cancelled: for all
+	searches, larger T than a success, and for binarySearch and linearReverse,
+	smaller T than a failure. on_success(T) is called for each improvement.
+	The search stops after timelimit seconds (counted from start).
+
+	Returns the best T (None if no probe succeeded) and a record of each probe
+	(T, start time t, duration, and result).
+	"""
+	start = time.time() if start is None else start
+	if candidates is None and search == "linear":
+		candidates = range(min_T, max_T + 1) if max_T is not None else None
+	lo, hi = min_T, max_T
+	best_T = None
+	running = dict()
+	results = dict()
+	issued = []
+	records = []
+
+	def record(probe, result):
+		now = time.time()
+		records.append({"T": probe.T, "t": probe.start - start, "duration": now - probe.start, "result": result})
+
+	def cancel(Ts):
+		for T in Ts:
+			probe = running.pop(T)
+			probe.cancel()
+			record(probe, "cancelled")
+
+	def next_T():
+		if search == "binarySearch":
+			if hi is None:
+				return max(2 * max(issued), lo) if issued else lo
+			# the midpoint of the largest interval without probes
+			points = [lo - 1] + sorted(running) + [hi + 1]
+			gap, T = max((b - a, (a + b) // 2) for a, b in zip(points, points[1:]))
+			return T if gap > 1 else None
+		if search == "linear":
+			T = next((T for T in (candidates if candidates is not None else _count(min_T)) if T not in issued), None)
+			if T is None or (best_T is not None and T >= best_T):
+				return None
+			return T
+		if search == "linearReverse":
+			T = hi - len(issued)
+			return T if T >= lo and T >= 1 else None
+		raise Exception("Unknown search {}!".format(search))
+
+	while timelimit is None or time.time() - start < timelimit:
+		while len(running) < workers:
+			T = next_T()
+			if T is None:
+				break
+			print("TRYING ", T, lo, hi)
+			issued.append(T)
+			running[T] = Probe(T, probe_command(T))
+		if not running:
+			break
+
+		time.sleep(poll_interval)
+		for T in sorted(running):
+			if T not in running:
+				continue
+			result = running[T].poll()
+			if result is None:
+				continue
+			record(running.pop(T), "success" if result else "failure")
+			results[T] = result
+			if result:
+				if best_T is None or T < best_T:
+					best_T = T
+					if on_success is not None:
+						on_success(T)
+				if search == "binarySearch":
+					hi = T - 1 if hi is None else min(hi, T - 1)
+				cancel([T2 for T2 in running if T2 > T])
+			else:
+				if search in ["binarySearch", "linearReverse"]:
+					lo = max(lo, T + 1)
+					cancel([T2 for T2 in running if T2 < T])
+	else:
+		# time limit
+		for T in list(running):
+			probe = running.pop(T)
+			probe.cancel()
+			record(probe, "timeout")
+
+	return best_T, records
+
+
+def _count(T):
+	while True:
+		yield T
+		T += 1
+
+
+def write_probes(stats, records):
+	"""Appends the record of each probe to an open stats.yaml"""
+	stats.write("probes:\n")
+	for r in records:
+		stats.write("  - T: {}\n    t: {}\n    duration: {}\n    result: {}\n".format(
+			r["T"], r["t"], r["duration"], r["result"]))
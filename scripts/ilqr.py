@@ -0,0 +1,321 @@
+import jax
+import jax.numpy as np
+from jax import grad, hessian, jacfwd, jit, lax, vmap
+import numpy
+
+import robots
+
+# step sizes tried in the forward pass (all at once)
+LINE_SEARCH = 0.5 ** numpy.arange(10)
+
+
+class ILQR():
+	"""Trajectory optimization with iLQR and an augmented Lagrangian
+
+	Minimizes the sum of squared actions (as SCP.min_u) subject to the
+	dynamics of the robot, a fixed final state, the bounds of actions and
+	states, and, if a collision checker is given, collision constraints. The
+	latter are half-planes at the closest obstacle of each state, updated with
+	the multipliers in each outer iteration (as in SCP). The dynamics are
+	handled by iLQR; all other constraints by the augmented Lagrangian. All
+	derivatives, the backward pass, and the forward pass are jitted.
+	"""
+	def __init__(self, robot, collisionChecker=None):
+		self.robot = robot
+		self.collisionChecker = collisionChecker
+		self.stateDim = len(robot.state_desc)
+		self.actionDim = len(robot.action_desc)
+		min_x = numpy.asarray(robot.min_x)
+		max_x = numpy.asarray(robot.max_x)
+		# angles are normalized by the dynamics; only their difference to the goal matters
+		self.is_angle = (min_x == -numpy.pi) & (max_x == numpy.pi)
+		self.bounded_x = numpy.flatnonzero(numpy.isfinite(min_x) & numpy.isfinite(max_x) & ~self.is_angle)
+		self.pos_dim = 2 if robot.is2D else 3
+
+		self._rollout = jit(self._rollout_impl)
+		self._derivatives = jit(self._derivatives_impl)
+		self._backward = jit(self._backward_impl)
+		self._forward = jit(self._forward_impl)
+		self._constraints = jit(self._constraints_impl)
+
+	# constraints
+
+	def _goal_error(self, x, xf):
+		e = x - xf
+		return np.where(self.is_angle, robots.normalize_angle(e), e)
+
+	def _state_constraints(self, x, normal, offset):
+		# <= 0: state bounds and collisions (normal @ position + offset >= 0)
+		return np.concatenate((
+			x[self.bounded_x] - self.robot.max_x[self.bounded_x],
+			self.robot.min_x[self.bounded_x] - x[self.bounded_x],
+			-np.array([normal @ x[0:self.pos_dim] + offset])))
+
+	def _stage_constraints(self, x, u, normal, offset):
+		# <= 0
+		return np.concatenate((
+			u - self.robot.max_u,
+			self.robot.min_u - u,
+			self._state_constraints(x, normal, offset)))
+
+	# augmented Lagrangian
+
+	@staticmethod
+	def _penalty(c, lam, mu):
+		# inequalities c <= 0 with multipliers lam >= 0
+		return (np.sum(np.maximum(0, lam + mu * c) ** 2) - np.sum(lam ** 2)) / (2 * mu)
+
+	def _running_cost(self, x, u):
+		return u @ u
+
+	def _stage_cost(self, x, u, normal, offset, lam, mu):
+		return self._running_cost(x, u) + self._penalty(self._stage_constraints(x, u, normal, offset), lam, mu)
+
+	def _final_cost(self, x, xf, normal, offset, lam, nu, mu):
+		e = self._goal_error(x, xf)
+		return nu @ e + mu / 2 * e @ e + self._penalty(self._state_constraints(x, normal, offset), lam, mu)
+
+	def _total_cost(self, X, U, xf, params):
+		normals, offsets, lams, lam_f, nu, mu = params
+		stage = vmap(self._stage_cost, in_axes=(0, 0, 0, 0, 0, None))(X[:-1], U, normals[:-1], offsets[:-1], lams, mu)
+		return np.sum(stage) + self._final_cost(X[-1], xf, normals[-1], offsets[-1], lam_f, nu, mu)
+
+	def _constraints_impl(self, X, U, xf, normals, offsets):
+		stage = vmap(self._stage_constraints)(X[:-1], U, normals[:-1], offsets[:-1])
+		final = self._state_constraints(X[-1], normals[-1], offsets[-1])
+		return stage, final, self._goal_error(X[-1], xf)
+
+	# iLQR
+
+	def _rollout_impl(self, x0, U):
+		return self.robot.rollout(x0, U)
+
+	def _derivatives_impl(self, X, U, xf, params):
+		normals, offsets, lams, lam_f, nu, mu = params
+		fx = vmap(jacfwd(self.robot.step, 0))(X[:-1], U)
+		fu = vmap(jacfwd(self.robot.step, 1))(X[:-1], U)
+		stage_args = (X[:-1], U, normals[:-1], offsets[:-1], lams)
+		in_axes = (0, 0, 0, 0, 0, None)
+		lx = vmap(grad(self._stage_cost, 0), in_axes)(*stage_args, mu)
+		lu = vmap(grad(self._stage_cost, 1), in_axes)(*stage_args, mu)
+		lxx = vmap(hessian(self._stage_cost, 0), in_axes)(*stage_args, mu)
+		luu = vmap(hessian(self._stage_cost, 1), in_axes)(*stage_args, mu)
+		lux = vmap(jacfwd(grad(self._stage_cost, 1), 0), in_axes)(*stage_args, mu)
+		final_args = (X[-1], xf, normals[-1], offsets[-1], lam_f, nu, mu)
+		vx = grad(self._final_cost)(*final_args)
+		vxx = hessian(self._final_cost)(*final_args)
+		return fx, fu, lx, lu, lxx, luu, lux, vx, vxx
+
+	def _backward_impl(self, derivatives, reg):
+		fx, fu, lx, lu, lxx, luu, lux, vx, vxx = derivatives
+
+		def step(carry, d):
+			vx, vxx = carry
+			fx, fu, lx, lu, lxx, luu, lux = d
+			qx = lx + fx.T @ vx
+			qu = lu + fu.T @ vx
+			qxx = lxx + fx.T @ vxx @ fx
+			quu = luu + fu.T @ vxx @ fu + reg * np.eye(self.actionDim)
+			qux = lux + fu.T @ vxx @ fx
+			L = np.linalg.cholesky(quu)
+			k = -jax.scipy.linalg.cho_solve((L, True), qu)
+			K = -jax.scipy.linalg.cho_solve((L, True), qux)
+			vx = qx + K.T @ quu @ k + K.T @ qu + qux.T @ k
+			vxx = qxx + K.T @ quu @ K + K.T @ qux + qux.T @ K
+			vxx = (vxx + vxx.T) / 2
+			# expected cost decrease (for a full step)
+			return (vx, vxx), (k, K, k @ qu + k @ quu @ k / 2)
+
+		_, (k, K, dV) = lax.scan(step, (vx, vxx), (fx, fu, lx, lu, lxx, luu, lux), reverse=True)
+		# a failed Cholesky decomposition results in NaNs
+		return k, K, np.sum(dV), np.all(np.isfinite(k)) & np.all(np.isfinite(K))
+
+	def _forward_impl(self, X, U, k, K, xf, params):
+		def rollout(alpha):
+			def step(x, d):
+				xbar, ubar, k, K = d
+				u = ubar + alpha * k + K @ (x - xbar)
+				x_next = self.robot.step(x, u)
+				return x_next, (x_next, u)
+			_, (X_new, U_new) = lax.scan(step, X[0], (X[:-1], U, k, K))
+			X_new = np.concatenate((X[0:1], X_new))
+			return X_new, U_new, self._total_cost(X_new, U_new, xf, params)
+
+		X_new, U_new, costs = vmap(rollout)(LINE_SEARCH)
+		costs = np.where(np.isfinite(costs), costs, np.inf)
+		best = np.argmin(costs)
+		return X_new[best], U_new[best], costs[best], np.asarray(LINE_SEARCH)[best]
+
+	def _ilqr(self, X, U, xf, params, max_iterations, tol):
+		cost = float(self._total_cost(X, U, xf, params))
+		reg = 1e-6
+		iterations = 0
+		for iterations in range(1, max_iterations + 1):
+			derivatives = self._derivatives(X, U, xf, params)
+			while True:
+				k, K, dV, ok = self._backward(derivatives, reg)
+				if ok or reg > 1e6:
+					break
+				reg *= 10
+			if not ok:
+				break
+			X_new, U_new, cost_new, alpha = self._forward(X, U, k, K, xf, params)
+			cost_new = float(cost_new)
+			if not cost_new < cost:
+				# no improvement: regularize more
+				reg *= 10
+				if reg > 1e6:
+					break
+				continue
+			reg = max(reg / 10, 1e-6)
+			improvement = cost - cost_new
+			X, U, cost = X_new, U_new, cost_new
+			if improvement < tol * max(1.0, abs(cost)):
+				break
+		return X, U, cost, iterations
+
+	def _collision_halfplanes(self, X):
+		# See 12a in "Convex optimization for proximity maneuvering of a spacecraft with a robotic manipulator"
+		# (as in SCP); without a collision checker, the constraints are 0 <= 0
+		T = X.shape[0]
+		normals = numpy.zeros((T, self.pos_dim))
+		offsets = numpy.zeros(T)
+		if self.collisionChecker is None:
+			return normals, offsets
+		X = numpy.asarray(X, dtype=numpy.float64)
+		dists, p_obss, p_robots = self.collisionChecker.distance_batch(X)
+		d_tilde = numpy.where((dists > 0)[:, numpy.newaxis], p_robots - p_obss, p_obss - p_robots)[:, 0:self.pos_dim]
+		norm_d_tilde = numpy.linalg.norm(d_tilde, axis=1)
+		has_normal = norm_d_tilde > 0
+		normals[has_normal] = d_tilde[has_normal] / norm_d_tilde[has_normal, numpy.newaxis]
+		offsets = numpy.where(has_normal, dists - numpy.sum(normals * X[:, 0:self.pos_dim], axis=1), 0.0)
+		return normals, offsets
+
+	def optimize(self, initial_x, initial_u, x0, xf,
+		num_iterations=20,
+		num_inner_iterations=50,
+		tol=1e-3,
+		verbose=False):
+		"""Returns the states, the actions, and statistics (including whether all
+		constraints are satisfied up to tol)
+
+		The states are a rollout of the actions from x0; initial_x is only used to
+		place the collision constraints of the first iteration.
+		"""
+		U = np.asarray(initial_u, dtype=np.float32)
+		x0 = np.asarray(x0, dtype=np.float32)
+		xf = np.asarray(xf, dtype=np.float32)
+		X = self._rollout(x0, U)
+		T = U.shape[0]
+
+		normals, offsets = self._collision_halfplanes(initial_x)
+		lams = np.zeros((T, 2 * self.actionDim + 2 * len(self.bounded_x) + 1))
+		lam_f = np.zeros(2 * len(self.bounded_x) + 1)
+		nu = np.zeros(self.stateDim)
+		mu = 1.0
+
+		stats = {"outer_iterations": 0, "inner_iterations": 0, "success": False}
+		for outer in range(num_iterations):
+			params = (normals, offsets, lams, lam_f, nu, mu)
+			X, U, cost, iterations = self._ilqr(X, U, xf, params, num_inner_iterations, 1e-6)
+			stats["outer_iterations"] = outer + 1
+			stats["inner_iterations"] += iterations
+
+			# update the multipliers
+			stage, final, goal_error = self._constraints(X, U, xf, normals, offsets)
+			violation = max(float(np.max(stage)), float(np.max(final)), float(np.max(np.abs(goal_error))), 0.0)
+			stats["cost"] = float(np.sum(U ** 2))
+			stats["violation"] = violation
+			if verbose:
+				print("AL iteration {}: cost {:.4f}, violation {:.2e}, {} iLQR iterations".format(
+					outer, stats["cost"], violation, iterations))
+			if violation < tol:
+				stats["success"] = True
+				break
+			lams = np.maximum(0, lams + mu * stage)
+			lam_f = np.maximum(0, lam_f + mu * final)
+			nu = nu + mu * goal_error
+			mu = min(mu * 10, 1e6)
+			if self.collisionChecker is not None:
+				normals, offsets = self._collision_halfplanes(X)
+
+		return numpy.asarray(X), numpy.asarray(U), stats
+
+
+class _TimeScaledRobot(robots.Robot):
+	"""The given robot with an additional action that scales its time step"""
+	def __init__(self, robot, min_scale, max_scale):
+		self.robot = robot
+		self.action_desc = robot.action_desc + ["time scale"]
+		self.min_u = np.concatenate((robot.min_u, np.array([min_scale])))
+		self.max_u = np.concatenate((robot.max_u, np.array([max_scale])))
+		self.state_desc = robot.state_desc
+		self.min_x = robot.min_x
+		self.max_x = robot.max_x
+		self.dt = robot.dt
+		self.is2D = robot.is2D
+
+	def valid_state(self, state):
+		return self.robot.valid_state(state)
+
+	def step(self, state, action, dt=None):
+		dt = self.dt if dt is None else dt
+		return self.robot.step(state, action[:-1], dt * action[-1])
+
+
+class FreeTimeILQR(ILQR):
+	"""iLQR with a free final time
+
+	Each action is extended by a scale of the time step (in [min_scale,
+	max_scale]), so the duration of the trajectory is a decision variable for a
+	fixed number of steps. The cost is the sum of squared scales (minimal for the
+	shortest duration with equal time steps) plus weight_u times the sum of
+	squared actions.
+	"""
+	def __init__(self, robot, collisionChecker=None, min_scale=0.5, max_scale=2.0, weight_u=1e-2):
+		super().__init__(_TimeScaledRobot(robot, min_scale, max_scale), collisionChecker)
+		self.weight_u = weight_u
+
+	def _running_cost(self, x, u):
+		return u[-1] ** 2 + self.weight_u * u[:-1] @ u[:-1]
+
+
+def optimize_free_time(robot, collisionChecker, initial_x, initial_u, x0, xf,
+	num_iterations=20,
+	num_polish=2,
+	verbose=False):
+	"""Time-optimal trajectory in a single solve (instead of a search over T)
+
+	Solves with FreeTimeILQR for the number of steps of the initial guess,
+	resamples the result to the time step of the robot (T = duration / dt,
+	rounded up), and polishes it with ILQR for T, T+1, ... (num_polish
+	attempts). Returns the states, the actions, and statistics; stats["success"]
+	is False if any stage fails, in which case the caller should fall back to a
+	search over T.
+	"""
+	initial_u = numpy.asarray(initial_u)
+	scaled_u = numpy.column_stack((initial_u, numpy.ones(len(initial_u))))
+	X, U, stats = FreeTimeILQR(robot, collisionChecker).optimize(
+		initial_x, scaled_u, x0, xf, num_iterations, verbose=verbose)
+	scales = U[:, -1]
+	stats = {"free_time": stats, "success": False, "T": None}
+	if not stats["free_time"]["success"]:
+		return X, U[:, :-1], stats
+
+	# resample the scaled steps uniformly
+	t = numpy.concatenate(([0], numpy.cumsum(scales)))
+	T = max(int(numpy.ceil(t[-1] - 1e-3)), 1)
+	if verbose:
+		print("free time: duration {:.3f} s -> T = {}".format(t[-1] * robot.dt, T))
+
+	ilqr = ILQR(robot, collisionChecker)
+	for T in range(T, T + num_polish):
+		t_new = numpy.linspace(0, t[-1], T + 1)
+		X_new = numpy.column_stack([numpy.interp(t_new, t, X[:, k]) for k in range(X.shape[1])])
+		idx = numpy.minimum(numpy.searchsorted(t, t_new[:-1], side="right") - 1, len(U) - 1)
+		X_polished, U_polished, polish_stats = ilqr.optimize(X_new, U[idx, :-1], x0, xf, num_iterations, verbose=verbose)
+		stats.update(polish_stats)
+		stats["T"] = T
+		if polish_stats["success"]:
+			return X_polished, U_polished, stats
+	return X_polished, U_polished, stats
@@ -13,6 +13,9 @@ from collections import defaultdict
 import tempfile
 from pathlib import Path
 import msgpack
+import json
+import queue
+import threading
 
 import sys
 import os
@@ -20,9 +23,12 @@ sys.path.append(os.getcwd())
 
 import main_scp
 import main_komo
+import main_ilqr
 import gen_motion_primitive
-from motionplanningutils import RobotHelper
+from utils_motion_primitives import append_motions, load_motions
+from motionplanningutils import RobotHelper, DBAstar
 import checker
+import motion_library
 
 # ./dbastar -i ../benchmark/dubins/kink_0.yaml -m motions.yaml -o output.yaml --delta 0.3
 
@@ -95,6 +101,199 @@ def compute_motion_importance(filename_env, filename_motions, filename_result_db
 			motions_stats[name] += np.clip(1 - old_cost / new_cost, 0, 1)
 	return motions_stats
 
+class DBAstarServer:
+	"""Long-running ./dbastar process that keeps the environment and motions in memory
+
+	New motions are appended to an append-only log (filename_motions), from
+	which the server only reads the part it hasn't seen yet.
+	"""
+
+	def __init__(self, filename_env, filename_motions, num_threads=1, lazy=False, nearest_neighbors="default", applicability_table=False, collision_cache_resolution=0, collision_cache_size=100000, sdf_resolution=0, heuristic="euclidean", heuristic_resolution=0.1, heuristic_cache=""):
+		self.filename_motions = filename_motions
+		# start with an empty log
+		open(self.filename_motions, 'wb').close()
+		self.new_motions = False
+		self.process = subprocess.Popen(["./dbastar",
+			"--server",
+			"--threads", str(num_threads),
+			"--nearestNeighbors", nearest_neighbors,
+			"--collisionCacheResolution", str(collision_cache_resolution),
+			"--collisionCacheSize", str(collision_cache_size),
+			"--sdfResolution", str(sdf_resolution),
+			"--heuristic", heuristic,
+			"--heuristicResolution", str(heuristic_resolution),
+			"--heuristicCache", str(heuristic_cache),
+			"-i", filename_env] + (["--lazy"] if lazy else []) + (["--applicabilityTable"] if applicability_table else []),
+			stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE,
+			text=True)
+
+	def search(self, new_motions, filename_result, delta, epsilon=1.0, alpha=0.5, filter_duplicates=True, max_cost=1e6) -> dict:
+		request = {
+			"delta": delta,
+			"epsilon": epsilon,
+			"alpha": alpha,
+			"filterDuplicates": bool(filter_duplicates),
+			"maxCost": max_cost,
+			"output": str(filename_result),
+		}
+		self.add_motions(new_motions)
+		if self.new_motions:
+			request["motions"] = str(self.filename_motions)
+			self.new_motions = False
+		self.process.stdin.write(json.dumps(request) + "\n")
+		self.process.stdin.flush()
+		response = self.process.stdout.readline()
+		if not response:
+			raise Exception("dbastar server terminated unexpectedly!")
+		return json.loads(response)
+
+	def add_motions(self, new_motions):
+		"""Motions for the next search"""
+		if len(new_motions) > 0:
+			append_motions(self.filename_motions, new_motions)
+			self.new_motions = True
+
+	def add_library_motions(self, library, start, stop):
+		"""Motions start, ..., stop-1 of all motions (MotionLibrary or list) for the next search"""
+		self.add_motions(library[start:stop])
+
+	def close(self):
+		if self.process.poll() is None:
+			self.process.stdin.close()
+			self.process.wait()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+class DBAstarBinding:
+	"""In-process db-A* (motionplanningutils.DBAstar) with the same interface as DBAstarServer"""
+
+	def __init__(self, filename_env, num_threads=1, lazy=False, nearest_neighbors="default", applicability_table=False, collision_cache_resolution=0, collision_cache_size=100000, sdf_resolution=0, heuristic="euclidean", heuristic_resolution=0.1, heuristic_cache=""):
+		self.dbastar = DBAstar()
+		self.dbastar.setNumThreads(num_threads)
+		self.dbastar.setLazy(lazy)
+		self.dbastar.setNearestNeighbors(nearest_neighbors)
+		self.dbastar.setApplicabilityTable(applicability_table)
+		self.dbastar.setCollisionCache(collision_cache_resolution, collision_cache_size)
+		self.dbastar.loadEnvironment(str(filename_env))
+		if sdf_resolution > 0:
+			self.dbastar.setSignedDistanceField(sdf_resolution)
+		if heuristic == "grid":
+			self.dbastar.setGridHeuristic(heuristic_resolution, str(heuristic_cache))
+		elif heuristic != "euclidean":
+			raise Exception("Unknown heuristic {}!".format(heuristic))
+
+	def add_motions(self, new_motions):
+		if len(new_motions) > 0:
+			# precomputed swept volumes (motion library) avoid recomputing them
+			aabbs = None
+			if all("aabb" in m for m in new_motions):
+				aabbs = np.array([m["aabb"] for m in new_motions], dtype=np.float32)
+			self.dbastar.addMotions(
+				[np.asarray(m["states"], dtype=np.float64) for m in new_motions],
+				[np.asarray(m["actions"], dtype=np.float64) for m in new_motions],
+				aabbs)
+
+	def add_library_motions(self, library, start, stop):
+		"""Adds motions start, ..., stop-1 of all motions (MotionLibrary or list)"""
+		if stop <= start:
+			return
+		if isinstance(library, motion_library.MotionLibrary):
+			# contiguous views into the mapped file, rather than one array per motion
+			self.dbastar.addMotionsFlat(*library.flat(start, stop))
+		else:
+			self.add_motions(library[start:stop])
+
+	def search(self, new_motions, filename_result, delta, epsilon=1.0, alpha=0.5, filter_duplicates=True, max_cost=1e6) -> dict:
+		self.add_motions(new_motions)
+		t_start = time.time()
+		success = self.dbastar.plan(delta, epsilon, alpha, bool(filter_duplicates), max_cost)
+		result = {
+			"delta": self.dbastar.delta(),
+			"num_motions": self.dbastar.numMotions(),
+		}
+		if success:
+			# the optimizers downstream work on files
+			self.dbastar.writeResult(str(filename_result))
+			result["status"] = "solved" if self.dbastar.isExactSolution() else "approximate"
+			result["cost"] = self.dbastar.cost()
+		else:
+			result["status"] = "failed"
+		result["duration"] = time.time() - t_start
+		return result
+
+	def search_anytime(self, new_motions, filename_result, delta, epsilon=1.0, alpha=0.5, filter_duplicates=True, max_cost=1e6, final_epsilon=1.0, epsilon_step=0.5, timelimit=None):
+		"""Anytime db-A* in a background thread; yields each improved solution as soon as it is found
+
+		Each solution is written to its own file (result["filename"]), so that
+		it can be used while the search continues. The cost bound of the running
+		search can be lowered with tighten_max_cost. The search is stopped after
+		timelimit seconds, even if it hasn't found another solution.
+		"""
+		self.add_motions(new_motions)
+		solutions = queue.Queue()
+		num_solutions = 0
+		t_start = time.time()
+		deadline = None if timelimit is None else t_start + timelimit
+
+		def on_solution():
+			nonlocal num_solutions
+			filename = Path(filename_result)
+			filename = filename.with_name("{}_{}{}".format(filename.stem, num_solutions, filename.suffix))
+			num_solutions += 1
+			self.dbastar.writeResult(str(filename))
+			solutions.put({
+				"status": "solved" if self.dbastar.isExactSolution() else "approximate",
+				"cost": self.dbastar.cost(),
+				"delta": self.dbastar.delta(),
+				"num_motions": self.dbastar.numMotions(),
+				"filename": filename,
+			})
+			return True
+
+		def run():
+			try:
+				self.dbastar.planAnytime(delta, epsilon, alpha, bool(filter_duplicates), max_cost,
+					final_epsilon, epsilon_step, on_solution)
+			finally:
+				solutions.put(None)
+
+		thread = threading.Thread(target=run)
+		thread.start()
+		try:
+			while True:
+				try:
+					result = solutions.get(timeout=None if deadline is None else max(0, deadline - time.time()))
+				except queue.Empty:
+					# time limit; the search is stopped below
+					break
+				if result is None:
+					break
+				result["duration"] = time.time() - t_start
+				yield result
+				t_start = time.time()
+		finally:
+			self.dbastar.requestStop()
+			thread.join()
+
+	def tighten_max_cost(self, max_cost):
+		self.dbastar.tightenMaxCost(max_cost)
+
+	def close(self):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
 def run_dbastar(filename_env, folder, timelimit, cfg, opt_alg="scp", motions_stats=None):
 	print(cfg)
 
@@ -108,7 +307,30 @@ def run_dbastar(filename_env, folder, timelimit, cfg, opt_alg="scp", motions_sta
 		p = Path(tmpdirname)
 		# p = Path("../results/dbg")
 
+		# append-only log of all motions sent to the dbastar server
 		filename_motions = p / "motions.msgpack"
+		dbastar_backend = cfg.get("dbastar_backend", "binding")
+		dbastar_threads = cfg.get("dbastar_threads", 1)
+		dbastar_anytime = cfg.get("dbastar_anytime", False)
+		# defer collision checks until nodes are expanded
+		dbastar_lazy = cfg.get("dbastar_lazy", False)
+		# default, gnat, sqrtapprox, or grid
+		dbastar_nearest_neighbors = cfg.get("dbastar_nearest_neighbors", "default")
+		# lookup table for the applicable motions (instead of T_m)
+		dbastar_applicability_table = cfg.get("dbastar_applicability_table", False)
+		# reuse collision-free checks of motions at nearby offsets (0: off)
+		dbastar_collision_cache = {
+			"collision_cache_resolution": cfg.get("dbastar_collision_cache_resolution", 0),
+			"collision_cache_size": cfg.get("dbastar_collision_cache_size", 100000),
+		}
+		# signed distance field for 2D collision checks (0: FCL only)
+		dbastar_sdf_resolution = cfg.get("dbastar_sdf_resolution", 0)
+		# obstacle-aware heuristic (grid), cached across trials
+		dbastar_heuristic = {
+			"heuristic": cfg.get("dbastar_heuristic", "euclidean"),
+			"heuristic_resolution": cfg.get("dbastar_heuristic_resolution", 0.1),
+			"heuristic_cache": cfg.get("dbastar_heuristic_cache", Path(tempfile.gettempdir()) / "dbastar_heuristic"),
+		}
 
 		sol = 0
 		filename_stats = "{}/stats.yaml".format(folder)
@@ -132,18 +354,21 @@ def run_dbastar(filename_env, folder, timelimit, cfg, opt_alg="scp", motions_sta
 		# with open('../cloud/motions/{}_sorted.yaml'.format(robot_node["type"])) as f:
 		# 	all_motions = yaml.load(f, Loader=yaml.CSafeLoader)
 
-		with open('../cloud/motions/{}_sorted.msgpack'.format(robot_node["type"]), 'rb') as f:
-			all_motions = msgpack.unpack(f)
+		# prefer the binary motion library (memory-mapped) if available
+		filename_all_motions = Path('../cloud/motions/{}_sorted.mlib'.format(robot_node["type"]))
+		if not filename_all_motions.exists():
+			filename_all_motions = filename_all_motions.with_suffix(".msgpack")
+		all_motions = load_motions(str(filename_all_motions))
 
 		# all_motions = sort_primitives(all_motions, robot_type, 100)
 		# all_motions = all_motions[0:1000]
 		print("Have {} motions in total".format(len(all_motions)))
-		motions = all_motions[0:add_prims]
-		del all_motions[0:add_prims]
-		# with open(filename_motions, 'w') as file:
-		# 	yaml.dump(motions, file, Dumper=yaml.CSafeDumper)
-		with open(filename_motions, 'wb') as file:
-			msgpack.pack(motions, file)
+		# the first num_library_motions of all_motions are used, in addition to
+		# the motions extracted from optimization
+		num_library_motions = min(add_prims, len(all_motions))
+		num_library_motions_sent = 0
+		motions = []
+		num_motions_sent = 0
 
 		# print(len(motions))
 		# exit()
@@ -160,136 +385,158 @@ def run_dbastar(filename_env, folder, timelimit, cfg, opt_alg="scp", motions_sta
 		duration_dbastar = 0
 		duration_opt = 0
 
-		with open(filename_stats, 'w') as stats:
+		if dbastar_backend == "binding":
+			dbastar = DBAstarBinding(filename_env, dbastar_threads, dbastar_lazy, dbastar_nearest_neighbors, dbastar_applicability_table, **dbastar_collision_cache, sdf_resolution=dbastar_sdf_resolution, **dbastar_heuristic)
+		elif dbastar_backend == "server":
+			if dbastar_anytime:
+				raise Exception("Anytime db-A* requires the binding backend!")
+			dbastar = DBAstarServer(filename_env, filename_motions, dbastar_threads, dbastar_lazy, dbastar_nearest_neighbors, dbastar_applicability_table, **dbastar_collision_cache, sdf_resolution=dbastar_sdf_resolution, **dbastar_heuristic)
+		else:
+			raise Exception("Unknown db-A* backend {}!".format(dbastar_backend))
+
+		with open(filename_stats, 'w') as stats, dbastar:
 			stats.write("stats:\n")
-			while time.time() - start < timelimit:
-				print("maxCost", maxCost)
 
-				filename_result_dbastar = p / "result_dbastar.yaml"
+			def optimize(filename_result_dbastar):
+				"""optimize a db-A* solution; returns True if successful"""
+				nonlocal duration_dbastar, duration_opt, maxCost, sol
 				filename_result_opt = p / "result_opt.yaml"
 
-				# find_smallest_delta(filename_env, filename_motions, filename_result_dbastar, delta, maxCost)
-				# exit()
-
-				t_dbastar_start = time.time()
-				result = subprocess.run(["./dbastar", 
-					"-i", filename_env,
-					"-m", filename_motions,
-					"-o", filename_result_dbastar,
-					"--delta", str(-desired_branching_factor),
-					"--epsilon", str(epsilon),
-					"--alpha", str(alpha),
-					"--filterDuplicates", str(filter_duplicates),
-					"--maxCost", str(maxCost)])
-				t_dbastar_stop = time.time()
-				duration_dbastar += t_dbastar_stop - t_dbastar_start
-				if result.returncode != 0:
-					# print("dbA* failed; Generating more primitives")
-
-
-					print("dbA* failed; Using more primitives", len(motions))
-					if len(all_motions) >= add_prims:
-						motions.extend(all_motions[0:add_prims])
-						del all_motions[0:add_prims]
-					else:
-						break
-						# for _ in range(add_prims):
-						# 	print("gen motion", len(motions))
-						# 	motion = gen_motion_primitive.gen_random_motion(robot_type)
-						# 	motion['distance'] = rh.distance(motion['x0'], motion['xf'])
-						# 	motions.append(motion)
-
-					# with open(filename_motions, 'w') as file:
-					# 	yaml.dump(motions, file, Dumper=yaml.CSafeDumper)
-					with open(filename_motions, 'wb') as file:
-						msgpack.pack(motions, file)
-
-					# median = np.median([m['distance'] for m in motions])
-					# if delta > median:
-					# 	print("Adjusting delta!", delta, median)
-					# 	delta = median
-					# delta = initialDelta
-
+				delta_achieved = checker.compute_delta(filename_env, filename_result_dbastar)
+				print("DELTA CHECK", delta_achieved)
+				# assert(delta_achieved <= delta)
+
+				# shutil.copyfile(filename_motions, "{}/motions_sol{}.msgpack".format(folder, sol))
+
+				t_opt_start = time.time()
+				if opt_alg == "scp":
+					success = main_scp.run_scp(filename_env, filename_result_dbastar, filename_result_opt,
+						backend=cfg.get("scp_backend", "cvxpy"))
+				elif opt_alg == "ilqr":
+					success = main_ilqr.run_ilqr(filename_env, filename_result_dbastar, filename_result_opt,
+						free_time=cfg.get("free_time", False))
+				elif opt_alg == "komo":
+					success = main_komo.run_komo_with_T_scaling(
+						filename_env, filename_result_dbastar, filename_result_opt, cfg["rai_cfg"], max_T=int(maxCost/robot.dt),
+						free_time=cfg.get("free_time", False))
+
+					# success = main_komo.run_komo(filename_env, filename_result_dbastar, filename_result_opt, cfg["rai_cfg"])
 				else:
-					delta_achieved = checker.compute_delta(filename_env, filename_result_dbastar)
-					print("DELTA CHECK", delta_achieved)
-					# assert(delta_achieved <= delta)
+					raise Exception("Unknown optimization algorithm {}!".format(opt_alg))
+				t_opt_stop = time.time()
+				duration_opt += t_opt_stop - t_opt_start
 
-					# shutil.copyfile(filename_motions, "{}/motions_sol{}.msgpack".format(folder, sol))
+				# extract solution, independent of success
+				if Path(filename_result_opt).exists():
+					opt_motions = checker.extract_valid_motions(filename_env, filename_result_opt, success)
+					print("Extracted {} motions from optimization".format(len(opt_motions)))
+					motions.extend(opt_motions)
 
-					t_opt_start = time.time()
-					if opt_alg == "scp":
-						success = main_scp.run_scp(filename_env, filename_result_dbastar, filename_result_opt)
-					elif opt_alg == "komo":
-						success = main_komo.run_komo_with_T_scaling(
-							filename_env, filename_result_dbastar, filename_result_opt, cfg["rai_cfg"], max_T=int(maxCost/robot.dt))
+				# checker_success = checker.check(filename_env, filename_result_opt)
+				# success = success and checker_success
+				if not success:
+					# print("Optimization failed; Reducing delta")
+					# delta = delta * 0.9
 
-						# success = main_komo.run_komo(filename_env, filename_result_dbastar, filename_result_opt, cfg["rai_cfg"])
-					else:
-						raise Exception("Unknown optimization algorithm {}!".format(opt_alg))
-					t_opt_stop = time.time()
-					duration_opt += t_opt_stop - t_opt_start
 
-					# extract solution, independent of success
-					if Path(filename_result_opt).exists():
-						opt_motions = checker.extract_valid_motions(filename_env, filename_result_opt, success)
-						print("Extracted {} motions from optimization".format(len(opt_motions)))
-						motions.extend(opt_motions)
+					print("Optimization failed; Using more primitives")
 
-					# checker_success = checker.check(filename_env, filename_result_opt)
-					# success = success and checker_success
-					if not success:
-						# print("Optimization failed; Reducing delta")
-						# delta = delta * 0.9
+				else:
+					# # ONLY FOR MOTION PRIMITIVE SELECTION
+					# if motions_stats is not None:
+						# compute_motion_importance(filename_env, filename_motions, filename_result_dbastar, delta, maxCost, motions_stats)
+					with open(filename_result_opt) as f:
+						result = yaml.safe_load(f)
+						cost = len(result["result"][0]["actions"]) * robot.dt
+					now = time.time()
+					t = now - start
+					print("success!", cost, t)
+					stats.write("  - t: {}\n".format(t))
+					stats.write("    cost: {}\n".format(cost))
+					stats.write("    delta_achieved: {}\n".format(delta_achieved))
+					stats.write("    duration_dbastar: {}\n".format(duration_dbastar))
+					stats.write("    duration_opt: {}\n".format(duration_opt))
+					stats.flush()
+					duration_dbastar = 0
+					duration_opt = 0
+					maxCost = cost * 0.99
+
+					shutil.copyfile(filename_result_opt, "{}/result_opt_sol{}.yaml".format(folder, sol))
+					# shutil.copyfile(filename_motions, "{}/motions_sol{}.yaml".format(folder, sol))
+				shutil.copyfile(filename_result_dbastar, "{}/result_dbastar_sol{}.yaml".format(folder, sol))
+
+				sol += 1
+				return success
 
+			while time.time() - start < timelimit:
+				print("maxCost", maxCost)
 
-						print("Optimization failed; Using more primitives")
+				filename_result_dbastar = p / "result_dbastar.yaml"
 
-					else:
-						# # ONLY FOR MOTION PRIMITIVE SELECTION
-						# if motions_stats is not None:
-							# compute_motion_importance(filename_env, filename_motions, filename_result_dbastar, delta, maxCost, motions_stats)
-						with open(filename_result_opt) as f:
-							result = yaml.safe_load(f)
-							cost = len(result["result"][0]["actions"]) * robot.dt
-						now = time.time()
-						t = now - start
-						print("success!", cost, t)
-						stats.write("  - t: {}\n".format(t))
-						stats.write("    cost: {}\n".format(cost))
-						stats.write("    delta_achieved: {}\n".format(delta_achieved))
-						stats.write("    duration_dbastar: {}\n".format(duration_dbastar))
-						stats.write("    duration_opt: {}\n".format(duration_opt))
-						stats.flush()
-						duration_dbastar = 0
-						duration_opt = 0
-						maxCost = cost * 0.99
-
-						shutil.copyfile(filename_result_opt, "{}/result_opt_sol{}.yaml".format(folder, sol))
-						# shutil.copyfile(filename_motions, "{}/motions_sol{}.yaml".format(folder, sol))
-					shutil.copyfile(filename_result_dbastar, "{}/result_dbastar_sol{}.yaml".format(folder, sol))
-
-					sol += 1
-
-					# use more primitives in all cases
-					if len(all_motions) >= add_prims:
-						motions.extend(all_motions[0:add_prims])
-						del all_motions[0:add_prims]
-					else:
-						break
-						# for _ in range(add_prims):
-						# 	print("gen motion", len(motions))
-						# 	motion = gen_motion_primitive.gen_random_motion(robot_type)
-						# 	motion['distance'] = rh.distance(motion['x0'], motion['xf'])
-						# 	motions.append(motion)
-
-					# with open(filename_motions, 'w') as file:
-					# 	yaml.dump(motions, file, Dumper=yaml.CSafeDumper)
-					with open(filename_motions, 'wb') as file:
-						msgpack.pack(motions, file)
+				# find_smallest_delta(filename_env, filename_motions, filename_result_dbastar, delta, maxCost)
+				# exit()
 
+				t_dbastar_start = time.time()
+				# send only the new motions; db-A* keeps the old ones
+				dbastar.add_library_motions(all_motions, num_library_motions_sent, num_library_motions)
+				num_library_motions_sent = num_library_motions
+				new_motions = motions[num_motions_sent:]
+				num_motions_sent = len(motions)
+				if dbastar_anytime:
+					# optimize each improved solution while the search continues
+					solutions = dbastar.search_anytime(new_motions, filename_result_dbastar,
+						delta=-desired_branching_factor,
+						epsilon=epsilon,
+						alpha=alpha,
+						filter_duplicates=filter_duplicates,
+						max_cost=maxCost,
+						timelimit=timelimit - (time.time() - start))
+					for result in solutions:
+						duration_dbastar += time.time() - t_dbastar_start
+						if optimize(result["filename"]):
+							dbastar.tighten_max_cost(maxCost)
+						t_dbastar_start = time.time()
+						if t_dbastar_start - start >= timelimit:
+							break
+					# stop the search; the time after the last solution counts, too
+					solutions.close()
+					duration_dbastar += time.time() - t_dbastar_start
+				else:
+					result = dbastar.search(new_motions, filename_result_dbastar,
+						delta=-desired_branching_factor,
+						epsilon=epsilon,
+						alpha=alpha,
+						filter_duplicates=filter_duplicates,
+						max_cost=maxCost)
+					t_dbastar_stop = time.time()
+					duration_dbastar += t_dbastar_stop - t_dbastar_start
+					if result["status"] == "failed":
+						# print("dbA* failed; Generating more primitives")
+
+
+						print("dbA* failed; Using more primitives", num_library_motions + len(motions))
+
+						# median = np.median([m['distance'] for m in motions])
+						# if delta > median:
+						# 	print("Adjusting delta!", delta, median)
+						# 	delta = median
 						# delta = initialDelta
-						# break
+					else:
+						optimize(filename_result_dbastar)
+
+				# use more primitives in all cases
+				if len(all_motions) - num_library_motions >= add_prims:
+					num_library_motions += add_prims
+				else:
+					break
+					# for _ in range(add_prims):
+					# 	print("gen motion", len(motions))
+					# 	motion = gen_motion_primitive.gen_random_motion(robot_type)
+					# 	motion['distance'] = rh.distance(motion['x0'], motion['xf'])
+					# 	motions.append(motion)
+
+					# delta = initialDelta
+					# break
 
 def main():
 	parser = argparse.ArgumentParser()
@@ -0,0 +1,77 @@
+import numpy as np
+import yaml
+import argparse
+
+import sys
+import os
+sys.path.append(os.getcwd())
+from motionplanningutils import CollisionChecker
+
+from ilqr import ILQR, optimize_free_time
+import robots
+
+def _load_env(filename_env):
+	with open(filename_env) as f:
+		env = yaml.safe_load(f)
+
+	robot_node = env["robots"][0]
+	robot = robots.create_robot(robot_node["type"])
+
+	x0 = np.array(robot_node["start"])
+	xf = np.array(robot_node["goal"])
+
+	cc = CollisionChecker()
+	cc.load(filename_env)
+	return robot, x0, xf, cc
+
+def run_ilqr_free_time(filename_env, states, actions=None, iterations=20):
+	"""Time-optimal trajectory from a guess with len(states)-1 steps (see
+	ilqr.optimize_free_time); missing actions are zero and missing state
+	dimensions (e.g., of geometric guesses) are padded with zeros
+	"""
+	robot, x0, xf, cc = _load_env(filename_env)
+	T = len(states) - 1
+	initial_x = np.zeros((T + 1, len(robot.state_desc)))
+	initial_x[:, 0:states.shape[1]] = states[:, 0:initial_x.shape[1]]
+	if actions is None:
+		actions = np.zeros((T, len(robot.action_desc)))
+	X, U, stats = optimize_free_time(robot, cc, initial_x, actions, x0, xf, iterations, verbose=True)
+	print("iLQR (free time): ", stats)
+	return X, U, stats
+
+def run_ilqr(filename_env, filename_initial_guess, filename_result='result_ilqr.yaml', iterations=20, free_time=False):
+
+	with open(filename_initial_guess) as f:
+		initial_guess = yaml.safe_load(f)
+
+	states = np.array(initial_guess["result"][0]["states"])
+	actions = np.array(initial_guess["result"][0]["actions"])
+
+	if free_time:
+		X, U, stats = run_ilqr_free_time(filename_env, states, actions, iterations)
+	else:
+		robot, x0, xf, cc = _load_env(filename_env)
+		ilqr = ILQR(robot, cc)
+		X, U, stats = ilqr.optimize(states, actions, x0, xf, iterations, verbose=True)
+		print("iLQR: ", stats)
+
+	if stats["success"]:
+		result = dict()
+		result["result"] = [{'states': X.tolist(), 'actions': U.tolist()}]
+		with open(filename_result, 'w') as f:
+			yaml.dump(result, f)
+		return True
+	return False
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("env", help="file containing the environment (YAML)")
+	parser.add_argument("initial_guess", help="file containing the initial_guess (e.g., from db-A*) (YAML)")
+	parser.add_argument("--free_time", action="store_true", help="optimize the duration as well")
+	args = parser.parse_args()
+
+	run_ilqr(args.env, args.initial_guess, free_time=args.free_time)
+
+
+if __name__ == '__main__':
+	main()
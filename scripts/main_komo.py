@@ -10,8 +10,10 @@ import robots
 
 from utils_optimization import UtilsSolutionFile
 import translate_g
+import main_ilqr
+import horizon_search
 
-def _run_komo(filename_g, filename_env, filename_initial_guess, filename_result, filename_cfg, robot_type, N=-1):
+def _komo_command(filename_g, filename_env, filename_initial_guess, filename_result, filename_cfg, robot_type, N=-1):
 
 	if "unicycle_first_order" in robot_type:
 		order = 1
@@ -24,19 +26,23 @@ def _run_komo(filename_g, filename_env, filename_initial_guess, filename_result,
 	else:
 		raise "No known robot_type!"
 
+	return ["./main_rai",
+		"-model", "\""+str(filename_g)+"\"",
+		"-waypoints", "\""+str(filename_initial_guess)+"\"",
+		"-N", str(N),
+		"-display", str(0),
+		"-animate", str(0),
+		"-order", str(order),
+		"-robot", robot_type,
+		"-cfg", "\""+str(filename_cfg)+"\"",
+		"-env", "\"" + str(filename_env)+"\"",
+		"-out", "\""+str(filename_result)+"\""]
+
+def _run_komo(filename_g, filename_env, filename_initial_guess, filename_result, filename_cfg, robot_type, N=-1):
+
 	while True:
 		# Run KOMO
-		result = subprocess.run(["./main_rai",
-				"-model", "\""+str(filename_g)+"\"",
-				"-waypoints", "\""+str(filename_initial_guess)+"\"",
-				"-N", str(N),
-				"-display", str(0),
-				"-animate", str(0),
-				"-order", str(order),
-				"-robot", robot_type,
-				"-cfg", "\""+str(filename_cfg)+"\"",
-				"-env", "\"" + str(filename_env)+"\"",
-				"-out", "\""+str(filename_result)+"\""])
+		result = subprocess.run(_komo_command(filename_g, filename_env, filename_initial_guess, filename_result, filename_cfg, robot_type, N))
 		# a negative returncode indicates an internal error -> repeat
 		if result.returncode >= 0:
 			break
@@ -56,19 +62,20 @@ def run_komo(filename_env, filename_initial_guess, filename_result, cfg = ""):
 			env = yaml.safe_load(f)
 		robot_type = env["robots"][0]["type"]
 
-		# convert environment YAML -> g
-		filename_g = p / "env.g"
-		translate_g.write(filename_env, str(filename_g))
-
-		# write config file
-		filename_cfg = p / "rai.cfg"
-		with open(filename_cfg, 'w') as f:
-			f.write(cfg)
+		# convert environment YAML -> g, and write config file (both cached)
+		filename_g = translate_g.write_cached(filename_env)
+		filename_cfg = translate_g.write_cfg_cached(cfg)
 
 		return _run_komo(filename_g, filename_env, filename_initial_guess, filename_result, filename_cfg, robot_type)
 
 
-def run_komo_with_T_scaling(filename_env, filename_initial_guess, filename_result, cfg = "", max_T = None):
+def run_komo_with_T_scaling(filename_env, filename_initial_guess, filename_result, cfg = "", max_T = None, free_time = False):
+	"""Runs KOMO for the length of the guess scaled by 0.8, 1.0, and 1.2
+	(concurrently), and keeps the shortest successful result
+
+	With free_time, first runs KOMO once for the time-optimal T, warm started
+	by free-final-time iLQR; the scaled lengths are only tried if that fails.
+	"""
 
 	with tempfile.TemporaryDirectory() as tmpdirname:
 		p = Path(tmpdirname)
@@ -78,39 +85,57 @@ def run_komo_with_T_scaling(filename_env, filename_initial_guess, filename_resul
 			env = yaml.safe_load(f)
 		robot_type = env["robots"][0]["type"]
 
-		# convert environment YAML -> g
-		filename_g = p / "env.g"
-		translate_g.write(filename_env, str(filename_g))
-
-		# write config file
-		filename_cfg = p / "rai.cfg"
-		with open(filename_cfg, 'w') as f:
-			f.write(cfg)
+		# convert environment YAML -> g, and write config file (both cached)
+		filename_g = translate_g.write_cached(filename_env)
+		filename_cfg = translate_g.write_cfg_cached(cfg)
 
 		# hack
 		utils_sol_file = UtilsSolutionFile(robot_type)
 		utils_sol_file.load(filename_initial_guess)
 		if utils_sol_file.T() == 0:
 			return False
-		filename_modified_guess = p / "guess.yaml"
 
-		# for factor in [1.0]:
+		if free_time:
+			filename_free_time_guess = p / "guess_free_time.yaml"
+			if main_ilqr.run_ilqr(filename_env, filename_initial_guess, filename_free_time_guess, free_time=True):
+				utils_sol_file_free_time = UtilsSolutionFile(robot_type)
+				utils_sol_file_free_time.load(filename_free_time_guess)
+				T = utils_sol_file_free_time.T()
+				if max_T is None or T <= max_T:
+					print("Trying T ", T, "(free time)")
+					if _run_komo(filename_g, filename_env, filename_free_time_guess, filename_result, filename_cfg, robot_type):
+						return True
+			print("Free time failed; trying scaled T")
+
+		# all factors concurrently; the shortest successful T is used
+		Ts = []
 		for factor in [0.8, 1.0, 1.2]:
 			T = int(utils_sol_file.T() * factor)
 			if max_T is not None and T > max_T:
-				return False
-			print("Trying T ", T)
-			# utils_sol_file.save_rescaled(filename_modified_guess, int(utils_sol_file.T() * 1.1))
-			if factor == 1.0:
-				result = _run_komo(filename_g, filename_env, filename_initial_guess, filename_result, filename_cfg, robot_type)
+				break
+			Ts.append(T)
+		Ts = sorted(set(Ts))
+		if not Ts:
+			return False
+		print("Trying T ", Ts)
+
+		def probe_command(T):
+			if T == utils_sol_file.T():
+				filename_modified_guess = filename_initial_guess
 			else:
+				filename_modified_guess = p / "guess_{}.yaml".format(T)
 				utils_sol_file.save_rescaled(filename_modified_guess, T)
-				result = _run_komo(filename_g, filename_env, filename_modified_guess, filename_result, filename_cfg, robot_type)
-			# shutil.copyfile(filename_modified_guess, filename_result)
-			# return True
-			if result:
-				return True
-		return False
+			return _komo_command(filename_g, filename_env, filename_modified_guess, p / "result_{}.yaml".format(T), filename_cfg, robot_type)
+
+		best_T, _ = horizon_search.search(probe_command, Ts[0], Ts[-1], "linear", len(Ts), candidates=Ts)
+		if best_T is None:
+			print("KOMO failed")
+			# as the sequential version, keep the result of the last factor (valid motions may still be extracted)
+			if (p / "result_{}.yaml".format(Ts[-1])).exists():
+				shutil.copyfile(p / "result_{}.yaml".format(Ts[-1]), filename_result)
+			return False
+		shutil.copyfile(p / "result_{}.yaml".format(best_T), filename_result)
+		return True
 
 
 def run_komo_standalone(filename_env, folder, timelimit, cfg = "",
@@ -118,10 +143,15 @@ def run_komo_standalone(filename_env, folder, timelimit, cfg = "",
 		initialguess = "ompl",
 		T_range_rel=None,
 		T_range_abs=None,
-		use_T=None):
+		use_T=None,
+		workers=1):
+	"""Runs KOMO for a range of horizons T (see horizon_search.search); up to
+	workers horizons are tried concurrently
+	"""
 
 	# search = "linear"
 	# search = "binarySearch"
+	# search = "freeTime" (falls back to binarySearch)
 
 	with tempfile.TemporaryDirectory() as tmpdirname:
 		p = Path(tmpdirname)
@@ -143,14 +173,9 @@ def run_komo_standalone(filename_env, folder, timelimit, cfg = "",
 		else:
 			raise "No known robot_type!"
 
-		# convert environment YAML -> g
-		filename_g = p / "env.g"
-		translate_g.write(filename_env, str(filename_g))
-
-		# write config file
-		filename_cfg = p / "rai.cfg"
-		with open(filename_cfg, 'w') as f:
-			f.write(cfg)
+		# convert environment YAML -> g, and write config file (both cached)
+		filename_g = translate_g.write_cached(filename_env)
+		filename_cfg = translate_g.write_cfg_cached(cfg)
 
 		if initialguess == "ompl":
 			# compute initial guess via OMPL
@@ -203,77 +228,56 @@ def run_komo_standalone(filename_env, folder, timelimit, cfg = "",
 			stats.write("stats:\n")
 
 			best_T = None
-			if search == "linear":
-				T = min_T - 1
-			if search == "linearReverse":
-				T = T_range_abs[1] + 1
-			elif search == "none":
-				T = use_T
-			elif search == "binarySearch":
-				# modified binary search
+			if search == "freeTime":
+				# a single KOMO run for the time-optimal T of free-final-time iLQR
 				T = None
-			while time.time() - start < timelimit:
-				if search == "linear":
-					if max_T is not None:
-						if min_T >= max_T:
-							break
-					T = T + 1
-					print("TRYING ", T)
-				elif search == "linearReverse":
-					if T <= 1:
-						break
-					T = T - 1
-					print("Trying ", T)
-				elif search == "binarySearch":
-					if max_T is not None:
-						if min_T >= max_T:
-							break
-						T = int((min_T + max_T) / 2)
-					else:
-						if T is None:
-							T = min_T
-						else:
-							T = T * 2
-
-					print("TRYING ", T, min_T, max_T)
+				if filename_initial_guess != "none" and robot_type_guess != "none":
+					filename_modified_guess = p / "guess_free_time.yaml"
+					utils_sol_file.save_rescaled(filename_modified_guess, min_T)
+					with open(filename_modified_guess) as f:
+						guess = yaml.safe_load(f)
+					X, U, ilqr_stats = main_ilqr.run_ilqr_free_time(filename_env, np.array(guess["result"][0]["states"]))
+					if ilqr_stats["success"]:
+						T = len(U)
+						guess["result"][0] = {'states': X.tolist(), 'actions': U.tolist()}
+						with open(filename_modified_guess, 'w') as f:
+							yaml.dump(guess, f)
+				if T is not None and (max_T is None or T <= max_T):
+					print("TRYING ", T, "(free time)")
+					filename_temp_result = p / "result_{}.yaml".format(T)
+					if _run_komo(filename_g, filename_env, filename_modified_guess, filename_temp_result, filename_cfg, robot_type, T):
+						print("KOMO SUCCESS with T", T)
+						stats.write("  - t: {}\n    cost: {}\n".format(time.time() - start, T * robot.dt))
+						shutil.copyfile(filename_modified_guess, p / "guess_{}.yaml".format(T))
+						best_T = T
+				if best_T is None:
+					print("Free time failed; falling back to binary search")
+				search = "binarySearch" if best_T is None else "done"
 
+			def probe_command(T):
 				if filename_initial_guess != "none" and robot_type_guess != "none":
 					filename_modified_guess = p / "guess_{}.yaml".format(T)
 					utils_sol_file.save_rescaled(filename_modified_guess, T)
 				else:
 					filename_modified_guess = "none"
-
-				# Run KOMO
 				filename_temp_result = p / "result_{}.yaml".format(T)
-				success =  _run_komo(filename_g, filename_env, filename_modified_guess, filename_temp_result, filename_cfg, robot_type, T)
-				if not success:
-					print("KOMO failed with T", T)
-					min_T = T + 1
-
-					if search == "none":
-						break
-					if search == "linearReverse":
-						break
-				else:
-					print("KOMO SUCCESS with T", T)
-					now = time.time()
-					t = now - start
-					stats.write("  - t: {}\n    cost: {}\n".format(t, T * robot.dt))
+				return _komo_command(filename_g, filename_env, filename_modified_guess, filename_temp_result, filename_cfg, robot_type, T)
+
+			def on_success(T):
+				print("KOMO SUCCESS with T", T)
+				t = time.time() - start
+				stats.write("  - t: {}\n    cost: {}\n".format(t, T * robot.dt))
+				stats.flush()
+
+			if search != "done":
+				if search == "none":
+					search, min_T, max_T = "binarySearch", use_T, use_T
+				elif search == "linearReverse":
+					min_T, max_T = 1, T_range_abs[1]
+				best_T, probes = horizon_search.search(probe_command, min_T, max_T, search, workers,
+					start=start, timelimit=timelimit, on_success=on_success)
+				horizon_search.write_probes(stats, probes)
 
-					if search == "linear":
-						best_T = T
-						break
-					elif search == "linearReverse":
-						best_T = T
-					elif search == "none":
-						best_T = T
-						break
-					elif search == "binarySearch":
-						max_T = T - 1
-						if best_T is None or T < best_T:
-							best_T = T
-						# return True
-			
 		if best_T is not None:
 			shutil.copyfile(p / "result_{}.yaml".format(best_T), filename_result)
 			if filename_initial_guess != "none" and robot_type_guess != "none":
@@ -14,8 +14,10 @@ from motionplanningutils import CollisionChecker
 
 from scp import SCP
 import robots
+import main_ilqr
+import horizon_search
 
-def run_scp(filename_env, filename_initial_guess, filename_result='result_scp.yaml', iterations=5):
+def run_scp(filename_env, filename_initial_guess, filename_result='result_scp.yaml', iterations=5, backend="cvxpy"):
 
 	with open(filename_env) as f:
 		env = yaml.safe_load(f)
@@ -35,12 +37,8 @@ def run_scp(filename_env, filename_initial_guess, filename_result='result_scp.ya
 	if filename_initial_guess == "gen_random_rollout":
 		# initialize with random rollout
 		T = 100
-		states = np.empty((T, len(robot.state_desc)))
-		states[0] = x0
-		actions = np.empty((T-1, len(robot.action_desc)))
-		for k in range(T-1):
-			actions[k] = np.random.uniform(robot.min_u, robot.max_u)
-			states[k+1] = robot.step(states[k], actions[k])
+		actions = np.random.uniform(robot.min_u, robot.max_u, (T-1, len(robot.action_desc)))
+		states = np.array(robot.rollout(x0, actions))
 	elif filename_initial_guess == "gen_straight":
 		# initialize with linear interpolation x0 -> xf
 		T = 80
@@ -70,7 +68,7 @@ def run_scp(filename_env, filename_initial_guess, filename_result='result_scp.ya
 	# exit()
 
 	# scp = SCP(robot)
-	scp = SCP(robot, cc)
+	scp = SCP(robot, cc, backend)
 	print(xf)
 	X, U, val = scp.min_u(states, actions, x0, xf, iterations, trust_x=2*trust_x_est, trust_u=2*trust_u_est, verbose=True)
 	# X, U, val = scp.min_u(states, actions, x0, xf, 3, trust_x=None, trust_u=None, verbose=True)
@@ -84,6 +82,68 @@ def run_scp(filename_env, filename_initial_guess, filename_result='result_scp.ya
 		return True
 	return False
 
+def _scp_probe(scp, x0, xf, states, T, filename_result):
+	"""SCP for T states, starting from the (geometric) states interpolated to T;
+	writes the result if successful and returns success, solve time, and solver iterations
+	"""
+	states_interp = np.empty((T, states.shape[1]))
+	for k in range(states.shape[1]):
+		states_interp[:,k] = np.interp(np.linspace(0,1,T), np.linspace(0, 1, states.shape[0]), states[:,k])
+
+	states_guess = states_interp
+	# actions_guess = np.zeros((T-1, 2))
+	actions_guess = np.random.normal(0, 0.01, (T-1, 2))
+	iterations = 5
+	trust_x = 0.1
+	trust_u = 0.5
+	num_stats = len(scp.stats)
+	X, U, val = scp.min_u(states_guess, actions_guess, x0, xf, iterations,
+	                      trust_x=trust_x, trust_u=trust_u, verbose=True, soft_xf=True)
+	solve_time = sum(st["solve_time"] or 0 for st in scp.stats[num_stats:])
+	solver_iterations = sum(st["iterations"] or 0 for st in scp.stats[num_stats:])
+	print("SCP solver time {:.3f} s, {} iterations".format(solve_time, solver_iterations))
+	max_error_to_goal = np.linalg.norm(X[-1][-1] - xf, np.inf)
+
+	success = (len(X) == iterations + 1) and max_error_to_goal < 1e-3
+	if success:
+		# write output to file
+		result = dict()
+		result["result"] = [{'states': X[-1].tolist(), 'actions': U[-1].tolist()}]
+		with open(filename_result, 'w') as f:
+			yaml.dump(result, f)
+	else:
+		print("SCP failed with T", T, val, len(X))
+	return success, solve_time, solver_iterations
+
+def run_scp_probe(filename_env, filename_initial_guess, T, filename_result, backend="cvxpy"):
+	"""A single probe of run_scp_standalone (for T states); returns True if successful"""
+
+	with open(filename_env) as f:
+		env = yaml.safe_load(f)
+
+	robot_node = env["robots"][0]
+	robot = robots.create_robot(robot_node["type"])
+
+	x0 = np.array(robot_node["start"])
+	xf = np.array(robot_node["goal"])
+
+	cc = CollisionChecker()
+	cc.load(filename_env)
+	scp = SCP(robot, cc, backend)
+
+	with open(filename_initial_guess) as f:
+		guess = yaml.safe_load(f)
+	states = np.array(guess['result'][0]['states'])
+
+	success, _, _ = _scp_probe(scp, x0, xf, states, T, filename_result)
+	return success
+
+def scp_probe_command(filename_env, filename_initial_guess, T, filename_result, backend="cvxpy"):
+	"""Command line of a run_scp_probe in a subprocess (independent of the current directory)"""
+	return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main_scp.py"),
+		filename_env, filename_initial_guess,
+		"--T", str(T), "--result", str(filename_result), "--backend", backend]
+
 def run_scp_standalone(filename_env, folder, timelimit, cfg):
 
 	with open(filename_env) as f:
@@ -97,7 +157,7 @@ def run_scp_standalone(filename_env, folder, timelimit, cfg):
 
 	cc = CollisionChecker()
 	cc.load(filename_env)
-	scp = SCP(robot, cc)
+	scp = SCP(robot, cc, cfg.get("scp_backend", "cvxpy"))
 	# scp = SCP(robot, None)
 
 	with tempfile.TemporaryDirectory() as tmpdirname:
@@ -133,7 +193,51 @@ def run_scp_standalone(filename_env, folder, timelimit, cfg):
 			# modified binary search
 			T = None
 			best_T = None
-			while time.time() - start < timelimit:
+
+			if cfg.get("free_time", False):
+				# a single SCP run for the time-optimal T of free-final-time iLQR;
+				# the binary search is the fallback
+				states_interp = np.empty((min_T, states.shape[1]))
+				for k in range(states.shape[1]):
+					states_interp[:,k] = np.interp(np.linspace(0,1,min_T), np.linspace(0, 1, states.shape[0]), states[:,k])
+				states_guess, actions_guess, ilqr_stats = main_ilqr.run_ilqr_free_time(filename_env, states_interp)
+				if ilqr_stats["success"]:
+					T = len(states_guess)
+					print("TRYING ", T, "(free time)")
+					iterations = 5
+					X, U, val = scp.min_u(states_guess, actions_guess, x0, xf, iterations,
+					                      trust_x=0.1, trust_u=0.5, verbose=True, soft_xf=True)
+					if (len(X) == iterations + 1) and np.linalg.norm(X[-1][-1] - xf, np.inf) < 1e-3:
+						print("SCP SUCCESS with T", T)
+						stats.write("  - t: {}\n    cost: {}\n".format(time.time() - start, T / 10))
+						best_T = T
+						result = dict()
+						result["result"] = [{'states': X[-1].tolist(), 'actions': U[-1].tolist()}]
+						with open(p / "T_{}.yaml".format(T), 'w') as f:
+							yaml.dump(result, f)
+				if best_T is None:
+					print("Free time failed; falling back to binary search")
+				T = None
+			search = best_T is None
+			probes = []
+
+			workers = cfg.get("search_workers", 1)
+			if search and workers > 1:
+				# k-ary search with concurrent probes (in subprocesses, see main())
+				def probe_command(T):
+					return scp_probe_command(filename_env, filename_initial_guess, T, p / "T_{}.yaml".format(T),
+						cfg.get("scp_backend", "cvxpy"))
+
+				def on_success(T):
+					print("SCP SUCCESS with T", T)
+					stats.write("  - t: {}\n    cost: {}\n".format(time.time() - start, T / 10))
+					stats.flush()
+
+				best_T, probes = horizon_search.search(probe_command, min_T, max_T, "binarySearch", workers,
+					start=start, timelimit=timelimit, on_success=on_success)
+				search = False
+
+			while search and time.time() - start < timelimit:
 				if max_T is not None:
 					if min_T >= max_T:
 						break
@@ -146,33 +250,12 @@ def run_scp_standalone(filename_env, folder, timelimit, cfg):
 
 				print("TRYING ", T, min_T, max_T)
 
-				states_interp = np.empty((T, states.shape[1]))
-				for k in range(states.shape[1]):
-					states_interp[:,k] = np.interp(np.linspace(0,1,T), np.linspace(0, 1, states.shape[0]), states[:,k])
-
-				# filename_modified_guess = p / "guess.yaml"
-				# with open(filename_modified_guess, 'w') as f:
-				# 	guess['result'][0]['states'] = states_interp.tolist()
-				# 	guess['result'][0]['actions'] = np.zeros((T-1, 2)).tolist()
-				# 	yaml.dump(guess, f)
-
-				# Run SCP
 				filename_temp_result = p / "T_{}.yaml".format(T)
-				# success = run_scp(filename_env, filename_modified_guess, filename_temp_result)
-
-				states_guess = states_interp
-				# actions_guess = np.zeros((T-1, 2))
-				actions_guess = np.random.normal(0, 0.01, (T-1, 2))
-				iterations = 5
-				trust_x = 0.1
-				trust_u = 0.5
-				X, U, val = scp.min_u(states_guess, actions_guess, x0, xf, iterations,
-				                      trust_x=trust_x, trust_u=trust_u, verbose=True, soft_xf=True)
-				max_error_to_goal = np.linalg.norm(X[-1][-1] - xf, np.inf)
-
-				success = (len(X) == iterations + 1) and max_error_to_goal < 1e-3
+				probe_start = time.time()
+				success, solve_time, solver_iterations = _scp_probe(scp, x0, xf, states, T, filename_temp_result)
+				probes.append({"T": T, "t": probe_start - start, "duration": time.time() - probe_start,
+					"result": "success" if success else "failure"})
 				if not success:
-					print("SCP failed with T", T, val, len(X))
 					min_T = T
 
 					# return False
@@ -181,17 +264,14 @@ def run_scp_standalone(filename_env, folder, timelimit, cfg):
 					now = time.time()
 					t = now - start
 					stats.write("  - t: {}\n    cost: {}\n".format(t, T / 10))
+					stats.write("    solve_time: {}\n    solver_iterations: {}\n".format(solve_time, solver_iterations))
 
 					max_T = T - 1
 					if best_T is None or T < best_T:
 						best_T = T
 
-					# write output to file
-					result = dict()
-					result["result"] = [{'states': X[-1].tolist(), 'actions': U[-1].tolist()}]
-					with open(filename_temp_result, 'w') as f:
-						yaml.dump(result, f)
-			
+			horizon_search.write_probes(stats, probes)
+
 		if best_T is not None:
 			shutil.copyfile(p / "T_{}.yaml".format(best_T), filename_result)
 			return True
@@ -201,9 +281,15 @@ def main():
 	parser = argparse.ArgumentParser()
 	parser.add_argument("env", help="file containing the environment (YAML)")
 	parser.add_argument("initial_guess", help="file containing the initial_guess (e.g., from db-A*) (YAML)")
+	parser.add_argument("--T", type=int, help="run a single probe of run_scp_standalone with T states (exit code 0 on success)")
+	parser.add_argument("--result", default="result_scp.yaml", help="file to write the result to (YAML)")
+	parser.add_argument("--backend", default="cvxpy", help="SCP backend (cvxpy or osqp)")
 	args = parser.parse_args()
 
-	run_scp(args.env, args.initial_guess)
+	if args.T is not None:
+		success = run_scp_probe(args.env, args.initial_guess, args.T, args.result, args.backend)
+		sys.exit(0 if success else 1)
+	run_scp(args.env, args.initial_guess, args.result, backend=args.backend)
 
 
 if __name__ == '__main__':
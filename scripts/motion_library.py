@@ -0,0 +1,205 @@
+"""Binary motion library (columnar, memory-mappable)
+
+Layout (little-endian, see also src/motionLibrary.hpp):
+	header          HEADER_DTYPE (152 bytes)
+	state_offsets   uint64[num_motions + 1]   (first state of each motion)
+	action_offsets  uint64[num_motions + 1]   (first action of each motion)
+	states          float32[num_states, state_dim]
+	actions         float32[num_actions, control_dim]
+	aabbs           float32[num_motions, 6]   (min and max of the swept volume)
+Each section starts at a 64-byte aligned offset.
+
+The file is mapped read-only, so loading does not parse anything and
+multiple processes share the same pages.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import msgpack
+import numpy as np
+
+sys.path.append(os.getcwd())
+from motionplanningutils import RobotHelper
+
+MAGIC = b"KMPLIB\0\0"
+VERSION = 1
+ALIGNMENT = 64
+
+HEADER_DTYPE = np.dtype([
+	("magic", "S8"),
+	("version", "<u4"),
+	("state_dim", "<u4"),
+	("control_dim", "<u4"),
+	("reserved", "<u4"),
+	("num_motions", "<u8"),
+	("num_states", "<u8"),
+	("num_actions", "<u8"),
+	("robot_type", "S64"),
+	("offset_state_offsets", "<u8"),
+	("offset_action_offsets", "<u8"),
+	("offset_states", "<u8"),
+	("offset_actions", "<u8"),
+	("offset_aabbs", "<u8"),
+])
+assert HEADER_DTYPE.itemsize == 152
+
+
+def _align(offset: int) -> int:
+	return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write(filename, motions: list, robot_type: str) -> None:
+	"""Write motions (dicts with "states" and "actions") as binary motion library
+
+	The file is replaced atomically, so processes that have the old version
+	mapped are not affected.
+	"""
+	rh = RobotHelper(robot_type, pos_limit=100)
+	states = [np.asarray(m["states"], dtype=np.float64) for m in motions]
+	actions = [np.asarray(m["actions"], dtype=np.float64) for m in motions]
+	state_dim = states[0].shape[1]
+	control_dim = actions[0].shape[1]
+
+	state_offsets = np.zeros(len(motions) + 1, dtype="<u8")
+	state_offsets[1:] = np.cumsum([len(s) for s in states])
+	action_offsets = np.zeros(len(motions) + 1, dtype="<u8")
+	action_offsets[1:] = np.cumsum([len(a) for a in actions])
+	aabbs = np.array([rh.motionAABB(s) for s in states], dtype="<f4").reshape(-1, 6)
+
+	sections = [
+		state_offsets,
+		action_offsets,
+		np.concatenate(states).astype("<f4"),
+		np.concatenate(actions).astype("<f4"),
+		aabbs,
+	]
+	offsets = []
+	offset = HEADER_DTYPE.itemsize
+	for section in sections:
+		offset = _align(offset)
+		offsets.append(offset)
+		offset += section.nbytes
+
+	header = np.zeros(1, dtype=HEADER_DTYPE)
+	header["magic"] = MAGIC
+	header["version"] = VERSION
+	header["state_dim"] = state_dim
+	header["control_dim"] = control_dim
+	header["num_motions"] = len(motions)
+	header["num_states"] = state_offsets[-1]
+	header["num_actions"] = action_offsets[-1]
+	header["robot_type"] = robot_type.encode()
+	for name, offset in zip(["offset_state_offsets", "offset_action_offsets",
+		"offset_states", "offset_actions", "offset_aabbs"], offsets):
+		header[name] = offset
+
+	filename = Path(filename)
+	with tempfile.NamedTemporaryFile(dir=filename.parent, delete=False) as f:
+		f.write(header.tobytes())
+		for offset, section in zip(offsets, sections):
+			f.write(b"\0" * (offset - f.tell()))
+			f.write(section.tobytes())
+	os.chmod(f.name, 0o644)
+	os.replace(f.name, filename)
+
+
+class MotionLibrary:
+	"""Read-only view on a binary motion library
+
+	Motions are returned as dicts with the same keys as the msgpack/yaml
+	motions ("states", "actions", "x0", "xf", "T"), plus "aabb". All arrays
+	are views into the mapped file (float32).
+	"""
+
+	def __init__(self, filename):
+		self._data = np.memmap(filename, dtype=np.uint8, mode='r')
+		self.header = self._data[0:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+		if self.header["magic"] != MAGIC.rstrip(b"\0"):
+			raise Exception("{} is not a motion library!".format(filename))
+		if self.header["version"] != VERSION:
+			raise Exception("Unsupported motion library version {}!".format(self.header["version"]))
+
+		num_motions = int(self.header["num_motions"])
+		self.robot_type = self.header["robot_type"].decode()
+		self.state_offsets = self._section("offset_state_offsets", "<u8", (num_motions + 1,))
+		self.action_offsets = self._section("offset_action_offsets", "<u8", (num_motions + 1,))
+		self.states = self._section("offset_states", "<f4",
+			(int(self.header["num_states"]), int(self.header["state_dim"])))
+		self.actions = self._section("offset_actions", "<f4",
+			(int(self.header["num_actions"]), int(self.header["control_dim"])))
+		self.aabbs = self._section("offset_aabbs", "<f4", (num_motions, 6))
+
+	def _section(self, name, dtype, shape):
+		offset = int(self.header[name])
+		num_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+		return self._data[offset:offset + num_bytes].view(dtype).reshape(shape)
+
+	@property
+	def x0s(self) -> np.ndarray:
+		return self.states[self.state_offsets[:-1].astype(np.int64)]
+
+	@property
+	def xfs(self) -> np.ndarray:
+		return self.states[self.state_offsets[1:].astype(np.int64) - 1]
+
+	def flat(self, start: int, stop: int) -> tuple:
+		"""Motions start, ..., stop-1 as contiguous arrays (views into the mapped file)
+
+		Returns states, state_offsets, actions, action_offsets, and aabbs, where
+		motion start+i consists of states[state_offsets[i]:state_offsets[i+1]]
+		(and analogously for the actions).
+		"""
+		state_offsets = self.state_offsets[start:stop + 1]
+		action_offsets = self.action_offsets[start:stop + 1]
+		return (
+			self.states[state_offsets[0]:state_offsets[-1]],
+			state_offsets - state_offsets[0],
+			self.actions[action_offsets[0]:action_offsets[-1]],
+			action_offsets - action_offsets[0],
+			self.aabbs[start:stop],
+		)
+
+	def __len__(self) -> int:
+		return len(self.aabbs)
+
+	def __iter__(self):
+		for idx in range(len(self)):
+			yield self[idx]
+
+	def __getitem__(self, idx):
+		if isinstance(idx, slice):
+			return [self[i] for i in range(*idx.indices(len(self)))]
+		if idx < 0:
+			idx += len(self)
+		states = self.states[self.state_offsets[idx]:self.state_offsets[idx + 1]]
+		actions = self.actions[self.action_offsets[idx]:self.action_offsets[idx + 1]]
+		return {
+			"states": states,
+			"actions": actions,
+			"x0": states[0],
+			"xf": states[-1],
+			"T": len(actions),
+			"aabb": self.aabbs[idx],
+		}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("robot_type", help="name of robot type")
+	parser.add_argument("motions", help="input file (msgpack)")
+	parser.add_argument("output", help="output file (binary motion library)")
+	args = parser.parse_args()
+
+	with open(args.motions, 'rb') as f:
+		motions = []
+		for batch in msgpack.Unpacker(f):
+			motions.extend(batch)
+	write(args.output, motions, args.robot_type)
+	print("Wrote {} motions to {}".format(len(motions), args.output))
+
+
+if __name__ == "__main__":
+	main()
@@ -1,5 +1,5 @@
 import jax.numpy as np
-from jax import lax
+from jax import jacfwd, jit, lax, vmap
 
 def normalize_angle(angle):
 	return (angle + np.pi) % (2 * np.pi) - np.pi
@@ -53,7 +53,45 @@ def qnormalize(q):
 	return q / np.linalg.norm(q)
 
 
-class RobotUnicycleFirstOrder:
+class Robot:
+	"""Functions of whole trajectories, built from step(state, action)
+
+	They are compiled on first use; jax compiles them again for each new horizon length.
+	"""
+
+	def rollout(self, x0, actions):
+		"""States (T+1) when applying the actions (T) starting at x0"""
+		return self._compiled("rollout", self._rollout)(x0, actions)
+
+	def linearize_trajectory(self, states, actions):
+		"""Next states f[t] = step(states[t], actions[t]), and the Jacobians
+		A[t] (w.r.t. the state) and B[t] (w.r.t. the action) for each of the T
+		actions (states may contain T or T+1 states)
+		"""
+		return self._compiled("linearize_trajectory", self._linearize_trajectory)(states[0:len(actions)], actions)
+
+	def _compiled(self, name, fn):
+		if not hasattr(self, "_compiled_fns"):
+			self._compiled_fns = dict()
+		if name not in self._compiled_fns:
+			self._compiled_fns[name] = jit(fn)
+		return self._compiled_fns[name]
+
+	def _rollout(self, x0, actions):
+		def f(state, action):
+			state_next = self.step(state, action)
+			return state_next, state_next
+		_, states = lax.scan(f, x0, actions)
+		return np.concatenate((x0[np.newaxis], states))
+
+	def _linearize_trajectory(self, states, actions):
+		f = vmap(self.step)(states, actions)
+		A = vmap(jacfwd(self.step, 0))(states, actions)
+		B = vmap(jacfwd(self.step, 1))(states, actions)
+		return f, A, B
+
+
+class RobotUnicycleFirstOrder(Robot):
 
 	def __init__(self, v_min, v_max, w_min, w_max):
 		self.action_desc = ["v [m/s]", "w [rad/s]"]
@@ -68,24 +106,25 @@ class RobotUnicycleFirstOrder:
 		self.is2D = True
 
 	def valid_state(self, state):
-		return 	(state >= self.min_x).all() and \
+		return 	(state >= self.min_x).all() & \
 				(state <= self.max_x).all()
 
-	def step(self, state, action):
+	def step(self, state, action, dt=None):
+		dt = self.dt if dt is None else dt
 		x, y, yaw = state
 		v, w = action
 
-		yaw_next = yaw + w * self.dt
+		yaw_next = yaw + w * dt
 		yaw_next_norm = (yaw_next + np.pi) % (2 * np.pi) - np.pi
-		x_next = x + v * np.cos(yaw_next_norm) * self.dt
-		y_next = y + v * np.sin(yaw_next_norm) * self.dt
+		x_next = x + v * np.cos(yaw_next_norm) * dt
+		y_next = y + v * np.sin(yaw_next_norm) * dt
 		# normalize yaw between -pi and pi
 
 		state_next = np.array([x_next, y_next, yaw_next_norm])
 		return state_next
 
 
-class RobotUnicycleSecondOrder:
+class RobotUnicycleSecondOrder(Robot):
 
 	def __init__(self, v_limit, w_limit, a_limit, w_dot_limit):
 		self.action_desc = ["a [m^2/s]", "w_dot [rad^2/s]"]
@@ -100,20 +139,21 @@ class RobotUnicycleSecondOrder:
 		self.is2D = True
 
 	def valid_state(self, state):
-		return 	(state >= self.min_x).all() and \
+		return 	(state >= self.min_x).all() & \
 				(state <= self.max_x).all()
 
-	def step(self, state, action):
+	def step(self, state, action, dt=None):
+		dt = self.dt if dt is None else dt
 		x, y, yaw, v, w = state
 		a, w_dot = action
 
 		# For compatibility with KOMO, update v and yaw first
-		v_next = v + a * self.dt
-		w_dot_next = w + w_dot * self.dt
-		yaw_next = yaw + w_dot_next * self.dt
+		v_next = v + a * dt
+		w_dot_next = w + w_dot * dt
+		yaw_next = yaw + w_dot_next * dt
 		yaw_next_norm = (yaw_next + np.pi) % (2 * np.pi) - np.pi
-		x_next = x + v_next * np.cos(yaw_next) * self.dt
-		y_next = y + v_next * np.sin(yaw_next) * self.dt
+		x_next = x + v_next * np.cos(yaw_next) * dt
+		y_next = y + v_next * np.sin(yaw_next) * dt
 
 		# x_next = x + v * np.cos(yaw) * dt
 		# y_next = y + v * np.sin(yaw) * dt
@@ -125,7 +165,7 @@ class RobotUnicycleSecondOrder:
 
 
 # LaValle book, Equation 13.19
-class RobotCarFirstOrderWithTrailers:
+class RobotCarFirstOrderWithTrailers(Robot):
 
 	def __init__(self, v_min, v_max, phi_min, phi_max, L, hitch_lengths):
 		self.action_desc = ["v [m/s]", "steering angle [rad]"]
@@ -151,11 +191,11 @@ class RobotCarFirstOrderWithTrailers:
 		# check if theta0 and theta1 have a reasonable relative angle
 		dangle = diff_angle(state[2], state[3])
 
-		return 	(state >= self.min_x).all() and \
-				(state <= self.max_x).all() and \
-				np.absolute(dangle) <= np.pi / 4
+		return 	(state >= self.min_x).all() & \
+				(state <= self.max_x).all() & \
+				(np.absolute(dangle) <= np.pi / 4)
 
-	def step(self, state, action):
+	def step(self, state, action, dt=None):
 		""""
 		x_dot = v * cos (theta_0)
 		y_dot = v * sin (theta_0)
@@ -163,14 +203,15 @@ class RobotCarFirstOrderWithTrailers:
 		theta_1_dot = v / hitch_lengths[0] * sin(theta_0 - theta_1)
 		...
 		"""
+		dt = self.dt if dt is None else dt
 		x, y, yaw = state[0], state[1], state[2]
 		v, phi = action
 
-		yaw_next = yaw + v / self.L * np.tan(phi) * self.dt
+		yaw_next = yaw + v / self.L * np.tan(phi) * dt
 		# normalize yaw between -pi and pi
 		yaw_next_norm = normalize_angle(yaw_next)
-		x_next = x + v * np.cos(yaw_next) * self.dt
-		y_next = y + v * np.sin(yaw_next) * self.dt
+		x_next = x + v * np.cos(yaw_next) * dt
+		y_next = y + v * np.sin(yaw_next) * dt
 
 		state_next_list = [x_next, y_next, yaw_next_norm]
 
@@ -181,7 +222,7 @@ class RobotCarFirstOrderWithTrailers:
 			theta_dot *= np.sin(state[2+i] - state[3+i])
 
 			theta = state[3+i]
-			theta_next = theta + theta_dot * self.dt
+			theta_next = theta + theta_dot * dt
 			theta_next_norm = normalize_angle(theta_next)
 			state_next_list.append(theta_next_norm)
 
@@ -189,7 +230,7 @@ class RobotCarFirstOrderWithTrailers:
 		return state_next
 
 
-class Quadrotor:
+class Quadrotor(Robot):
 
 	def __init__(self):
 		self.action_desc = ["f1 [N]", "f2 [N]", "f3 [N]", "f4 [N]"]
@@ -244,10 +285,11 @@ class Quadrotor:
 		self.is2D = False
 
 	def valid_state(self, state):
-		return 	(state >= self.min_x).all() and \
+		return 	(state >= self.min_x).all() & \
 				(state <= self.max_x).all()
 
-	def step(self, state, action):
+	def step(self, state, action, dt=None):
+		dt = self.dt if dt is None else dt
 		# compute next state
 		state = np.asarray(state)
 		action = np.asarray(action)
@@ -261,20 +303,20 @@ class Quadrotor:
 
 		# dynamics
 		# dot{p} = v
-		pos_next = state[0:3] + state[7:10] * self.dt
+		pos_next = state[0:3] + state[7:10] * dt
 		# mv = mg + R f_u
 		vel_next = state[7:10] + (np.array([0, 0, -self.g]) +
-		                         qrotate(q, f_u) / self.mass) * self.dt
+		                         qrotate(q, f_u) / self.mass) * dt
 
 		# dot{R} = R S(w)
 		# to integrate the dynamics, see
 		# https://www.ashwinnarayan.com/post/how-to-integrate-quaternions/, and
 		# https://arxiv.org/pdf/1604.08139.pdf
-		q_next = qnormalize(qintegrate(q, omega, self.dt))
+		q_next = qnormalize(qintegrate(q, omega, dt))
 
 		# mJ = Jw x w + tau_u
 		omega_next = state[10:] + (self.inv_J *
-		                           (np.cross(self.J * omega, omega) + tau_u)) * self.dt
+		                           (np.cross(self.J * omega, omega) + tau_u)) * dt
 
 		return np.concatenate((pos_next, q_next[1:4], q_next[0:1], vel_next, omega_next))
 
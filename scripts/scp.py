@@ -1,22 +1,399 @@
 import cvxpy as cp
 import jax.numpy as np  # Thinly-wrapped numpy
 import numpy
-from jax import jacfwd, jit
+
+
+class SCPProblem():
+  """Convex subproblem of SCP for a fixed horizon T
+
+  The problem is built (and canonicalized by cvxpy) once; SCP iterations only
+  update the parameters: the dynamics linearized around the previous solution,
+  the trust region centers, and the collision half-planes.
+  """
+  def __init__(self, robot, T, soft_xf, trust_x, trust_u, collisions, solver="GUROBI"):
+    stateDim = len(robot.state_desc)
+    actionDim = len(robot.action_desc)
+
+    self.x = cp.Variable((T, stateDim))
+    self.u = cp.Variable((T-1, actionDim))
+    self.x0 = cp.Parameter(stateDim)
+    self.xf = cp.Parameter(stateDim)
+
+    # linearized dynamics x[t+1] == c[t] + A[t] @ x[t] + B[t] @ u[t], where
+    # each row of A and B is the flattened (row-major) matrix of timestep t
+    self.c = cp.Parameter((T-1, stateDim))
+    self.A = cp.Parameter((T-1, stateDim * stateDim))
+    self.B = cp.Parameter((T-1, stateDim * actionDim))
+
+    x, u = self.x, self.u
+    constraints = [
+      x[0] == self.x0, # initial state constraint
+    ]
+
+    # this objective helps to keep the control somewhat smooth,
+    # otherwise, the output is spiky
+    if soft_xf:
+      objective = cp.Minimize(cp.sum_squares(u) + 1e6 * cp.norm(x[-1] - self.xf, "inf"))
+    else:
+      objective = cp.Minimize(cp.sum_squares(u))
+      constraints.append(x[-1] == self.xf) # final state constraint
+
+    # trust region (centered at the previous solution)
+    self.xprev = cp.Parameter((T, stateDim))
+    self.uprev = cp.Parameter((T-1, actionDim))
+    self.trust_x = None
+    self.trust_u = None
+    if trust_x:
+      self.trust_x = cp.Parameter((T, stateDim), nonneg=True)
+      constraints.append(cp.abs(x - self.xprev) <= self.trust_x)
+    if trust_u:
+      self.trust_u = cp.Parameter((T-1, actionDim), nonneg=True)
+      constraints.append(cp.abs(u - self.uprev) <= self.trust_u)
+
+    # dynamics constraints (one per state dimension for all timesteps)
+    for i in range(stateDim):
+      rhs = self.c[:, i]
+      for j in range(stateDim):
+        rhs = rhs + cp.multiply(self.A[:, i * stateDim + j], x[:-1, j])
+      for j in range(actionDim):
+        rhs = rhs + cp.multiply(self.B[:, i * actionDim + j], u[:, j])
+      constraints.append(x[1:, i] == rhs)
+
+    # bounds on u and x
+    constraints.extend([
+      numpy.tile(robot.min_u, (T-1, 1)) <= u,
+      u <= numpy.tile(robot.max_u, (T-1, 1)),
+      numpy.tile(robot.min_x, (T, 1)) <= x,
+      x <= numpy.tile(robot.max_x, (T, 1)),
+    ])
+
+    # collision constraints: half-planes normal[t] @ x[t,0:2] + offset[t] >= 0
+    self.normal = None
+    self.offset = None
+    if collisions:
+      self.normal = cp.Parameter((T, 2))
+      self.offset = cp.Parameter(T)
+      constraints.append(
+        cp.multiply(self.normal[:, 0], x[:, 0]) + cp.multiply(self.normal[:, 1], x[:, 1]) + self.offset >= 0.0
+      )
+
+    self.problem = cp.Problem(objective, constraints)
+    self.solver = getattr(cp, solver)
+
+  def set_x0_xf(self, x0, xf):
+    self.x0.value = numpy.asarray(x0, dtype=numpy.float64)
+    self.xf.value = numpy.asarray(xf, dtype=numpy.float64)
+
+  def update(self, robot, xprev, uprev, trust_x=None, trust_u=None):
+    """Linearize around the previous solution"""
+    T = xprev.shape[0]
+    F, A, B = robot.linearize_trajectory(xprev, uprev)
+    F, A, B = numpy.asarray(F), numpy.asarray(A), numpy.asarray(B)
+    # F[t] + A[t] @ (x[t] - xprev[t]) + B[t] @ (u[t] - uprev[t])
+    self.c.value = F - numpy.einsum('tij,tj->ti', A, xprev[:-1]) - numpy.einsum('tij,tj->ti', B, uprev)
+    self.A.value = A.reshape(T-1, -1)
+    self.B.value = B.reshape(T-1, -1)
+    self.xprev.value = numpy.asarray(xprev, dtype=numpy.float64)
+    self.uprev.value = numpy.asarray(uprev, dtype=numpy.float64)
+    if self.trust_x is not None:
+      self.trust_x.value = numpy.broadcast_to(trust_x, self.trust_x.shape)
+    if self.trust_u is not None:
+      self.trust_u.value = numpy.broadcast_to(trust_u, self.trust_u.shape)
+
+    # set initial guesses for warm start
+    self.x.value = xprev
+    self.u.value = uprev
+
+  def update_collisions(self, xprev, dists, p_obss, p_robots):
+    # See 12a in "Convex optimization for proximity maneuvering of a spacecraft with a robotic manipulator"
+    # Also used in GuSTO
+    d_tilde = numpy.where((dists > 0)[:, numpy.newaxis], p_robots - p_obss, p_obss - p_robots)
+    norm_d_tilde = numpy.linalg.norm(d_tilde, axis=1)
+    d_hat = numpy.zeros_like(d_tilde)
+    has_normal = norm_d_tilde > 0
+    d_hat[has_normal] = d_tilde[has_normal] / norm_d_tilde[has_normal, numpy.newaxis]
+    # dist_tilde + d_hat[0:2].T @ (x[t,0:2] - xprev[t,0:2]) >= 0 (or 0 >= 0 without a normal)
+    normal = d_hat[:, 0:2]
+    self.normal.value = normal
+    self.offset.value = numpy.where(has_normal, dists - numpy.sum(normal * xprev[:, 0:2], axis=1), 0.0)
+
+  def solve(self, verbose=False):
+    """Returns the status ("optimal" in it on success), the objective value, and solver statistics"""
+    prob = self.problem
+    # The optimal objective value is returned by `prob.solve()`.
+    try:
+      # result = prob.solve(verbose=True, warm_start=True,solver=cp.GUROBI, BarQCPConvTol=1e-9)
+      prob.solve(verbose=verbose, solver=self.solver, warm_start=True)
+      # result = prob.solve(verbose=True, warm_start=True, solver=cp.OSQP, max_iter=1000000)
+    except cp.error.SolverError:
+      # print("Warning: Solver failed!")
+      return "solver_error", float('inf'), dict()
+    except KeyError:
+      # print("Warning BarQCPConvTol too big?")
+      return "solver_error", float('inf'), dict()
+    stats = {
+      "solve_time": prob.solver_stats.solve_time,
+      "iterations": prob.solver_stats.num_iters,
+    }
+    return prob.status, prob.value, stats
+
+  def solution(self):
+    return self.x.value, self.u.value
+
+  def warm_start_from(self, other):
+    # cvxpy warm starts from the values of the variables only (see update)
+    pass
+
+
+class OSQPProblem():
+  """Same as SCPProblem, but assembled directly as a sparse QP and solved with OSQP
+
+  The decision variables are z = [x (row-major), u (row-major), s], where s is
+  the slack of the soft final state constraint (soft_xf only). The constraints
+  are l <= A z <= u, with the rows (in order) for the initial state, the
+  dynamics, the final state, the bounds of x and u (intersected with the trust
+  region), s >= 0, and the collision half-planes. The sparsity pattern is
+  fixed, so updates only change values, and OSQP warm starts from the
+  previous primal and dual solution.
+  """
+  def __init__(self, robot, T, soft_xf, trust_x, trust_u, collisions, verbose=False):
+    import osqp
+    from scipy import sparse
+
+    n = len(robot.state_desc)
+    m = len(robot.action_desc)
+    self.T, self.n, self.m = T, n, m
+    self.soft_xf = soft_xf
+    self.min_x = numpy.asarray(robot.min_x, dtype=numpy.float64)
+    self.max_x = numpy.asarray(robot.max_x, dtype=numpy.float64)
+    self.min_u = numpy.asarray(robot.min_u, dtype=numpy.float64)
+    self.max_u = numpy.asarray(robot.max_u, dtype=numpy.float64)
+
+    # variables
+    idx_x = numpy.arange(T * n).reshape(T, n)
+    idx_u = T * n + numpy.arange((T-1) * m).reshape(T-1, m)
+    num_vars = T * n + (T-1) * m + (1 if soft_xf else 0)
+    idx_s = num_vars - 1
+    # blocks of z and of the rows as (name, number of timesteps, width)
+    self.var_blocks = [("x", T, n), ("u", T-1, m)] + ([("s", 1, 1)] if soft_xf else [])
+    self.row_blocks = []
+
+    # constraint matrix in coordinate format
+    rows, cols, data = [], [], []
+    def add_block(name, num, width):
+      start = sum(b[1] * b[2] for b in self.row_blocks)
+      self.row_blocks.append((name, num, width))
+      return start + numpy.arange(num * width).reshape(num, width)
+
+    def add_entries(r, c, v):
+      start = sum(len(e) for e in data)
+      r, c = numpy.broadcast_arrays(r, c)
+      rows.append(r.ravel())
+      cols.append(c.ravel())
+      data.append(numpy.broadcast_to(v, r.shape).astype(numpy.float64).ravel())
+      return start + numpy.arange(r.size).reshape(r.shape)
+
+    r = add_block("x0", 1, n)
+    add_entries(r[0], idx_x[0], 1)
+    # x[t+1] - A[t] x[t] - B[t] u[t] == c[t]
+    r = add_block("dynamics", T-1, n)
+    add_entries(r, idx_x[1:], 1)
+    self.pos_A = add_entries(r[:, :, numpy.newaxis], idx_x[:-1, numpy.newaxis, :], 0)
+    self.pos_B = add_entries(r[:, :, numpy.newaxis], idx_u[:, numpy.newaxis, :], 0)
+    if soft_xf:
+      # |x[-1] - xf| <= s
+      r = add_block("xf", 2, n)
+      add_entries(r, idx_x[-1], 1)
+      add_entries(r[0], idx_s, -1)
+      add_entries(r[1], idx_s, 1)
+    else:
+      r = add_block("xf", 1, n)
+      add_entries(r[0], idx_x[-1], 1)
+    r = add_block("x", T, n)
+    add_entries(r, idx_x, 1)
+    r = add_block("u", T-1, m)
+    add_entries(r, idx_u, 1)
+    if soft_xf:
+      r = add_block("s", 1, 1)
+      add_entries(r, idx_s, 1)
+    self.collisions = collisions
+    if collisions:
+      # normal[t] @ x[t,0:2] >= -offset[t]
+      r = add_block("collisions", T, 1)
+      self.pos_normal = add_entries(r, idx_x[:, 0:2], 0)
+
+    rows, cols = numpy.concatenate(rows), numpy.concatenate(cols)
+    self.data = numpy.concatenate(data)
+    num_rows = sum(b[1] * b[2] for b in self.row_blocks)
+    # order of the entries in compressed sparse column format
+    self.csc_order = numpy.lexsort((rows, cols))
+    A = sparse.csc_matrix(
+      (self.data[self.csc_order], rows[self.csc_order], numpy.searchsorted(cols[self.csc_order], numpy.arange(num_vars + 1))),
+      shape=(num_rows, num_vars))
+
+    # objective: sum_squares(u) (+ 1e6 s)
+    P = sparse.diags(numpy.concatenate((numpy.zeros(T * n), 2 * numpy.ones((T-1) * m), numpy.zeros(num_vars - idx_u.size - idx_x.size)))).tocsc()
+    self.q = numpy.zeros(num_vars)
+    self.q_hard = numpy.zeros(num_vars)
+    if soft_xf:
+      self.q[idx_s] = 1e6
+    self.l = numpy.zeros(num_rows)
+    self.u = numpy.zeros(num_rows)
+    self.rows = {b[0]: r for b, r in zip(self.row_blocks, numpy.split(numpy.arange(num_rows), numpy.cumsum([b[1] * b[2] for b in self.row_blocks])[:-1]))}
+
+    self.solver = osqp.OSQP()
+    self.solver.setup(P, self.q, A, self.l, self.u,
+      verbose=verbose, warm_starting=True, polishing=True,
+      eps_abs=1e-6, eps_rel=1e-6, max_iter=100000)
+    self.x0 = None
+    self.xf = None
+    self.result = None
+
+  def set_x0_xf(self, x0, xf):
+    self.x0 = numpy.asarray(x0, dtype=numpy.float64)
+    self.xf = numpy.asarray(xf, dtype=numpy.float64)
+    self.l[self.rows["x0"]] = self.u[self.rows["x0"]] = self.x0
+    if self.soft_xf:
+      xf_rows = self.rows["xf"].reshape(2, self.n)
+      self.l[xf_rows[0]], self.u[xf_rows[0]] = -numpy.inf, self.xf
+      self.l[xf_rows[1]], self.u[xf_rows[1]] = self.xf, numpy.inf
+      self.l[self.rows["s"]], self.u[self.rows["s"]] = 0, numpy.inf
+    else:
+      self.l[self.rows["xf"]] = self.u[self.rows["xf"]] = self.xf
+
+  def update(self, robot, xprev, uprev, trust_x=None, trust_u=None):
+    """Linearize around the previous solution"""
+    F, A, B = robot.linearize_trajectory(xprev, uprev)
+    F, A, B = numpy.asarray(F), numpy.asarray(A), numpy.asarray(B)
+    xprev = numpy.asarray(xprev, dtype=numpy.float64)
+    uprev = numpy.asarray(uprev, dtype=numpy.float64)
+    self.data[self.pos_A] = -A
+    self.data[self.pos_B] = -B
+    c = F - numpy.einsum('tij,tj->ti', A, xprev[:-1]) - numpy.einsum('tij,tj->ti', B, uprev)
+    self.l[self.rows["dynamics"]] = self.u[self.rows["dynamics"]] = c.ravel()
+
+    # bounds, intersected with the trust region
+    lx, ux = numpy.tile(self.min_x, (self.T, 1)), numpy.tile(self.max_x, (self.T, 1))
+    if trust_x is not None:
+      lx, ux = numpy.maximum(lx, xprev - trust_x), numpy.minimum(ux, xprev + trust_x)
+    lu, uu = numpy.tile(self.min_u, (self.T-1, 1)), numpy.tile(self.max_u, (self.T-1, 1))
+    if trust_u is not None:
+      lu, uu = numpy.maximum(lu, uprev - trust_u), numpy.minimum(uu, uprev + trust_u)
+    self.l[self.rows["x"]], self.u[self.rows["x"]] = lx.ravel(), ux.ravel()
+    self.l[self.rows["u"]], self.u[self.rows["u"]] = lu.ravel(), uu.ravel()
+
+    # set initial guesses for warm start (the duals are kept from the previous solve)
+    z = [xprev.ravel(), uprev.ravel()]
+    if self.soft_xf:
+      z.append([numpy.max(numpy.abs(xprev[-1] - self.xf))])
+    self.solver.warm_start(x=numpy.concatenate(z))
+
+  def update_collisions(self, xprev, dists, p_obss, p_robots):
+    d_tilde = numpy.where((dists > 0)[:, numpy.newaxis], p_robots - p_obss, p_obss - p_robots)
+    norm_d_tilde = numpy.linalg.norm(d_tilde, axis=1)
+    d_hat = numpy.zeros_like(d_tilde)
+    has_normal = norm_d_tilde > 0
+    d_hat[has_normal] = d_tilde[has_normal] / norm_d_tilde[has_normal, numpy.newaxis]
+    normal = d_hat[:, 0:2]
+    self.data[self.pos_normal] = normal
+    offset = numpy.where(has_normal, dists - numpy.sum(normal * numpy.asarray(xprev)[:, 0:2], axis=1), 0.0)
+    self.l[self.rows["collisions"]], self.u[self.rows["collisions"]] = -offset, numpy.inf
+
+  def solve(self, verbose=False):
+    """Returns the status ("optimal" in it on success), the objective value, and solver statistics"""
+    stats = {"solve_time": 0, "iterations": 0}
+    def solve_once():
+      self.solver.update(l=self.l, u=self.u, Ax=self.data[self.csc_order])
+      self.result = self.solver.solve(raise_error=False)
+      stats["solve_time"] += self.result.info.solve_time
+      stats["iterations"] += self.result.info.iter
+      return self.result.info.status
+
+    if self.soft_xf:
+      # OSQP converges very slowly with the large penalty of s. Since the
+      # penalty is exact, first solve without it and with s = 0 (i.e., with a
+      # hard final state constraint). This is optimal if the multiplier of
+      # s = 0 is at most the penalty.
+      self.u[self.rows["s"]] = 0
+      self.solver.update(q=self.q_hard)
+      status = solve_once()
+      self.u[self.rows["s"]] = numpy.inf
+      self.solver.update(q=self.q)
+      if status != "solved" or self.result.y[self.rows["s"]][0] > 1e6:
+        status = solve_once()
+    else:
+      status = solve_once()
+
+    # same statuses as cvxpy
+    if status == "solved":
+      return "optimal", self.result.info.obj_val, stats
+    if status == "solved inaccurate":
+      return "optimal_inaccurate", self.result.info.obj_val, stats
+    return status, float('inf'), stats
+
+  def solution(self):
+    z = self.result.x
+    x = z[0:self.T * self.n].reshape(self.T, self.n)
+    u = z[self.T * self.n:self.T * self.n + (self.T-1) * self.m].reshape(self.T-1, self.m)
+    return x, u
+
+  def warm_start_from(self, other):
+    """Warm start from the solution of the same problem for a different T,
+    resampled in time"""
+    if other.result is None or other.result.x is None:
+      return
+    self.solver.warm_start(
+      x=_resample_blocks(other.result.x, other.var_blocks, self.var_blocks),
+      y=_resample_blocks(other.result.y, other.row_blocks, self.row_blocks))
+
+
+def _resample_blocks(values, blocks, new_blocks):
+  # linearly interpolate each block (number of timesteps x width) to its new number of timesteps
+  result = []
+  start = 0
+  for (_, num, width), (_, new_num, _) in zip(blocks, new_blocks):
+    block = numpy.nan_to_num(values[start:start + num * width].reshape(num, width))
+    start += num * width
+    t = numpy.linspace(0, 1, num)
+    t_new = numpy.linspace(0, 1, new_num)
+    result.append(numpy.stack([numpy.interp(t_new, t, block[:, k]) for k in range(width)], axis=1).ravel())
+  return numpy.concatenate(result)
+
 
 class SCP():
-  def __init__(self, robot, collisionChecker=None):
+  def __init__(self, robot, collisionChecker=None, backend="cvxpy", solver="GUROBI"):
+    """backend is either "cvxpy" (using the given solver) or "osqp" """
     self.robot = robot
     self.collisionChecker = collisionChecker
-    self.constructA = jit(jacfwd(robot.step, 0))
-    self.constructB = jit(jacfwd(robot.step, 1))
-    self.step = jit(robot.step)
+    self.backend = backend
+    self.solver = solver
+    # built problems, see SCPProblem and OSQPProblem
+    self.problems = dict()
+    # statistics of each solved subproblem
+    self.stats = []
+
+  def problem(self, T, soft_xf, trust_x, trust_u, collisions):
+    key = (T, soft_xf, trust_x is not None, trust_u is not None, collisions)
+    if key not in self.problems:
+      if self.backend == "cvxpy":
+        problem = SCPProblem(self.robot, *key, solver=self.solver)
+      elif self.backend == "osqp":
+        problem = OSQPProblem(self.robot, *key)
+      else:
+        raise Exception("Unknown SCP backend {}!".format(self.backend))
+      # warm start from the problem with the closest T
+      others = [k for k in self.problems if k[1:] == key[1:]]
+      if len(others) > 0:
+        problem.warm_start_from(self.problems[min(others, key=lambda k: abs(k[0] - T))])
+      self.problems[key] = problem
+    return self.problems[key]
 
   def min_xf(self,
     initial_x,
     initial_u,
     x0,
     xf,
-    num_iterations=10, 
+    num_iterations=10,
     trust_x = None,
     trust_u = None,
     verbose = False):
@@ -26,82 +403,24 @@ class SCP():
     xprev = initial_x
     uprev = initial_u
     T = xprev.shape[0]
-    stateDim = xprev.shape[1]
-    actionDim = uprev.shape[1]
-
-    for _ in range(num_iterations):
-      x = cp.Variable((T, stateDim))
-      u = cp.Variable((T-1, actionDim))
-
-      # set initial guesses for warm start
-      x.value = xprev
-      u.value = uprev
 
-      # this objective helps to keep the control somewhat smooth,
-      # otherwise, the output is spiky
-      cp_objective = cp.Minimize(cp.sum_squares(u) + 1e6 * cp.norm(x[-1] - xf, "inf"))
-      # cp_objective = cp.Minimize(cp.norm(x[-1] - xf, "inf"))
+    problem = self.problem(T, True, trust_x, trust_u, False)
+    problem.set_x0_xf(x0, xf)
 
-      constraints = [
-        x[0] == x0, # initial state constraint
-      ]
+    for _ in range(num_iterations):
+      problem.update(self.robot, xprev, uprev, trust_x, trust_u)
 
-      # trust region
-      if trust_x is not None:
-        for t in range(0, T):
-          constraints.append(
-            cp.abs(x[t] - xprev[t]) <= trust_x
-          )
-      if trust_u is not None:
-        for t in range(0, T-1):
-          constraints.append(
-            cp.abs(u[t] - uprev[t]) <= trust_u
-          )
-
-      # dynamics constraints
-      for t in range(0, T-1):
-        xbar = xprev[t]
-        ubar = uprev[t]
-
-        A = self.constructA(xbar, ubar)
-        B = self.constructB(xbar, ubar)
-        constraints.append(
-          x[t+1] == self.step(xbar, ubar) + A @ (x[t] - xbar) + B @ (u[t] - ubar)
-          )
-
-      # bounds on u
-      for t in range(0, T-1):
-        constraints.extend([
-          self.robot.min_u <= u[t],
-          u[t] <= self.robot.max_u
-          ])
-
-      # bounds on x
-      for t in range(0, T):
-        constraints.extend([
-          self.robot.min_x <= x[t],
-          x[t] <= self.robot.max_x
-          ])
-
-      prob = cp.Problem(cp_objective, constraints)
-
-      # The optimal objective value is returned by `prob.solve()`.
-      try:
-        # result = prob.solve(verbose=True, warm_start=True,solver=cp.GUROBI, BarQCPConvTol=1e-9)
-        result = prob.solve(verbose=verbose, solver=cp.GUROBI)
-        # result = prob.solve(verbose=True, warm_start=True, solver=cp.OSQP, max_iter=1000000)
-      except cp.error.SolverError:
-        # print("Warning: Solver failed!")
-        return X, U, float('inf')
-      except KeyError:
-        # print("Warning BarQCPConvTol too big?")
+      status, value, stats = problem.solve(verbose)
+      self.stats.append({"T": T, "status": status, **stats})
+      if status == "solver_error":
         return X, U, float('inf')
 
-      if 'optimal' not in prob.status:
+      if 'optimal' not in status:
         return X, U, float('inf')
 
-      xprev = numpy.array(x.value, dtype=np.float32)
-      uprev = numpy.array(u.value, dtype=np.float32)
+      x_value, u_value = problem.solution()
+      xprev = numpy.array(x_value, dtype=np.float32)
+      uprev = numpy.array(u_value, dtype=np.float32)
       X.append(xprev)
       U.append(uprev)
 
@@ -111,11 +430,11 @@ class SCP():
       # print("max error to goal: ", max_error_to_goal)
 
       if max_error_to_goal < 1e-5:
-        return X, U, prob.value
+        return X, U, value
 
     return X, U, float('inf')
 
-  def min_u(self, initial_x, initial_u, 
+  def min_u(self, initial_x, initial_u,
              x0, xf,
              num_iterations=10,
              trust_x=None,
@@ -129,123 +448,48 @@ class SCP():
     xprev = initial_x
     uprev = initial_u
     T = xprev.shape[0]
-    stateDim = xprev.shape[1]
-    actionDim = uprev.shape[1]
 
     # DEBUG
     if self.collisionChecker is not None:
+        dists, _, _ = self.collisionChecker.distance_batch(xprev)
         for t in range(0, T):
           # See 12a in "Convex optimization for proximity maneuvering of a spacecraft with a robotic manipulator"
           # Also used in GuSTO
-          dist_tilde, p_obs, p_robot = self.collisionChecker.distance(
-              xprev[t])
-          if dist_tilde < 0:
+          if dists[t] < 0:
             print("Warning: initial solution distance violation at t={}".format(t))
 
-    for _ in range(num_iterations):
-      x = cp.Variable((T, stateDim))
-      u = cp.Variable((T-1, actionDim))
+    problem = self.problem(T, soft_xf, trust_x, trust_u, self.collisionChecker is not None)
+    problem.set_x0_xf(x0, xf)
 
-      # set initial guesses for warm start
-      x.value = xprev
-      u.value = uprev
-
-      constraints = [
-          x[0] == x0,  # initial state constraint
-      ]
-
-      if soft_xf:
-        cp_objective = cp.Minimize(cp.sum_squares(u) + 1e6 * cp.norm(x[-1] - xf, "inf"))
-      else:
-        cp_objective = cp.Minimize(cp.sum_squares(u))
-        constraints.append(x[-1] == xf)  # final state constraint
-
-      # trust region
-      if trust_x is not None:
-        for t in range(0, T):
-          constraints.append(
-              cp.abs(x[t] - xprev[t]) <= trust_x
-          )
-      if trust_u is not None:
-        for t in range(0, T-1):
-          constraints.append(
-              cp.abs(u[t] - uprev[t]) <= trust_u
-          )
-
-      # dynamics constraints
-      for t in range(0, T-1):
-        xbar = xprev[t]
-        ubar = uprev[t]
-
-        A = self.constructA(xbar, ubar)
-        B = self.constructB(xbar, ubar)
-        constraints.append(
-            x[t+1] == self.step(xbar, ubar) + A @ (x[t] - xbar) + B @ (u[t] - ubar)
-        )
-
-      # bounds on u
-      for t in range(0, T-1):
-        constraints.extend([
-            self.robot.min_u <= u[t],
-            u[t] <= self.robot.max_u
-        ])
-
-      # bounds on x
-      for t in range(0, T):
-        constraints.extend([
-            self.robot.min_x <= x[t],
-            x[t] <= self.robot.max_x
-        ])
+    for _ in range(num_iterations):
+      problem.update(self.robot, xprev, uprev, trust_x, trust_u)
 
       # collision constraints
       if self.collisionChecker is not None:
-        for t in range(0, T):
-          # See 12a in "Convex optimization for proximity maneuvering of a spacecraft with a robotic manipulator"
-          # Also used in GuSTO
-          dist_tilde, p_obs, p_robot = self.collisionChecker.distance(xprev[t])
-          if dist_tilde > 0:
-            d_tilde = p_robot - p_obs
-          else:
-            d_tilde = p_obs - p_robot
-
-
-          norm_d_tilde = numpy.linalg.norm(d_tilde)
-          if norm_d_tilde > 0:
-            d_hat = d_tilde / norm_d_tilde
-
-            constraints.extend([
-              dist_tilde + d_hat[0:2].T @ (x[t,0:2] - xprev[t,0:2]) >= 0.0
-            ])
-
-      prob = cp.Problem(cp_objective, constraints)
-
-      # The optimal objective value is returned by `prob.solve()`.
-      try:
-        # result = prob.solve(verbose=True, warm_start=True,solver=cp.GUROBI, BarQCPConvTol=1e-9)
-        result = prob.solve(verbose=verbose, solver=cp.GUROBI)
-        # result = prob.solve(verbose=True, warm_start=True, solver=cp.OSQP, max_iter=1000000)
-      except cp.error.SolverError:
-        # print("Warning: Solver failed!")
-        return X, U, float('inf')
-      except KeyError:
-        # print("Warning BarQCPConvTol too big?")
+        dists, p_obss, p_robots = self.collisionChecker.distance_batch(xprev)
+        problem.update_collisions(xprev, dists, p_obss, p_robots)
+
+      status, value, stats = problem.solve(verbose)
+      self.stats.append({"T": T, "status": status, **stats})
+      if status == "solver_error":
         return X, U, float('inf')
 
-      if 'optimal' not in prob.status:
-        return X, U, prob.value
+      if 'optimal' not in status:
+        return X, U, value
+      x_value, u_value = problem.solution()
 
       # DEBUG
       if self.collisionChecker is not None:
+        dists, _, _ = self.collisionChecker.distance_batch(x_value)
         for t in range(0, T):
           # See 12a in "Convex optimization for proximity maneuvering of a spacecraft with a robotic manipulator"
           # Also used in GuSTO
-          dist_tilde, p_obs, p_robot = self.collisionChecker.distance(x.value[t])
-          if dist_tilde < 0:
-            print("Warning: distance violation at t={} ({})".format(t, dist_tilde))
+          if dists[t] < 0:
+            print("Warning: distance violation at t={} ({})".format(t, dists[t]))
 
-      xprev = numpy.array(x.value, dtype=np.float32)
-      uprev = numpy.array(u.value, dtype=np.float32)
+      xprev = numpy.array(x_value, dtype=np.float32)
+      uprev = numpy.array(u_value, dtype=np.float32)
       X.append(xprev)
       U.append(uprev)
 
-    return X, U, prob.value
+    return X, U, value
@@ -1,9 +1,13 @@
 import argparse
+import hashlib
 import math
+import os
+import tempfile
 import rowan
 import numpy as np
 import yaml
 import pathlib
+import time
 from typing import List
 from string import Template
 
@@ -226,6 +230,76 @@ def write(file_in: str, file_out: str) -> None:
             g_file.write(i.to_g())
 
 
+# Cache of translated models (and rai configs), shared by all processes. Files
+# are named by the hash of their input (for models, including the source of
+# this translator), and written atomically. The least recently used files are
+# removed if there are more than CACHE_SIZE.
+CACHE_DIR = os.environ.get("TRANSLATE_G_CACHE_DIR",
+                           os.path.join(tempfile.gettempdir(), "translate_g_cache"))
+CACHE_SIZE = int(os.environ.get("TRANSLATE_G_CACHE_SIZE", 1000))
+
+_VERSION = hashlib.sha256(pathlib.Path(__file__).read_bytes()).hexdigest()
+
+
+def _cached(name: str, write_fn, cache_dir: str, cache_size: int) -> str:
+    os.makedirs(cache_dir, exist_ok=True)
+    filename = os.path.join(cache_dir, name)
+    try:
+        # mark as recently used (the modification time stays the same)
+        os.utime(filename, (time.time(), os.stat(filename).st_mtime))
+        return filename
+    except FileNotFoundError:
+        pass
+    fd, filename_tmp = tempfile.mkstemp(dir=cache_dir, prefix=".tmp_")
+    os.close(fd)
+    try:
+        write_fn(filename_tmp)
+        os.chmod(filename_tmp, 0o644)
+        os.replace(filename_tmp, filename)
+    finally:
+        if os.path.exists(filename_tmp):
+            os.remove(filename_tmp)
+    _evict(cache_dir, cache_size)
+    return filename
+
+
+def _evict(cache_dir: str, cache_size: int) -> None:
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.startswith(".tmp_"):
+            continue
+        try:
+            entries.append((entry.stat().st_atime, entry.path))
+        except FileNotFoundError:
+            pass
+    entries.sort()
+    for _, path in entries[:max(0, len(entries) - cache_size)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # removed by another process
+            pass
+
+
+def write_cached(file_in: str, cache_dir: str = None, cache_size: int = None) -> str:
+    """Translates file_in (as write), or reuses a previous translation of the
+    same content; returns the name of the .g file in the cache"""
+    with open(file_in, "rb") as f:
+        key = hashlib.sha256(f.read() + _VERSION.encode()).hexdigest()
+    return _cached(key + ".g", lambda file_out: write(file_in, file_out),
+                   cache_dir or CACHE_DIR, CACHE_SIZE if cache_size is None else cache_size)
+
+
+def write_cfg_cached(cfg: str, cache_dir: str = None, cache_size: int = None) -> str:
+    """Writes the rai config (once for each content); returns its file name in the cache"""
+    def write_cfg(file_out: str) -> None:
+        with open(file_out, "w") as f:
+            f.write(cfg)
+    key = hashlib.sha256(cfg.encode()).hexdigest()
+    return _cached(key + ".cfg", write_cfg,
+                   cache_dir or CACHE_DIR, CACHE_SIZE if cache_size is None else cache_size)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--fin", required=True, help="yaml file")
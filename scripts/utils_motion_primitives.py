@@ -11,6 +11,26 @@ import msgpack
 
 sys.path.append(os.getcwd())
 from motionplanningutils import RobotHelper
+import motion_library
+
+def append_motions(filename: str, motions: list) -> None:
+	"""Append a batch of motions to an append-only msgpack log (one array per batch)"""
+	with open(filename, 'ab') as file:
+		# motions of a motion library contain numpy arrays
+		msgpack.pack(motions, file, default=lambda o: o.tolist())
+
+
+def load_motions(filename: str):
+	"""Load all motions of a msgpack file (single array or append-only log of arrays)
+	as list, or of a binary motion library as (memory-mapped) MotionLibrary"""
+	if Path(filename).suffix == ".mlib":
+		return motion_library.MotionLibrary(filename)
+	motions = []
+	with open(filename, 'rb') as file:
+		for batch in msgpack.Unpacker(file):
+			motions.extend(batch)
+	return motions
+
 
 def sort_primitives(motions: list, robot_type: str, top_k=None) -> list:
 	rh = RobotHelper(robot_type, pos_limit=100)
@@ -18,8 +38,12 @@ def sort_primitives(motions: list, robot_type: str, top_k=None) -> list:
 	if top_k is None:
 		top_k = len(motions)
 
-	x0s = [m["x0"] for m in motions]
-	xfs = [m["xf"] for m in motions]
+	if isinstance(motions, motion_library.MotionLibrary):
+		x0s = motions.x0s.tolist()
+		xfs = motions.xfs.tolist()
+	else:
+		x0s = [m["x0"] for m in motions]
+		xfs = [m["xf"] for m in motions]
 	idxs = rh.sortMotions(x0s, xfs, top_k)
 
 	used_motions = [motions[idx] for idx in idxs]
@@ -227,6 +251,7 @@ def main() -> None:
 
 	with open(out_path / "{}_sorted.msgpack".format(args.robot_type), 'wb') as file:
 		msgpack.pack(sorted_motions, file)
+	motion_library.write(out_path / "{}_sorted.mlib".format(args.robot_type), sorted_motions, args.robot_type)
 
 	# visualize the top 10
 	for k, m in enumerate(sorted_motions[0:10]):
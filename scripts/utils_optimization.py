@@ -22,23 +22,17 @@ class UtilsSolutionFile:
 
 	def save_rescaled(self, filename:str, T: int) -> None:
 		T_orig = self.T()
-		state_dim = self.states.shape[1]
-		states_interp = np.zeros((T+1, state_dim))
 		# t_rescaled = np.linspace(0,1,T+1)
 		# t_orig = np.linspace(0, 1, T_orig+1)
-		for k in range(T+1):
-			t_rescaled = k / T # in range [0,1]
-			idx_orig = int(np.floor(t_rescaled * T_orig))
-			idx_orig_next = int(np.ceil(t_rescaled * T_orig))
-			t_orig = idx_orig / T_orig
-			t_orig_next = idx_orig_next / T_orig
-			if t_orig_next > t_orig:
-				rel_t = (t_rescaled - t_orig) / (t_orig_next - t_orig)
-			else:
-				rel_t = 0
-			# print(idx_orig, idx_orig_next, t_orig, t_orig_next, t_rescaled, rel_t)
-			states_interp[k] = self.rh.interpolate(self.states[idx_orig], self.states[idx_orig_next], rel_t)
-			# print(self.states[orig_idx], self.states[orig_idx_next], states_interp[t])
+		t_rescaled = np.arange(T+1) / T # in range [0,1]
+		idx_orig = np.floor(t_rescaled * T_orig).astype(int)
+		idx_orig_next = np.ceil(t_rescaled * T_orig).astype(int)
+		t_orig = idx_orig / T_orig
+		t_orig_next = idx_orig_next / T_orig
+		rel_t = np.zeros(T+1)
+		mask = t_orig_next > t_orig
+		rel_t[mask] = (t_rescaled[mask] - t_orig[mask]) / (t_orig_next[mask] - t_orig[mask])
+		states_interp = self.rh.interpolate_batch(self.states[idx_orig], self.states[idx_orig_next], rel_t)
 
 		# exit()
 
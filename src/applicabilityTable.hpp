@@ -0,0 +1,97 @@
+#pragma once
+
+// Lookup table for the motions that are applicable to a state, i.e., whose
+// start state is within a fixed radius. db-A* only asks for motions with a
+// zero position, so the table is a grid over the remaining coordinates (e.g.,
+// yaw, or yaw and hitch angle): each cell lists the motions that might be
+// applicable to some state in the cell. Queries compute the exact distances
+// to the motions of a single cell only, rather than searching a tree.
+
+#include <algorithm>
+#include <cstdint>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+#include "stateGrid.hpp"
+
+class ApplicabilityTable
+{
+public:
+  // coordinates are the indices of the hashed coordinates (see StateGrid)
+  ApplicabilityTable(
+    const FlatStateSpace& space,
+    const std::vector<size_t>& coordinates,
+    double radius)
+    : space_(space)
+    , grid_(space, coordinates, radius)
+    , num_entries_(0)
+  {
+  }
+
+  double radius() const
+  {
+    return grid_.resolution();
+  }
+
+  // number of added motions
+  size_t size() const
+  {
+    return ids_.size();
+  }
+
+  // add a motion with the given id and start state (copied)
+  void add(uint32_t id, const float* start)
+  {
+    const uint32_t motion = ids_.size();
+    ids_.push_back(id);
+    starts_.insert(starts_.end(), start, start + space_.dim());
+    // a state within radius of the start is at most one ring away
+    grid_.forEachKey(grid_.key(start), 1, false, [&](const StateGrid::Key& k) {
+      table_[k].push_back(motion);
+      ++num_entries_;
+    });
+  }
+
+  // ids of the motions whose start state is within radius of state (sorted by distance)
+  void applicable(const float* state, std::vector<uint32_t>& ids) const
+  {
+    ids.clear();
+    auto iter = table_.find(grid_.key(state));
+    if (iter == table_.end()) {
+      return;
+    }
+    candidates_.clear();
+    for (uint32_t motion : iter->second) {
+      const float dist = space_.distance(state, &starts_[motion * space_.dim()]);
+      if (dist <= radius()) {
+        candidates_.push_back({dist, motion});
+      }
+    }
+    std::sort(candidates_.begin(), candidates_.end());
+    for (const auto& c : candidates_) {
+      ids.push_back(ids_[c.second]);
+    }
+  }
+
+  size_t numCells() const
+  {
+    return table_.size();
+  }
+
+  // total length of all candidate lists
+  size_t numEntries() const
+  {
+    return num_entries_;
+  }
+
+private:
+  const FlatStateSpace& space_;
+  StateGrid grid_;
+  std::vector<uint32_t> ids_;
+  std::vector<float> starts_;
+  // cell -> indices into ids_ (and starts_)
+  std::unordered_map<StateGrid::Key, std::vector<uint32_t>, StateGrid::KeyHash> table_;
+  size_t num_entries_;
+  mutable std::vector<std::pair<float, uint32_t>> candidates_;
+};
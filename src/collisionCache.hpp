@@ -0,0 +1,157 @@
+#pragma once
+
+// Bounded LRU cache of collision checks of shifted motions. Nearby nodes
+// apply the same motions at almost the same offsets, so entries are keyed by
+// the motion and the offset quantized to a grid. Only collision-free results
+// are stored, together with the clearance (distance to the closest obstacle)
+// at the checked offset: shifting a motion by less than its clearance can't
+// cause a collision, so an entry is reused only for offsets closer to the
+// checked one than the clearance. Thus, the cache never changes the result of
+// a check, and collisions are always checked again.
+
+#include <cmath>
+#include <cstdint>
+#include <list>
+#include <mutex>
+#include <unordered_map>
+
+#include <fcl/fcl.h>
+
+class CollisionCache
+{
+public:
+  CollisionCache(float resolution, size_t capacity)
+    : resolution_(resolution)
+    , capacity_(capacity)
+    , hits_(0)
+    , misses_(0)
+  {
+  }
+
+  float resolution() const
+  {
+    return resolution_;
+  }
+
+  size_t capacity() const
+  {
+    return capacity_;
+  }
+
+  // true if the motion is known to be collision-free at the given offset (thread-safe)
+  bool isFree(size_t motion, const fcl::Vector3f& offset)
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    auto iter = entries_.find(key(motion, offset));
+    if (iter != entries_.end()
+        && (iter->second->offset - offset).norm() < iter->second->clearance) {
+      // most recently used
+      lru_.splice(lru_.begin(), lru_, iter->second);
+      ++hits_;
+      return true;
+    }
+    ++misses_;
+    return false;
+  }
+
+  // store that the motion is collision-free at the given offset, with the
+  // given distance to the closest obstacle (thread-safe)
+  void addFree(size_t motion, const fcl::Vector3f& offset, float clearance)
+  {
+    if (clearance <= 0 || capacity_ == 0) {
+      return;
+    }
+    std::lock_guard<std::mutex> lock(mutex_);
+    const Key k = key(motion, offset);
+    auto iter = entries_.find(k);
+    if (iter != entries_.end()) {
+      iter->second->offset = offset;
+      iter->second->clearance = clearance;
+      lru_.splice(lru_.begin(), lru_, iter->second);
+      return;
+    }
+    if (entries_.size() == capacity_) {
+      entries_.erase(lru_.back().key);
+      lru_.pop_back();
+    }
+    lru_.push_front({k, offset, clearance});
+    entries_[k] = lru_.begin();
+  }
+
+  size_t size() const
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return entries_.size();
+  }
+
+  size_t hits() const
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return hits_;
+  }
+
+  size_t misses() const
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return misses_;
+  }
+
+  void resetCounters()
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    hits_ = 0;
+    misses_ = 0;
+  }
+
+private:
+  struct Key
+  {
+    size_t motion;
+    int32_t cell[3];
+
+    bool operator==(const Key& other) const
+    {
+      return motion == other.motion && cell[0] == other.cell[0]
+        && cell[1] == other.cell[1] && cell[2] == other.cell[2];
+    }
+  };
+
+  struct KeyHash
+  {
+    size_t operator()(const Key& key) const
+    {
+      size_t hash = std::hash<size_t>()(key.motion);
+      for (int32_t c : key.cell) {
+        hash = hash * 1000003 + std::hash<int32_t>()(c);
+      }
+      return hash;
+    }
+  };
+
+  struct Entry
+  {
+    Key key;
+    fcl::Vector3f offset;
+    float clearance;
+  };
+
+  Key key(size_t motion, const fcl::Vector3f& offset) const
+  {
+    Key k;
+    k.motion = motion;
+    for (size_t i = 0; i < 3; ++i) {
+      k.cell[i] = std::floor(offset[i] / resolution_);
+    }
+    return k;
+  }
+
+private:
+  float resolution_;
+  size_t capacity_;
+  // most recently used first
+  std::list<Entry> lru_;
+  std::unordered_map<Key, std::list<Entry>::iterator, KeyHash> entries_;
+  mutable std::mutex mutex_;
+  size_t hits_;
+  size_t misses_;
+};
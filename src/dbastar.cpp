@@ -0,0 +1,1393 @@
+#include "dbastar.h"
+
+#include <fstream>
+#include <iostream>
+#include <algorithm>
+#include <chrono>
+#include <cmath>
+#include <filesystem>
+#include <map>
+
+#include <sys/resource.h>
+
+// OMPL headers
+#include <ompl/base/spaces/RealVectorStateSpace.h>
+#include <ompl/control/spaces/RealVectorControlSpace.h>
+
+#include <ompl/datastructures/NearestNeighborsSqrtApprox.h>
+#include <ompl/datastructures/NearestNeighborsGNATNoThreadSafety.h>
+
+#include "robotStatePropagator.hpp"
+#include "fclStateValidityChecker.hpp"
+#include "motionLibrary.hpp"
+#include "nearestNeighborsGrid.hpp"
+
+namespace ob = ompl::base;
+namespace oc = ompl::control;
+
+static ob::State* allocAndFillState(std::shared_ptr<ompl::control::SpaceInformation> si, const YAML::Node& node)
+{
+  ob::State* state = si->allocState();
+  std::vector<double> reals;
+  for (const auto &value : node) {
+    reals.push_back(value.as<double>());
+  }
+  si->getStateSpace()->copyFromReals(state, reals);
+  return state;
+}
+
+static std::ofstream& printState(std::ofstream &stream, std::shared_ptr<ompl::control::SpaceInformation> si, const ob::State* state)
+{
+  std::vector<double> reals;
+  si->getStateSpace()->copyToReals(reals, state);
+  stream << "[";
+  for (size_t d = 0; d < reals.size(); ++d)
+  {
+    stream << reals[d];
+    if (d < reals.size() - 1)
+    {
+      stream << ",";
+    }
+  }
+  stream << "]";
+  return stream;
+}
+
+static std::ofstream& printAction(std::ofstream &stream, std::shared_ptr<ompl::control::SpaceInformation> si, oc::Control *action)
+{
+  const size_t dim = si->getControlSpace()->getDimension();
+  stream << "[";
+  for (size_t d = 0; d < dim; ++d)
+  {
+    double *address = si->getControlSpace()->getValueAddressAtIndex(action, d);
+    stream << *address;
+    if (d < dim - 1)
+    {
+      stream << ",";
+    }
+  }
+  stream << "]";
+  return stream;
+}
+
+// nearest neighbor data structure of the given type ("default": GNAT for
+// metric spaces, SqrtApprox otherwise)
+template<typename T>
+static ompl::NearestNeighbors<T>* createNearestNeighbors(
+  const std::string& type,
+  const ob::StateSpacePtr& space,
+  const FlatStateSpace& flat_space,
+  const std::vector<size_t>& coordinates,
+  double resolution,
+  const std::function<void(const T&, float*)>& values)
+{
+  if (type == "grid") {
+    return new NearestNeighborsGrid<T>(flat_space, coordinates, resolution, values);
+  }
+  if (type == "gnat" || (type == "default" && space->isMetricSpace())) {
+    return new ompl::NearestNeighborsGNATNoThreadSafety<T>();
+  }
+  if (type == "sqrtapprox" || type == "default") {
+    return new ompl::NearestNeighborsSqrtApprox<T>();
+  }
+  throw std::runtime_error("Unknown nearest neighbors type " + type);
+}
+
+// Coordinates hashed by NearestNeighborsGrid: for nodes, the position and the
+// angles; for motions (whose position is zero), the first other real vector
+// or SO(2) coordinates
+static std::vector<size_t> gridCoordinates(const FlatStateSpace& flat_space, size_t position_dim, bool motions)
+{
+  std::vector<size_t> coordinates;
+  for (size_t i = 0; i < flat_space.dim() && coordinates.size() < NearestNeighborsGrid<Motion*>::MAX_DIMS; ++i) {
+    const int type = flat_space.coordinateType(i);
+    if (motions && i >= position_dim && (type == ob::STATE_SPACE_REAL_VECTOR || type == ob::STATE_SPACE_SO2)) {
+      coordinates.push_back(i);
+    } else if (!motions && (i < position_dim || type == ob::STATE_SPACE_SO2)) {
+      coordinates.push_back(i);
+    }
+  }
+  return coordinates;
+}
+
+DBAstar::DBAstar()
+  : grid_resolution_(0)
+  , start_state_(nullptr)
+  , goal_state_(nullptr)
+  , tmp_state_(nullptr)
+  , nearest_neighbors_("default")
+  , use_applicability_table_(false)
+  , rng_()
+  , num_filtered_motions_(0)
+  , duplicates_delta_(0)
+  , duplicates_alpha_(0)
+  , num_threads_(1)
+  , lazy_(false)
+  , open_(nodes_)
+  , num_expands_(0)
+  , num_collision_checks_(0)
+  , num_deferred_checks_(0)
+  , is_exact_solution_(false)
+  , delta_(0)
+  , epsilon_(1)
+  , alpha_(0.5)
+  , max_cost_(std::numeric_limits<float>::infinity())
+  , stop_requested_(false)
+{
+}
+
+DBAstar::~DBAstar()
+{
+  clearSearch();
+  for (auto& m : motions_) {
+    m.collision_manager.reset();
+    for (auto state : m.states) {
+      si_->freeState(state);
+    }
+    for (auto control : m.actions) {
+      si_->freeControl(control);
+    }
+    for (auto co : m.collision_objects) {
+      delete co;
+    }
+  }
+  for (auto co : obstacles_) {
+    delete co;
+  }
+  if (si_) {
+    si_->freeState(start_state_);
+    si_->freeState(goal_state_);
+    si_->freeState(tmp_state_);
+  }
+}
+
+void DBAstar::loadEnvironment(const std::string& inputFile)
+{
+  if (si_) {
+    throw std::runtime_error("Environment already loaded!");
+  }
+
+  // load problem description
+  YAML::Node env = YAML::LoadFile(inputFile);
+
+  for (const auto &obs : env["environment"]["obstacles"])
+  {
+    if (obs["type"].as<std::string>() == "box")
+    {
+      const auto &size = obs["size"];
+      std::shared_ptr<fcl::CollisionGeometryf> geom;
+      geom.reset(new fcl::Boxf(size[0].as<float>(), size[1].as<float>(), 1.0));
+      const auto &center = obs["center"];
+      auto co = new fcl::CollisionObjectf(geom);
+      co->setTranslation(fcl::Vector3f(center[0].as<float>(), center[1].as<float>(), 0));
+      co->computeAABB();
+      obstacles_.push_back(co);
+    }
+    else
+    {
+      throw std::runtime_error("Unknown obstacle type!");
+    }
+  }
+  bpcm_env_.reset(new fcl::DynamicAABBTreeCollisionManagerf());
+  bpcm_env_->registerObjects(obstacles_);
+  bpcm_env_->setup();
+
+  const auto& robot_node = env["robots"][0];
+  auto robotType = robot_node["type"].as<std::string>();
+  const auto &env_min = env["environment"]["min"];
+  const auto &env_max = env["environment"]["max"];
+  ob::RealVectorBounds position_bounds(env_min.size());
+  env_min_.setZero();
+  env_max_.setZero();
+  for (size_t i = 0; i < env_min.size(); ++i) {
+    position_bounds.setLow(i, env_min[i].as<double>());
+    position_bounds.setHigh(i, env_max[i].as<double>());
+    env_min_[i] = env_min[i].as<float>();
+    env_max_[i] = env_max[i].as<float>();
+  }
+  robot_ = create_robot(robotType, position_bounds);
+
+  si_ = robot_->getSpaceInformation();
+
+  // set number of control steps
+  si_->setPropagationStepSize(1);
+  si_->setMinMaxControlDuration(1, 1);
+
+  // set state validity checking for this space
+  auto stateValidityChecker(std::make_shared<fclStateValidityChecker>(si_, bpcm_env_, robot_));
+  si_->setStateValidityChecker(stateValidityChecker);
+
+  // set the state propagator
+  std::shared_ptr<oc::StatePropagator> statePropagator(new RobotStatePropagator(si_, robot_));
+  si_->setStatePropagator(statePropagator);
+
+  si_->setup();
+
+  // create and set a start state
+  start_state_ = allocAndFillState(si_, robot_node["start"]);
+
+  // set goal state
+  goal_state_ = allocAndFillState(si_, robot_node["goal"]);
+
+  tmp_state_ = si_->allocState();
+
+  // create a robot with no position bounds
+  ob::RealVectorBounds position_bounds_no_bound(env_min.size());
+  position_bounds_no_bound.setLow(-1e6);//std::numeric_limits<double>::lowest());
+  position_bounds_no_bound.setHigh(1e6);//std::numeric_limits<double>::max());
+  robot_no_pos_bound_ = create_robot(robotType, position_bounds_no_bound);
+  si_no_pos_bound_ = robot_no_pos_bound_->getSpaceInformation();
+  si_no_pos_bound_->setPropagationStepSize(1);
+  si_no_pos_bound_->setMinMaxControlDuration(1, 1);
+  si_no_pos_bound_->setStateValidityChecker(stateValidityChecker);
+  si_no_pos_bound_->setStatePropagator(statePropagator);
+  si_no_pos_bound_->setup();
+
+  flat_space_.reset(new FlatStateSpace(si_->getStateSpace()));
+  nodes_.setStateDim(flat_space_->dim());
+  goal_values_.resize(flat_space_->dim());
+  flat_space_->fromState(goal_state_, goal_values_.data());
+
+  // build kd-tree for motion primitives
+  resetMotionTree();
+}
+
+void DBAstar::setNearestNeighbors(const std::string& type)
+{
+  if (type != "default" && type != "gnat" && type != "sqrtapprox" && type != "grid") {
+    throw std::runtime_error("Unknown nearest neighbors type " + type);
+  }
+  nearest_neighbors_ = type;
+  if (T_m_) {
+    resetMotionTree();
+  }
+}
+
+void DBAstar::resetMotionTree()
+{
+  const FlatStateSpace* flat_space = flat_space_.get();
+  // the grid resolution is updated once delta is known (see startSearch)
+  T_m_.reset(createNearestNeighbors<Motion*>(nearest_neighbors_, si_->getStateSpace(), *flat_space_,
+    gridCoordinates(*flat_space_, robot_->is2D() ? 2 : 3, true), 1.0,
+    [flat_space](Motion* const& m, float* values) { flat_space->fromState(m->states[0], values); }));
+  auto si = si_;
+  T_m_->setDistanceFunction([si](const Motion* a, const Motion* b) { return si->distance(a->states[0], b->states[0]); });
+  for (auto& m : motions_) {
+    T_m_->add(&m);
+  }
+  applicability_table_.reset();
+}
+
+void DBAstar::setApplicabilityTable(bool applicability_table)
+{
+  use_applicability_table_ = applicability_table;
+  if (!use_applicability_table_) {
+    applicability_table_.reset();
+  }
+}
+
+void DBAstar::updateApplicabilityTable(float radius)
+{
+  if (!applicability_table_ || applicability_table_->radius() != radius) {
+    applicability_table_.reset(new ApplicabilityTable(*flat_space_,
+      gridCoordinates(*flat_space_, robot_->is2D() ? 2 : 3, true), radius));
+  }
+  if (applicability_table_->size() == motions_.size()) {
+    return;
+  }
+  std::vector<float> values(flat_space_->dim());
+  for (size_t idx = applicability_table_->size(); idx < motions_.size(); ++idx) {
+    flat_space_->fromState(motions_[idx].states[0], values.data());
+    applicability_table_->add(idx, values.data());
+  }
+  std::cout << "Applicability table: " << applicability_table_->numCells() << " cells, "
+            << applicability_table_->numEntries() << " entries" << std::endl;
+}
+
+size_t DBAstar::addMotions(const std::string& motionsFile)
+{
+  if (MotionLibrary::isMotionLibrary(motionsFile)) {
+    return addMotionsFromLibrary(motionsFile);
+  }
+
+  // The file is an append-only log of msgpack arrays (one per batch of motions).
+  // Only the part that was not read before is loaded.
+  size_t& offset = motions_file_offsets_[motionsFile];
+  std::ifstream is( motionsFile.c_str(), std::ios::in | std::ios::binary );
+  // get length of the unread part of the file
+  is.seekg (0, is.end);
+  size_t length = (size_t)is.tellg() - offset;
+  is.seekg (offset, is.beg);
+  //
+  msgpack::unpacker unpacker;
+  unpacker.reserve_buffer(length);
+  is.read(unpacker.buffer(), length);
+  unpacker.buffer_consumed(length);
+  size_t num_added = 0;
+  msgpack::object_handle oh;
+  while (unpacker.next(oh)) {
+    num_added += addMotions(oh.get());
+  }
+  // an incomplete batch at the end is read next time
+  offset += unpacker.parsed_size();
+  return num_added;
+}
+
+size_t DBAstar::addMotions(const msgpack::object& msg_obj)
+{
+  if (msg_obj.type != msgpack::type::ARRAY) {
+    throw msgpack::type_error();
+  }
+  // flatten states and actions of each motion
+  std::vector<std::vector<double>> states(msg_obj.via.array.size);
+  std::vector<std::vector<double>> actions(msg_obj.via.array.size);
+  std::vector<MotionView> views(msg_obj.via.array.size);
+  for (size_t i = 0; i < msg_obj.via.array.size; ++i) {
+    auto item = msg_obj.via.array.ptr[i];
+    if (item.type != msgpack::type::MAP) {
+      throw msgpack::type_error();
+    }
+    for (size_t j = 0; j < item.via.map.size; ++j) {
+      auto key = item.via.map.ptr[j].key.as<std::string>();
+      if (key != "states" && key != "actions") {
+        continue;
+      }
+      auto& flat = (key == "states") ? states[i] : actions[i];
+      auto& num = (key == "states") ? views[i].num_states : views[i].num_actions;
+      auto val = item.via.map.ptr[j].val;
+      for (size_t k = 0; k < val.via.array.size; ++k) {
+        std::vector<double> reals;
+        val.via.array.ptr[k].convert(reals);
+        flat.insert(flat.end(), reals.begin(), reals.end());
+      }
+      num = val.via.array.size;
+    }
+    views[i].states = states[i].data();
+    views[i].actions = actions[i].data();
+  }
+  return addMotions(views);
+}
+
+size_t DBAstar::addMotionsFromLibrary(const std::string& libraryFile)
+{
+  MotionLibrary library;
+  library.open(libraryFile);
+  if (library.stateDim() != stateDim() || library.controlDim() != controlDim()) {
+    throw std::runtime_error("Motion library " + libraryFile + " does not match the robot!");
+  }
+
+  // the library is immutable, but might be extended by a newer version of the file
+  size_t& first_motion = motions_file_offsets_[libraryFile];
+  if (first_motion >= library.numMotions()) {
+    return 0;
+  }
+
+  // convert to double precision (contiguous, so that the views stay valid)
+  size_t num_reals = 0;
+  for (size_t i = first_motion; i < library.numMotions(); ++i) {
+    num_reals += library.numStates(i) * stateDim() + library.numActions(i) * controlDim();
+  }
+  std::vector<double> reals(num_reals);
+  std::vector<MotionView> views;
+  double* data = reals.data();
+  for (size_t i = first_motion; i < library.numMotions(); ++i) {
+    MotionView view;
+    view.num_states = library.numStates(i);
+    view.num_actions = library.numActions(i);
+    view.aabb = library.aabb(i);
+
+    const size_t num_state_reals = view.num_states * stateDim();
+    std::copy(library.states(i), library.states(i) + num_state_reals, data);
+    view.states = data;
+    data += num_state_reals;
+
+    const size_t num_action_reals = view.num_actions * controlDim();
+    std::copy(library.actions(i), library.actions(i) + num_action_reals, data);
+    view.actions = data;
+    data += num_action_reals;
+
+    views.push_back(view);
+  }
+  // the views (including the aabbs) are only used while the library is mapped
+  size_t num_added = addMotions(views);
+  first_motion = library.numMotions();
+  return num_added;
+}
+
+size_t DBAstar::addMotions(const std::vector<MotionView>& motions)
+{
+  if (!si_) {
+    throw std::runtime_error("Environment needs to be loaded before adding motions!");
+  }
+
+  size_t num_states = 0;
+  size_t num_invalid_states = 0;
+  const size_t first_new_motion = motions_.size();
+  const size_t state_dim = stateDim();
+  const size_t control_dim = controlDim();
+
+  for (const auto& view : motions) {
+    Motion m;
+    // load the states
+    for (size_t k = 0; k < view.num_states; ++k) {
+      ob::State* state = si_->allocState();
+      std::vector<double> reals(view.states + k * state_dim, view.states + (k+1) * state_dim);
+      si_->getStateSpace()->copyFromReals(state, reals);
+      m.states.push_back(state);
+      if (!si_no_pos_bound_->satisfiesBounds(m.states.back())) {
+        // std::cout << "State in motion primitive is invalid! Enforcing bounds!\n";
+        // si->printState(m.states.back());
+        si_no_pos_bound_->enforceBounds(m.states.back());
+        ++num_invalid_states;
+        // si->printState(m.states.back());
+      }
+    }
+    num_states += m.states.size();
+    // load the actions
+    for (size_t k = 0; k < view.num_actions; ++k) {
+      oc::Control *control = si_->allocControl();
+      for (size_t idx = 0; idx < control_dim; ++idx) {
+        double* address = si_->getControlSpace()->getValueAddressAtIndex(control, idx);
+        if (address) {
+          *address = view.actions[k * control_dim + idx];
+        }
+      }
+      m.actions.push_back(control);
+    }
+    m.cost = m.actions.size() * robot_->dt(); // time in seconds
+    // m.name = motion["name"].as<std::string>();
+
+    // swept volume; the collision manager is only generated once the motion
+    // is used close to an obstacle
+    if (view.aabb) {
+      m.aabb = fcl::AABBf(
+        fcl::Vector3f(view.aabb[0], view.aabb[1], view.aabb[2]),
+        fcl::Vector3f(view.aabb[3], view.aabb[4], view.aabb[5]));
+    } else {
+      for (size_t k = 0; k < m.states.size(); ++k) {
+        for (size_t part = 0; part < robot_->numParts(); ++part) {
+          const auto &transform = robot_->getTransform(m.states[k], part);
+          fcl::CollisionObjectf co(robot_->getCollisionGeometry(part));
+          co.setTranslation(transform.translation());
+          co.setRotation(transform.rotation());
+          co.computeAABB();
+          if (k == 0 && part == 0) {
+            m.aabb = co.getAABB();
+          } else {
+            m.aabb += co.getAABB();
+          }
+        }
+      }
+    }
+
+    m.disabled = false;
+
+    motions_.push_back(m);
+  }
+  std::cout << "Info: " << num_invalid_states << " states are invalid of " << num_states << std::endl;
+
+  // shuffle the new motions only, since T_m refers to the existing ones
+  std::shuffle(motions_.begin() + first_new_motion, motions_.end(), rng_);
+  for (size_t idx = first_new_motion; idx < motions_.size(); ++idx) {
+    motions_[idx].idx = idx;
+    T_m_->add(&motions_[idx]);
+  }
+
+  std::cout << "There are " << motions_.size() << " motions!" << std::endl;
+
+  return motions_.size() - first_new_motion;
+}
+
+void DBAstar::setStartGoal(const std::vector<double>& start, const std::vector<double>& goal)
+{
+  if (!si_) {
+    throw std::runtime_error("Environment needs to be loaded before setting start and goal!");
+  }
+  if (start.size() != stateDim() || goal.size() != stateDim()) {
+    throw std::runtime_error("Start and goal need to have " + std::to_string(stateDim()) + " entries!");
+  }
+  clearSearch();
+  si_->getStateSpace()->copyFromReals(start_state_, start);
+  si_->getStateSpace()->copyFromReals(goal_state_, goal);
+  flat_space_->fromState(goal_state_, goal_values_.data());
+  if (grid_heuristic_) {
+    setGridHeuristic(grid_resolution_, grid_cache_directory_);
+  }
+}
+
+void DBAstar::getStartGoal(std::vector<double>& start, std::vector<double>& goal) const
+{
+  if (!si_) {
+    throw std::runtime_error("Environment needs to be loaded before getting start and goal!");
+  }
+  si_->getStateSpace()->copyToReals(start, start_state_);
+  si_->getStateSpace()->copyToReals(goal, goal_state_);
+}
+
+void DBAstar::setNumThreads(size_t num_threads)
+{
+  if (num_threads == 0) {
+    throw std::runtime_error("Need at least one thread!");
+  }
+  num_threads_ = num_threads;
+  thread_pool_.reset();
+  thread_envs_.clear();
+}
+
+size_t DBAstar::stateDim() const
+{
+  return si_->getStateSpace()->getValueLocations().size();
+}
+
+size_t DBAstar::controlDim() const
+{
+  return si_->getControlSpace()->getDimension();
+}
+
+float DBAstar::computeDelta(size_t num_desired_neighbors, float alpha)
+{
+  Motion fakeMotion;
+  fakeMotion.idx = -1;
+  fakeMotion.states.push_back(si_->allocState());
+  std::vector<Motion *> neighbors_m;
+  size_t num_samples = std::min<size_t>(1000, motions_.size());
+
+  auto state_sampler = si_->allocStateSampler();
+  float sum_delta = 0.0;
+  for (size_t k = 0; k < num_samples; ++k) {
+    do {
+      state_sampler->sampleUniform(fakeMotion.states[0]);
+    } while (!si_->isValid(fakeMotion.states[0]));
+    robot_->setPosition(fakeMotion.states[0], fcl::Vector3f(0, 0, 0));
+
+    T_m_->nearestK(&fakeMotion, num_desired_neighbors+1, neighbors_m);
+
+    float max_delta = si_->distance(fakeMotion.states[0], neighbors_m.back()->states.front());
+    sum_delta += max_delta;
+  }
+  si_->freeState(fakeMotion.states[0]);
+
+  float adjusted_delta = (sum_delta / num_samples) / alpha;
+  std::cout << "Automatically adjusting delta to: " << adjusted_delta << std::endl;
+  return adjusted_delta;
+}
+
+size_t DBAstar::filterDuplicates(float delta, float alpha, size_t first_motion)
+{
+  // A motion is a duplicate, if an enabled motion with a lower index starts and ends close to it.
+  // Thus, the flags of motions with an index < first_motion are not affected.
+  size_t num_duplicates = 0;
+  Motion fakeMotion;
+  fakeMotion.idx = -1;
+  fakeMotion.states.push_back(si_->allocState());
+  std::vector<Motion *> neighbors_m;
+  for (size_t i = first_motion; i < motions_.size(); ++i) {
+    auto& m = motions_[i];
+    m.disabled = false;
+
+    si_->copyState(fakeMotion.states[0], m.states[0]);
+    T_m_->nearestR(&fakeMotion, delta*alpha, neighbors_m);
+
+    for (Motion* nm : neighbors_m) {
+      if (nm->idx >= m.idx || nm->disabled) {
+        continue;
+      }
+      float goal_delta = si_->distance(m.states.back(), nm->states.back());
+      if (goal_delta < delta*(1-alpha)) {
+        m.disabled = true;
+        ++num_duplicates;
+        break;
+      }
+    }
+  }
+  si_->freeState(fakeMotion.states[0]);
+  std::cout << "There are " << num_duplicates << " duplicate motions (of " << motions_.size() - first_motion << " checked)!" << std::endl;
+  return num_duplicates;
+}
+
+bool DBAstar::mayCollide(const Motion& motion, const fcl::Vector3f& offset) const
+{
+  fcl::AABBf shifted = motion.aabb;
+  shiftAABB(shifted, offset);
+  for (const auto co : obstacles_) {
+    if (co->getAABB().overlap(shifted)) {
+      return true;
+    }
+  }
+  return false;
+}
+
+ShiftableDynamicAABBTreeCollisionManager<float>* DBAstar::collisionManager(Motion& motion)
+{
+  if (!motion.collision_manager) {
+    // generate collision objects and collision manager
+    for (const auto &state : motion.states)
+    {
+      for (size_t part = 0; part < robot_->numParts(); ++part) {
+        const auto &transform = robot_->getTransform(state, part);
+
+        auto co = new fcl::CollisionObjectf(robot_->getCollisionGeometry(part));
+        co->setTranslation(transform.translation());
+        co->setRotation(transform.rotation());
+        co->computeAABB();
+        motion.collision_objects.push_back(co);
+        motion.transforms.push_back(transform);
+      }
+    }
+    motion.collision_manager.reset(new ShiftableDynamicAABBTreeCollisionManager<float>());
+    motion.collision_manager->registerObjects(motion.collision_objects);
+  }
+  return motion.collision_manager.get();
+}
+
+bool DBAstar::collides(const Motion& motion, const fcl::Vector3f& offset, size_t thread)
+{
+  if (sdf_) {
+    bool free = true;
+    const size_t num_parts = robot_->numParts();
+    for (size_t i = 0; i < motion.transforms.size(); ++i) {
+      fcl::Transform3f transform = motion.transforms[i];
+      transform.translation() += offset;
+      const auto result = sdf_->classify(transform, i % num_parts);
+      if (result == SdfCollisionChecker::COLLISION) {
+        return true;
+      }
+      free &= result == SdfCollisionChecker::FREE;
+    }
+    if (free) {
+      return false;
+    }
+  }
+  // Rather than shifting the (shared) motion, the thread's copy of the
+  // obstacles is shifted in the opposite direction.
+  if (collision_cache_) {
+    if (collision_cache_->isFree(motion.idx, offset)) {
+      return false;
+    }
+    // the clearance tells for which other offsets the result can be reused
+    fcl::DefaultDistanceData<float> distance_data;
+    motion.collision_manager->distance(thread_envs_[thread]->at(-offset), &distance_data, fcl::DefaultDistanceFunction<float>);
+    if (distance_data.result.min_distance <= 0) {
+      return true;
+    }
+    collision_cache_->addFree(motion.idx, offset, distance_data.result.min_distance);
+    return false;
+  }
+  fcl::DefaultCollisionData<float> collision_data;
+  motion.collision_manager->collide(thread_envs_[thread]->at(-offset), &collision_data, fcl::DefaultCollisionFunction<float>);
+  return collision_data.result.isCollision();
+}
+
+void DBAstar::setSignedDistanceField(float resolution)
+{
+  if (!si_) {
+    throw std::runtime_error("Environment needs to be loaded before setting the signed distance field!");
+  }
+  sdf_.reset();
+  if (resolution > 0) {
+    sdf_.reset(new SdfCollisionChecker(robot_, obstacles_, env_min_, env_max_, resolution));
+  }
+  auto stateValidityChecker(std::make_shared<fclStateValidityChecker>(si_, bpcm_env_, robot_, sdf_));
+  si_->setStateValidityChecker(stateValidityChecker);
+  si_no_pos_bound_->setStateValidityChecker(stateValidityChecker);
+}
+
+void DBAstar::setCollisionCache(float resolution, size_t capacity)
+{
+  if (resolution <= 0) {
+    collision_cache_.reset();
+  } else {
+    collision_cache_.reset(new CollisionCache(resolution, capacity));
+  }
+}
+
+void DBAstar::setGridHeuristic(float resolution, const std::string& cacheDirectory)
+{
+  if (!si_) {
+    throw std::runtime_error("Environment needs to be loaded before setting the heuristic!");
+  }
+  const size_t dim = robot_->is2D() ? 2 : 3;
+  std::vector<fcl::AABBf> obstacles;
+  for (const auto co : obstacles_) {
+    obstacles.push_back(co->getAABB());
+  }
+  // the position of the robot is the origin of its first part
+  const float inflation = inscribedRadius(*robot_->getCollisionGeometry(0), dim);
+  const fcl::Vector3f goal_pos = robot_->getTransform(goal_state_).translation();
+
+  grid_resolution_ = resolution;
+  grid_cache_directory_ = cacheDirectory;
+  grid_heuristic_.reset(new GridHeuristic());
+  const uint64_t key = GridHeuristic::computeKey(dim, resolution, env_min_, env_max_, obstacles, inflation, goal_pos);
+  std::string filename;
+  if (!cacheDirectory.empty()) {
+    std::filesystem::create_directories(cacheDirectory);
+    filename = cacheDirectory + "/" + std::to_string(key) + ".bin";
+    if (grid_heuristic_->load(filename, key)) {
+      std::cout << "Loaded grid heuristic from " << filename << std::endl;
+      return;
+    }
+  }
+  auto start = std::chrono::steady_clock::now();
+  grid_heuristic_->compute(dim, resolution, env_min_, env_max_, obstacles, inflation, goal_pos);
+  auto end = std::chrono::steady_clock::now();
+  std::cout << "Computed grid heuristic in " << std::chrono::duration<float>(end - start).count() << " s" << std::endl;
+  if (!filename.empty()) {
+    grid_heuristic_->save(filename);
+  }
+}
+
+float DBAstar::heuristic(const ob::State *s) const
+{
+  // heuristic is the time it might take to get to the goal
+  const auto current_pos = robot_->getTransform(s).translation();
+  const auto goal_pos = robot_->getTransform(goal_state_).translation();
+  float dist = (current_pos - goal_pos).norm();
+  if (grid_heuristic_) {
+    // the Euclidean distance is a lower bound, too
+    dist = std::max(dist, grid_heuristic_->distance(current_pos));
+  }
+  const float max_vel = robot_->maxSpeed(); // m/s
+  const float time = dist / max_vel;
+  return time;
+}
+
+void DBAstar::clearSearch()
+{
+  open_.clear();
+  T_n_.reset();
+  incons_.clear();
+  // the memory of the nodes is reused by the next search
+  nodes_.clear();
+  num_expands_ = 0;
+  num_collision_checks_ = 0;
+  num_deferred_checks_ = 0;
+  if (collision_cache_) {
+    collision_cache_->resetCounters();
+  }
+  result_.clear();
+  is_exact_solution_ = false;
+}
+
+void DBAstar::storeResult(const AStarNode& node)
+{
+  // store a copy, since nodes on the path might be rewired later on
+  result_.clear();
+  const AStarNode* n = &node;
+  while (true) {
+    result_.push_back(*n);
+    if (n->came_from == NodePool<AStarNode>::NONE) {
+      break;
+    }
+    n = &nodes_[n->came_from];
+  }
+  std::reverse(result_.begin(), result_.end());
+}
+
+void DBAstar::tightenMaxCost(float maxCost)
+{
+  float current = max_cost_;
+  while (maxCost < current && !max_cost_.compare_exchange_weak(current, maxCost)) {
+  }
+}
+
+void DBAstar::startSearch(
+  float delta,
+  float epsilon,
+  float alpha,
+  bool filterDuplicates,
+  float maxCost)
+{
+  if (alpha <= 0 || alpha >= 1) {
+    throw std::runtime_error("Alpha needs to be between 0 and 1!");
+  }
+
+  clearSearch();
+  stop_requested_ = false;
+  max_cost_ = maxCost;
+
+  std::cout << "Max cost is " << maxCost << std::endl;
+
+  if (delta < 0) {
+    delta = computeDelta((size_t)-delta, alpha);
+  }
+  delta_ = delta;
+  epsilon_ = epsilon;
+  alpha_ = alpha;
+
+  auto grid_T_m = dynamic_cast<NearestNeighborsGrid<Motion*>*>(T_m_.get());
+  if (grid_T_m && grid_T_m->resolution() != delta * alpha) {
+    grid_T_m->setResolution(delta * alpha);
+  }
+  if (use_applicability_table_) {
+    updateApplicabilityTable(delta * alpha);
+  }
+
+  if (filterDuplicates) {
+    // Only check the motions that were added since the last call. A full
+    // check is required if alpha changed or delta shrunk noticeably, since
+    // then previously disabled motions might not be duplicates anymore.
+    size_t first_motion = num_filtered_motions_;
+    if (alpha != duplicates_alpha_ || delta < duplicates_delta_ * 0.95) {
+      first_motion = 0;
+      duplicates_delta_ = delta;
+      duplicates_alpha_ = alpha;
+    }
+    this->filterDuplicates(duplicates_delta_, duplicates_alpha_, first_motion);
+    num_filtered_motions_ = motions_.size();
+  } else {
+    for (auto& m : motions_) {
+      m.disabled = false;
+    }
+    num_filtered_motions_ = 0;
+  }
+
+  // kd-tree for nodes
+  const FlatStateSpace* flat_space = flat_space_.get();
+  T_n_.reset(createNearestNeighbors<AStarNode*>(nearest_neighbors_, si_->getStateSpace(), *flat_space_,
+    gridCoordinates(*flat_space_, robot_->is2D() ? 2 : 3, false), delta * (1 - alpha),
+    [flat_space](AStarNode* const& n, float* values) { std::copy(n->state, n->state + flat_space->dim(), values); }));
+  T_n_->setDistanceFunction([flat_space](const AStarNode* a, const AStarNode* b)
+                            { return flat_space->distance(a->state, b->state); });
+
+  const uint32_t start_idx = nodes_.allocate();
+  AStarNode* start_node = &nodes_[start_idx];
+  flat_space_->fromState(start_state_, nodes_.state(start_idx));
+  start_node->state = nodes_.state(start_idx);
+  start_node->idx = start_idx;
+  start_node->gScore = 0;
+  start_node->hScore = heuristic(start_state_);
+  start_node->fScore = epsilon * start_node->hScore;
+  start_node->came_from = NodePool<AStarNode>::NONE;
+  start_node->used_offset = fcl::Vector3f(0,0,0);
+  start_node->used_motion = -1;
+
+  open_.push(start_idx);
+  start_node->is_in_open = true;
+  start_node->is_closed = false;
+  start_node->is_in_incons = false;
+  start_node->is_verified = true;
+  start_node->is_invalid = false;
+
+  T_n_->add(start_node);
+
+  if (!thread_pool_) {
+    thread_pool_.reset(new ThreadPool(num_threads_));
+    for (size_t t = 0; t < thread_pool_->size(); ++t) {
+      thread_envs_.emplace_back(new OffsetCollisionManager<float>(obstacles_));
+    }
+  }
+}
+
+bool DBAstar::search(bool anytime)
+{
+  const float delta = delta_;
+  const float epsilon = epsilon_;
+  const float alpha = alpha_;
+
+  Motion fakeMotion;
+  fakeMotion.idx = -1;
+  fakeMotion.states.push_back(si_->allocState());
+
+  AStarNode query_n;
+  std::vector<float> query_state(flat_space_->dim());
+
+  // motions that might be applied to the expanded node
+  struct Candidate
+  {
+    Motion* motion;
+    ob::State* state; // final state
+    fcl::Vector3f computed_offset;
+    fcl::Vector3f offset; // position of the motion
+    float gScore;
+    float hScore;
+    float fScore;
+    bool check_collision;
+    bool deferred; // lazy: check_collision, but not checked yet
+    bool valid;
+  };
+  std::vector<Candidate> candidates;
+  std::vector<ob::State*> candidate_states;
+
+  std::vector<Motion*> neighbors_m;
+  std::vector<uint32_t> applicable_m;
+  std::vector<AStarNode*> neighbors_n;
+
+  bool found = false;
+  float last_f_score = open_.empty() ? 0 : nodes_[open_.top()].fScore;
+  while (!open_.empty() && !stop_requested_)
+  {
+    AStarNode* current = &nodes_[open_.top()];
+    ++num_expands_;
+    if (num_expands_ % 1000 == 0) {
+      std::cout << "expanded: " << num_expands_ << " open: " << open_.size() << " nodes: " << T_n_->size() << " f-score " << current->fScore << std::endl;
+    }
+
+    // the cost bound might have been tightened (see tightenMaxCost). It is
+    // checked against the uninflated cost estimate: with epsilon > 1, nodes
+    // behind this one in open might still lead to a solution within the bound
+    const float maxCost = max_cost_;
+    if (current->gScore + current->hScore > maxCost) {
+      if (epsilon <= 1) {
+        break;
+      }
+      current->is_in_open = false;
+      open_.pop();
+      continue;
+    }
+
+    assert(current->fScore >= last_f_score);
+    last_f_score = current->fScore;
+
+    if (!current->is_verified) {
+      // lazy collision checking of the motion that led to this node
+      const AStarNode& parent = nodes_[current->came_from];
+      flat_space_->toState(parent.state, fakeMotion.states[0]);
+      const fcl::Vector3f offset = robot_->getTransform(fakeMotion.states[0]).translation() + current->used_offset;
+      ++num_collision_checks_;
+      if (collides(motions_[current->used_motion], offset, 0)) {
+        current->is_invalid = true;
+        current->is_in_open = false;
+        open_.pop();
+        continue;
+      }
+      current->is_verified = true;
+    }
+
+    if (flat_space_->distance(current->state, goal_values_.data()) <= delta) {
+      std::cout << "SOLUTION FOUND!!!! cost: " << current->gScore << std::endl;
+
+      storeResult(*current);
+      is_exact_solution_ = true;
+      found = true;
+      if (anytime) {
+        // continuing from this node can't lead to a better solution
+        current->is_in_open = false;
+        current->is_closed = true;
+        open_.pop();
+      }
+      break;
+    }
+
+    current->is_in_open = false;
+    current->is_closed = true;
+    open_.pop();
+
+    // find relevant motions (within delta/2 of current state)
+    flat_space_->toState(current->state, fakeMotion.states[0]);
+    const fcl::Vector3f current_pos = robot_->getTransform(fakeMotion.states[0]).translation();
+    robot_->setPosition(fakeMotion.states[0], fcl::Vector3f(0,0,0));
+
+    if (applicability_table_) {
+      flat_space_->fromState(fakeMotion.states[0], query_state.data());
+      applicability_table_->applicable(query_state.data(), applicable_m);
+      neighbors_m.clear();
+      for (uint32_t idx : applicable_m) {
+        neighbors_m.push_back(&motions_[idx]);
+      }
+    } else {
+      T_m_->nearestR(&fakeMotion, delta*alpha, neighbors_m);
+    }
+
+    // Loop over all potential applicable motions and keep the ones that
+    // satisfy the cost bound and the state bounds
+    candidates.clear();
+    for (Motion* motion : neighbors_m) {
+      if (motion->disabled) {
+        continue;
+      }
+
+      if (candidates.size() == candidate_states.size()) {
+        candidate_states.push_back(si_->allocState());
+      }
+      Candidate c;
+      c.motion = motion;
+      c.state = candidate_states[candidates.size()];
+      c.computed_offset = fcl::Vector3f(0, 0, 0);
+
+      // compute estimated cost
+      c.gScore = current->gScore + motion->cost;
+      // compute final state
+      si_->copyState(c.state, motion->states.back());
+      c.offset = current_pos + c.computed_offset;
+      const auto relative_pos = robot_->getTransform(c.state).translation();
+      robot_->setPosition(c.state, c.offset + relative_pos);
+      // compute estimated fscore
+      c.hScore = heuristic(c.state);
+      c.fScore = c.gScore + epsilon * c.hScore;
+
+      // skip motions that would exceed cost bound
+      if (c.gScore + c.hScore > maxCost)
+      {
+        continue;
+      }
+      // skip motions that are invalid
+      if (!si_->satisfiesBounds(c.state))
+      {
+        continue;
+      }
+
+      // intermediate states only need to be checked if the swept volume is
+      // close to an obstacle; the collision manager is created here, since
+      // the checks below run concurrently
+      c.check_collision = mayCollide(*motion, c.offset);
+      if (c.check_collision) {
+        collisionManager(*motion);
+      }
+      c.deferred = lazy_ && c.check_collision;
+      if (c.deferred) {
+        ++num_deferred_checks_;
+      } else if (c.check_collision) {
+        ++num_collision_checks_;
+      }
+      c.valid = true;
+      candidates.push_back(c);
+    }
+
+    // Check the intermediate states of all candidates (in parallel)
+    thread_pool_->parallelFor(candidates.size(), [&](size_t i, size_t thread) {
+      Candidate& c = candidates[i];
+      if (c.check_collision && !c.deferred) {
+        c.valid = !collides(*c.motion, c.offset, thread);
+      }
+    });
+
+    // Add the valid candidates in order, so that the result does not depend
+    // on the number of threads
+    for (Candidate& c : candidates) {
+      // Skip this motion, if it isn't valid
+      if (!c.valid) {
+        continue;
+      }
+
+      // Check if we have this state (or any within delta/2) already
+      flat_space_->fromState(c.state, query_state.data());
+      query_n.state = query_state.data();
+      float radius = delta*(1-alpha);
+      T_n_->nearestR(&query_n, radius, neighbors_n);
+
+      if (neighbors_n.size() == 0)
+      {
+        // new state -> add it to open and T_n
+        const uint32_t idx = nodes_.allocate();
+        AStarNode* node = &nodes_[idx];
+        std::copy(query_state.begin(), query_state.end(), nodes_.state(idx));
+        node->state = nodes_.state(idx);
+        node->idx = idx;
+        node->gScore = c.gScore;
+        node->hScore = c.hScore;
+        node->fScore = c.fScore;
+        node->came_from = current->idx;
+        node->used_motion = c.motion->idx;
+        node->used_offset = c.computed_offset;
+        node->is_in_open = true;
+        node->is_closed = false;
+        node->is_in_incons = false;
+        node->is_verified = !c.deferred;
+        node->is_invalid = false;
+        open_.push(idx);
+        T_n_->add(node);
+      }
+      else
+      {
+        // check if we have a better path now
+        for (AStarNode* entry : neighbors_n) {
+          assert(flat_space_->distance(entry->state, query_n.state) <= delta);
+          float delta_score = entry->gScore - c.gScore;
+          if (delta_score > 0 || entry->is_invalid) {
+            // only known collision-free motions replace the motion of a node
+            if (c.deferred) {
+              c.deferred = false;
+              ++num_collision_checks_;
+              c.valid = !collides(*c.motion, c.offset, 0);
+              if (!c.valid) {
+                break;
+              }
+            }
+            entry->is_verified = true;
+            entry->is_invalid = false;
+            entry->gScore = c.gScore;
+            entry->fScore -= delta_score;
+            assert(entry->fScore >= 0);
+            entry->came_from = current->idx;
+            entry->used_motion = c.motion->idx;
+            entry->used_offset = c.computed_offset;
+            if (entry->is_in_open) {
+              open_.decreaseKey(entry->idx);
+            } else if (anytime && entry->is_closed) {
+              // ARA*: expanded nodes are only re-opened in the next iteration
+              if (!entry->is_in_incons) {
+                incons_.push_back(entry->idx);
+                entry->is_in_incons = true;
+              }
+            } else {
+              // TODO: is this correct?
+              open_.push(entry->idx);
+              entry->is_in_open = true;
+            }
+          }
+        }
+      }
+    }
+  }
+  for (auto state : candidate_states) {
+    si_->freeState(state);
+  }
+  si_->freeState(fakeMotion.states[0]);
+
+  return found;
+}
+
+void DBAstar::reprioritize()
+{
+  // re-open inconsistent nodes, update f-scores for the current epsilon, and
+  // prune nodes that can't lead to a solution within the cost bound
+  std::vector<uint32_t> nodes;
+  for (uint32_t idx = 0; idx < nodes_.size(); ++idx) {
+    AStarNode& node = nodes_[idx];
+    if (node.is_in_open || node.is_in_incons) {
+      nodes.push_back(idx);
+    }
+    node.is_in_open = false;
+    node.is_in_incons = false;
+    node.is_closed = false;
+  }
+  open_.clear();
+  incons_.clear();
+
+  const float maxCost = max_cost_;
+  size_t num_pruned = 0;
+  for (uint32_t idx : nodes) {
+    AStarNode& node = nodes_[idx];
+    node.fScore = node.gScore + epsilon_ * node.hScore;
+    if (node.gScore + node.hScore > maxCost) {
+      ++num_pruned;
+      continue;
+    }
+    open_.push(idx);
+    node.is_in_open = true;
+  }
+  std::cout << "Re-opened " << open_.size() << " nodes (pruned " << num_pruned << ")" << std::endl;
+}
+
+bool DBAstar::plan(
+  float delta,
+  float epsilon,
+  float alpha,
+  bool filterDuplicates,
+  float maxCost)
+{
+  startSearch(delta, epsilon, alpha, filterDuplicates, maxCost);
+
+  if (search(false)) {
+    return true;
+  }
+
+  AStarNode query_n;
+  query_n.state = goal_values_.data();
+  const AStarNode* nearest = T_n_->nearest(&query_n);
+  if (!nearest->is_verified) {
+    // lazy collision checking: only the paths to expanded nodes are checked
+    float nearest_distance = std::numeric_limits<float>::infinity();
+    for (uint32_t idx = 0; idx < nodes_.size(); ++idx) {
+      const float dist = flat_space_->distance(nodes_[idx].state, goal_values_.data());
+      if (nodes_[idx].is_verified && dist < nearest_distance) {
+        nearest = &nodes_[idx];
+        nearest_distance = dist;
+      }
+    }
+  }
+  if (nearest->gScore == 0) {
+    std::cout << "No solution found (not even approxmite)" << std::endl;
+    return false;
+  }
+
+  float nearest_distance = flat_space_->distance(nearest->state, goal_values_.data());
+  std::cout << "Nearest to goal: " << nearest_distance << " (delta: " << delta_ << ")" << std::endl;
+
+  std::cout << "Using approximate solution cost: " << nearest->gScore << std::endl;
+
+  storeResult(*nearest);
+  return true;
+}
+
+bool DBAstar::planAnytime(
+  float delta,
+  float epsilon,
+  float alpha,
+  bool filterDuplicates,
+  float maxCost,
+  float finalEpsilon,
+  float epsilonStep,
+  const std::function<bool()>& onSolution)
+{
+  if (finalEpsilon < 1 || finalEpsilon > epsilon || epsilonStep <= 0) {
+    throw std::runtime_error("Need epsilon >= finalEpsilon >= 1 and epsilonStep > 0!");
+  }
+  startSearch(delta, epsilon, alpha, filterDuplicates, maxCost);
+
+  // result_ always holds the best solution found so far
+  while (!stop_requested_) {
+    if (search(true)) {
+      std::cout << "Anytime: solution with cost " << cost() << " (epsilon: " << epsilon_ << ")" << std::endl;
+      if (onSolution && !onSolution()) {
+        break;
+      }
+      // only strictly better solutions are of interest
+      tightenMaxCost(std::nextafter(cost(), 0.0f));
+    } else if (epsilon_ <= finalEpsilon && incons_.empty()) {
+      // there is no better solution (for the given motions and delta). Nodes
+      // are merged within delta, so even at the final epsilon, expanded nodes
+      // might have been improved; these are re-opened first (see below)
+      break;
+    }
+    epsilon_ = std::max(finalEpsilon, epsilon_ - epsilonStep);
+    reprioritize();
+  }
+  return !result_.empty();
+}
+
+void DBAstar::getSolution(
+  std::vector<double>& states,
+  std::vector<double>& actions,
+  std::map<size_t, size_t>& motion_stats)
+{
+  if (result_.empty()) {
+    throw std::runtime_error("No solution available!");
+  }
+  states.clear();
+  actions.clear();
+  motion_stats.clear();
+
+  std::vector<double> reals;
+  ob::State* node_state = si_->allocState();
+  for (size_t i = 0; i < result_.size() - 1; ++i)
+  {
+    flat_space_->toState(result_[i].state, node_state);
+    const fcl::Vector3f current_pos = robot_->getTransform(node_state).translation();
+    const auto &motion = motions_.at(result_[i+1].used_motion);
+    // skip last state of each motion
+    for (size_t k = 0; k < motion.states.size() - 1; ++k)
+    {
+      const auto state = motion.states[k];
+      si_->copyState(tmp_state_, state);
+      const fcl::Vector3f relative_pos = robot_->getTransform(state).translation();
+      robot_->setPosition(tmp_state_, current_pos + result_[i+1].used_offset + relative_pos);
+      si_->getStateSpace()->copyToReals(reals, tmp_state_);
+      states.insert(states.end(), reals.begin(), reals.end());
+    }
+    for (const auto action : motion.actions)
+    {
+      for (size_t d = 0; d < controlDim(); ++d)
+      {
+        actions.push_back(*si_->getControlSpace()->getValueAddressAtIndex(action, d));
+      }
+    }
+    motion_stats[motion.idx] += 1;
+  }
+  flat_space_->toState(result_.back().state, node_state);
+  si_->getStateSpace()->copyToReals(reals, node_state);
+  states.insert(states.end(), reals.begin(), reals.end());
+  si_->freeState(node_state);
+}
+
+void DBAstar::writeResult(const std::string& outputFile)
+{
+  if (result_.empty()) {
+    throw std::runtime_error("No solution to write!");
+  }
+
+  std::ofstream out(outputFile);
+  out << "delta: " << delta_ << std::endl;
+  out << "epsilon: " << epsilon_ << std::endl;
+  out << "cost: " << result_.back().gScore << std::endl;
+  // memory usage, e.g., to size jobs
+  struct rusage usage;
+  getrusage(RUSAGE_SELF, &usage);
+  out << "search_stats:" << std::endl;
+  out << "  expands: " << num_expands_ << std::endl;
+  out << "  nodes: " << nodes_.size() << std::endl;
+  out << "  node_allocations: " << nodes_.numAllocations() << std::endl;
+  out << "  node_memory_bytes: " << nodes_.numBytes() << std::endl;
+  out << "  collision_checks: " << num_collision_checks_ << std::endl;
+  // lazy: deferred checks that were never needed
+  out << "  collision_checks_saved: " << num_deferred_checks_ - (lazy_ ? num_collision_checks_ : 0) << std::endl;
+  out << "  collision_cache_hits: " << collisionCacheHits() << std::endl;
+  out << "  collision_cache_misses: " << collisionCacheMisses() << std::endl;
+  out << "  peak_memory_kb: " << usage.ru_maxrss << std::endl;
+  out << "result:" << std::endl;
+  out << "  - states:" << std::endl;
+  ob::State* node_state = si_->allocState();
+  for (size_t i = 0; i < result_.size() - 1; ++i)
+  {
+    // Compute intermediate states
+    flat_space_->toState(result_[i].state, node_state);
+    const fcl::Vector3f current_pos = robot_->getTransform(node_state).translation();
+    const auto &motion = motions_.at(result_[i+1].used_motion);
+    out << "      # ";
+    printState(out, si_, node_state);
+    out << std::endl;
+    out << "      # motion " << motion.idx << " with cost " << motion.cost << std::endl;
+    // skip last state each
+    for (size_t k = 0; k < motion.states.size(); ++k)
+    {
+      const auto state = motion.states[k];
+      si_->copyState(tmp_state_, state);
+      const fcl::Vector3f relative_pos = robot_->getTransform(state).translation();
+      robot_->setPosition(tmp_state_, current_pos + result_[i+1].used_offset + relative_pos);
+
+      if (k < motion.states.size() - 1) {
+        out << "      - ";
+      } else {
+        out << "      # ";
+      }
+      printState(out, si_, tmp_state_);
+      out << std::endl;
+    }
+    out << std::endl;
+  }
+  out << "      - ";
+  flat_space_->toState(result_.back().state, node_state);
+  printState(out, si_, node_state);
+  out << std::endl;
+  si_->freeState(node_state);
+  out << "    actions:" << std::endl;
+  for (size_t i = 0; i < result_.size() - 1; ++i)
+  {
+    const auto &motion = motions_[result_[i+1].used_motion];
+    out << "      # motion " << motion.idx << " with cost " << motion.cost << std::endl;
+    for (size_t k = 0; k < motion.actions.size(); ++k)
+    {
+      const auto& action = motion.actions[k];
+      out << "      - ";
+      printAction(out, si_, action);
+      out << std::endl;
+    }
+    out << std::endl;
+  }
+  // statistics for the motions used
+  std::map<size_t, size_t> motionsCount; // motionId -> usage count
+  for (size_t i = 0; i < result_.size() - 1; ++i)
+  {
+    auto motionId = result_[i+1].used_motion;
+    auto iter = motionsCount.find(motionId);
+    if (iter == motionsCount.end()) {
+      motionsCount[motionId] = 1;
+    } else {
+      iter->second += 1;
+    }
+  }
+  out << "    motion_stats:" << std::endl;
+  for (const auto& kv : motionsCount) {
+    out << "      " << motions_[kv.first].idx << ": " << kv.second << std::endl;
+  }
+
+  if (is_exact_solution_) {
+    // statistics on where the motion splits are
+    out << "    splits:" << std::endl;
+    for (size_t i = 0; i < result_.size() - 1; ++i) {
+      const auto &motion = motions_.at(result_[i+1].used_motion);
+      out << "      - " << motion.states.size() - 1 << std::endl;
+    }
+  }
+}
@@ -0,0 +1,361 @@
+#pragma once
+
+#include <atomic>
+#include <deque>
+#include <functional>
+#include <limits>
+#include <map>
+#include <random>
+#include <string>
+#include <vector>
+
+#include <yaml-cpp/yaml.h>
+#include <msgpack.hpp>
+
+// OMPL headers
+#include <ompl/control/SpaceInformation.h>
+#include <ompl/datastructures/NearestNeighbors.h>
+
+#include "robots.h"
+#include "fclHelper.hpp"
+#include "threadPool.hpp"
+#include "gridHeuristic.hpp"
+#include "nodePool.hpp"
+#include "applicabilityTable.hpp"
+#include "collisionCache.hpp"
+#include "signedDistanceField.hpp"
+
+class Motion
+{
+public:
+  std::vector<ompl::base::State*> states;
+  std::vector<ompl::control::Control*> actions;
+
+  // built on first use (see DBAstar::collisionManager)
+  std::shared_ptr<ShiftableDynamicAABBTreeCollisionManager<float>> collision_manager;
+  std::vector<fcl::CollisionObjectf *> collision_objects;
+  // transform of each part at each state (unshifted, state-major)
+  std::vector<fcl::Transform3f> transforms;
+  // swept volume of all states (unshifted)
+  fcl::AABBf aabb;
+
+  float cost;
+
+  size_t idx;
+  // std::string name;
+  bool disabled;
+};
+
+// Node type (used for open and explored states); stored in a NodePool
+struct AStarNode
+{
+  const float *state; // see FlatStateSpace
+
+  float fScore; // gScore + epsilon * hScore (order of open)
+  float gScore;
+  float hScore; // heuristic (not inflated)
+
+  uint32_t idx;
+  uint32_t came_from; // NodePool<AStarNode>::NONE for the start node
+  fcl::Vector3f used_offset;
+  size_t used_motion;
+
+  size_t heap_index; // position in open (see NodeHeap)
+  bool is_in_open;
+  // expanded in the current iteration (anytime search)
+  bool is_closed;
+  bool is_in_incons;
+  // the motion from came_from is known to be collision-free (see setLazy)
+  bool is_verified;
+  // the motion from came_from collides; kept as placeholder for better motions
+  bool is_invalid;
+};
+
+// view on a motion given as row-major arrays (e.g., numpy)
+struct MotionView
+{
+  const double* states;  // num_states x state dimension
+  size_t num_states;
+  const double* actions; // num_actions x control dimension
+  size_t num_actions;
+  const float* aabb;     // optional: min (3) and max (3) of the swept volume
+};
+
+// db-A* planner that keeps the environment, the motion primitives, and the
+// motion kd-tree (T_m) in memory, such that it can be queried repeatedly
+class DBAstar
+{
+public:
+  DBAstar();
+
+  ~DBAstar();
+
+  // load obstacles, robot, start, and goal from a problem description (yaml)
+  void loadEnvironment(const std::string& inputFile);
+
+  // add motion primitives stored in a msgpack file, which is an append-only
+  // log of motion arrays, or in a binary motion library (see motionLibrary.hpp);
+  // motions already read from this file are skipped.
+  // Returns number of added motions
+  size_t addMotions(const std::string& motionsFile);
+
+  // add motion primitives from an (unpacked) msgpack array
+  size_t addMotions(const msgpack::object& msg_obj);
+
+  // add motion primitives given as arrays
+  size_t addMotions(const std::vector<MotionView>& motions);
+
+  // replace start and goal of the loaded environment (e.g., for multiple
+  // queries); states are given as reals (see stateDim)
+  void setStartGoal(const std::vector<double>& start, const std::vector<double>& goal);
+
+  void getStartGoal(std::vector<double>& start, std::vector<double>& goal) const;
+
+  // use shortest path distances on an occupancy grid (with the given resolution) as
+  // heuristic, rather than Euclidean distances. The grid is cached in cacheDirectory
+  // (if not empty), keyed by a hash of the environment. Requires a loaded environment.
+  // The grid is recomputed (or loaded) whenever the goal changes.
+  void setGridHeuristic(float resolution, const std::string& cacheDirectory = "");
+
+  // check 2D robots against the (box) obstacles with a signed distance field of
+  // the given resolution first, and only use FCL close to obstacles (see
+  // SdfCollisionChecker); a resolution <= 0 disables it. Requires a loaded environment.
+  void setSignedDistanceField(float resolution);
+
+  // number of threads used to check the candidate motions of an expanded node
+  // concurrently (1: sequential). The search result does not depend on it.
+  void setNumThreads(size_t num_threads);
+
+  size_t numThreads() const
+  {
+    return num_threads_;
+  }
+
+  // data structure for the radius queries of motions (T_m) and nodes (T_n):
+  // "default" (GNAT for metric spaces, SqrtApprox otherwise), "gnat",
+  // "sqrtapprox", or "grid" (see NearestNeighborsGrid)
+  void setNearestNeighbors(const std::string& type);
+
+  const std::string& nearestNeighbors() const
+  {
+    return nearest_neighbors_;
+  }
+
+  // find the applicable motions of expanded nodes with a lookup table over the
+  // non-positional state (see ApplicabilityTable), rather than with T_m. The
+  // table is built for the first search with a given delta and alpha, and
+  // extended with motions that are added later.
+  void setApplicabilityTable(bool applicability_table);
+
+  bool applicabilityTable() const
+  {
+    return use_applicability_table_;
+  }
+
+  // cache collision-free checks of motions (at most capacity entries), keyed
+  // by the motion and its offset quantized to the given resolution (see
+  // CollisionCache); a resolution <= 0 disables the cache. Checks that miss the
+  // cache compute the distance to the obstacles rather than a boolean result.
+  void setCollisionCache(float resolution, size_t capacity = 100000);
+
+  // cache hits and misses of the last search
+  size_t collisionCacheHits() const
+  {
+    return collision_cache_ ? collision_cache_->hits() : 0;
+  }
+
+  size_t collisionCacheMisses() const
+  {
+    return collision_cache_ ? collision_cache_->misses() : 0;
+  }
+
+  // lazy collision checking (Lazy Weighted A*): successors are inserted
+  // without checking the motion for collisions; the check is done once the
+  // node is expanded (or the motion would rewire an existing node)
+  void setLazy(bool lazy)
+  {
+    lazy_ = lazy;
+  }
+
+  bool lazy() const
+  {
+    return lazy_;
+  }
+
+  // estimate delta, such that each state has (on average) the desired number of applicable motions
+  float computeDelta(size_t num_desired_neighbors, float alpha);
+
+  // disable motions (index >= first_motion) that are similar to another one; returns number of disabled motions
+  size_t filterDuplicates(float delta, float alpha, size_t first_motion = 0);
+
+  // resolve delta (negative: auto-compute with k=-delta), optionally filter
+  // duplicates, and search; returns true if a (possibly approximate) solution was found
+  bool plan(
+    float delta,
+    float epsilon,
+    float alpha,
+    bool filterDuplicates,
+    float maxCost = std::numeric_limits<float>::infinity());
+
+  // anytime variant (ARA*) of plan(): after each solution, the cost bound is
+  // tightened to its cost, epsilon is decreased by epsilonStep (down to
+  // finalEpsilon), and the search continues with the same nodes.
+  // onSolution (optional) is called for each improved solution, from which
+  // the solution can be queried; returning false stops the search.
+  // Returns true if at least one solution was found.
+  bool planAnytime(
+    float delta,
+    float epsilon,
+    float alpha,
+    bool filterDuplicates,
+    float maxCost,
+    float finalEpsilon,
+    float epsilonStep,
+    const std::function<bool()>& onSolution = nullptr);
+
+  // lower the cost bound of the running search (thread-safe)
+  void tightenMaxCost(float maxCost);
+
+  // stop the running search as soon as possible (thread-safe)
+  void requestStop()
+  {
+    stop_requested_ = true;
+  }
+
+  // write the solution of the last call to plan() (yaml)
+  void writeResult(const std::string& outputFile);
+
+  // states and actions (flattened, row-major) and motion usage (motion idx -> count) of the last solution
+  void getSolution(
+    std::vector<double>& states,
+    std::vector<double>& actions,
+    std::map<size_t, size_t>& motion_stats);
+
+  // number of reals per state and control, respectively
+  size_t stateDim() const;
+
+  size_t controlDim() const;
+
+  size_t numMotions() const
+  {
+    return motions_.size();
+  }
+
+  float delta() const
+  {
+    return delta_;
+  }
+
+  float cost() const
+  {
+    return result_.empty() ? std::numeric_limits<float>::infinity() : result_.back().gScore;
+  }
+
+  bool isExactSolution() const
+  {
+    return is_exact_solution_;
+  }
+
+private:
+  float heuristic(const ompl::base::State *s) const;
+
+  void clearSearch();
+
+  // store the path to the given node in result_
+  void storeResult(const AStarNode& node);
+
+  // resolve delta, filter duplicates, and initialize open and T_n with the start node
+  void startSearch(
+    float delta,
+    float epsilon,
+    float alpha,
+    bool filterDuplicates,
+    float maxCost);
+
+  // expand nodes until a solution is found (returns true) or open is exhausted
+  bool search(bool anytime);
+
+  // prepare the next iteration of the anytime search
+  void reprioritize();
+
+  size_t addMotionsFromLibrary(const std::string& libraryFile);
+
+  // (re-)create T_m with the current nearest neighbors type
+  void resetMotionTree();
+
+  // build (or extend) the applicability table for the given radius
+  void updateApplicabilityTable(float radius);
+
+  // true if the (shifted) swept volume of the motion overlaps with an obstacle
+  bool mayCollide(const Motion& motion, const fcl::Vector3f& offset) const;
+
+  ShiftableDynamicAABBTreeCollisionManager<float>* collisionManager(Motion& motion);
+
+  // check the (shifted) motion against the obstacles using the given thread's
+  // copy of the environment; requires the collision manager of the motion
+  bool collides(const Motion& motion, const fcl::Vector3f& offset, size_t thread);
+
+private:
+  std::shared_ptr<fcl::BroadPhaseCollisionManagerf> bpcm_env_;
+  std::vector<fcl::CollisionObjectf *> obstacles_;
+
+  fcl::Vector3f env_min_;
+  fcl::Vector3f env_max_;
+  std::unique_ptr<GridHeuristic> grid_heuristic_;
+  float grid_resolution_;
+  std::string grid_cache_directory_;
+
+  std::shared_ptr<Robot> robot_;
+  std::shared_ptr<ompl::control::SpaceInformation> si_;
+  // robot with no position bounds (used to sanitize motion primitives)
+  std::shared_ptr<Robot> robot_no_pos_bound_;
+  std::shared_ptr<ompl::control::SpaceInformation> si_no_pos_bound_;
+  // states of the search nodes are stored as floats
+  std::unique_ptr<FlatStateSpace> flat_space_;
+  std::vector<float> goal_values_;
+
+  ompl::base::State* start_state_;
+  ompl::base::State* goal_state_;
+  ompl::base::State* tmp_state_;
+
+  // motions are stored in a deque, since T_m keeps pointers to them
+  std::deque<Motion> motions_;
+  std::string nearest_neighbors_;
+  std::unique_ptr<ompl::NearestNeighbors<Motion*>> T_m_;
+  bool use_applicability_table_;
+  std::unique_ptr<ApplicabilityTable> applicability_table_;
+  std::default_random_engine rng_;
+  // bytes (msgpack) or motions (library) already read from each motions file
+  std::map<std::string, size_t> motions_file_offsets_;
+
+  // motions [0, num_filtered_motions_) were checked for duplicates using duplicates_delta_/alpha_
+  size_t num_filtered_motions_;
+  float duplicates_delta_;
+  float duplicates_alpha_;
+
+  size_t num_threads_;
+  std::unique_ptr<ThreadPool> thread_pool_;
+  // one copy of the obstacles per thread (see OffsetCollisionManager)
+  std::vector<std::unique_ptr<OffsetCollisionManager<float>>> thread_envs_;
+  std::unique_ptr<CollisionCache> collision_cache_;
+  std::shared_ptr<SdfCollisionChecker> sdf_;
+  bool lazy_;
+
+  // search state of the last call to plan()
+  NodePool<AStarNode> nodes_;
+  NodeHeap<AStarNode> open_;
+  std::unique_ptr<ompl::NearestNeighbors<AStarNode*>> T_n_;
+  std::vector<uint32_t> incons_;
+  size_t num_expands_;
+  size_t num_collision_checks_;
+  // collision checks of candidates that were deferred (lazy)
+  size_t num_deferred_checks_;
+  // copy of the nodes along the solution path
+  std::vector<AStarNode> result_;
+  bool is_exact_solution_;
+  float delta_;
+  float epsilon_;
+  float alpha_;
+  std::atomic<float> max_cost_;
+  std::atomic<bool> stop_requested_;
+};
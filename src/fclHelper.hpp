@@ -43,4 +43,52 @@ protected:
       shift_recursive(node->children[1], offset);
     }
   }
-};
\ No newline at end of file
+};
+
+// Copy of a set of collision objects that can be placed at an offset. This
+// allows concurrent collision checks against the same (read-only) collision
+// managers, e.g., of motions, without shifting them in place.
+template <typename S>
+class OffsetCollisionManager
+{
+public:
+  OffsetCollisionManager(const std::vector<fcl::CollisionObject<S>*>& objects)
+  {
+    for (const auto obj : objects) {
+      auto geom = std::const_pointer_cast<fcl::CollisionGeometry<S>>(obj->collisionGeometry());
+      auto co = new fcl::CollisionObject<S>(geom, obj->getTransform());
+      co->computeAABB();
+      objects_.push_back(co);
+      translations_.push_back(obj->getTranslation());
+    }
+    manager_.registerObjects(objects_);
+    manager_.setup();
+  }
+
+  ~OffsetCollisionManager()
+  {
+    manager_.clear();
+    for (auto co : objects_) {
+      delete co;
+    }
+  }
+
+  OffsetCollisionManager(const OffsetCollisionManager&) = delete;
+  OffsetCollisionManager& operator=(const OffsetCollisionManager&) = delete;
+
+  // manager with all objects shifted by the given offset
+  fcl::BroadPhaseCollisionManager<S>* at(const fcl::Vector3<S>& offset)
+  {
+    for (size_t i = 0; i < objects_.size(); ++i) {
+      objects_[i]->setTranslation(translations_[i] + offset);
+      objects_[i]->computeAABB();
+    }
+    manager_.update();
+    return &manager_;
+  }
+
+private:
+  fcl::DynamicAABBTreeCollisionManager<S> manager_;
+  std::vector<fcl::CollisionObject<S>*> objects_;
+  std::vector<fcl::Vector3<S>> translations_;
+};
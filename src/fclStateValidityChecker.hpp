@@ -2,6 +2,7 @@
 
 // #include "environment.h"
 #include "robots.h"
+#include "signedDistanceField.hpp"
 
 #include <fcl/fcl.h>
 
@@ -12,10 +13,12 @@ public:
   fclStateValidityChecker(
       ompl::base::SpaceInformationPtr si,
       std::shared_ptr<fcl::BroadPhaseCollisionManagerf> environment,
-      std::shared_ptr<Robot> robot)
+      std::shared_ptr<Robot> robot,
+      std::shared_ptr<SdfCollisionChecker> sdf = nullptr)
       : StateValidityChecker(si)
       , environment_(environment)
       , robot_(robot)
+      , sdf_(sdf)
   {
   }
 
@@ -27,6 +30,16 @@ public:
 
     for (size_t part = 0; part < robot_->numParts(); ++part) {
       const auto& transform = robot_->getTransform(state, part);
+      if (sdf_) {
+        // FCL is only needed close to the obstacles
+        const auto result = sdf_->classify(transform, part);
+        if (result == SdfCollisionChecker::FREE) {
+          continue;
+        }
+        if (result == SdfCollisionChecker::COLLISION) {
+          return false;
+        }
+      }
       fcl::CollisionObjectf robot(robot_->getCollisionGeometry(part)); //, robot_->getTransform(state));
       robot.setTranslation(transform.translation());
       robot.setRotation(transform.rotation());
@@ -44,4 +57,5 @@ public:
 private:
   std::shared_ptr<fcl::BroadPhaseCollisionManagerf> environment_;
   std::shared_ptr<Robot> robot_;
+  std::shared_ptr<SdfCollisionChecker> sdf_;
 };
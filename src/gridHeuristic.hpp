@@ -0,0 +1,283 @@
+#pragma once
+
+// Obstacle-aware heuristic: shortest path distances to the goal on an
+// occupancy grid (2D or 3D), computed once per environment with Dijkstra.
+
+#include <array>
+#include <cmath>
+#include <cstdint>
+#include <cstdio>
+#include <cstring>
+#include <fstream>
+#include <functional>
+#include <limits>
+#include <queue>
+#include <string>
+#include <vector>
+
+#include <unistd.h>
+
+#include <fcl/fcl.h>
+
+// radius of the largest sphere (circle in 2D) around the origin of the geometry
+// that is contained in it; 0 if unknown
+inline float inscribedRadius(const fcl::CollisionGeometryf& geom, size_t dim)
+{
+  float radius = 0;
+  if (geom.getNodeType() == fcl::GEOM_BOX) {
+    const auto& box = static_cast<const fcl::Boxf&>(geom);
+    radius = box.side.head(dim).minCoeff() / 2;
+  } else if (geom.getNodeType() == fcl::GEOM_ELLIPSOID) {
+    const auto& ellipsoid = static_cast<const fcl::Ellipsoidf&>(geom);
+    radius = ellipsoid.radii.head(dim).minCoeff();
+  } else if (geom.getNodeType() == fcl::GEOM_SPHERE) {
+    radius = static_cast<const fcl::Spheref&>(geom).radius;
+  }
+  return radius;
+}
+
+class GridHeuristic
+{
+public:
+  GridHeuristic()
+    : dim_(0)
+    , resolution_(0)
+    , key_(0)
+  {
+  }
+
+  // obstacles are given as axis-aligned boxes, which are inflated by the
+  // inscribed radius of the robot (such that cells are only marked occupied,
+  // if the robot collides for any orientation)
+  void compute(
+    size_t dim,
+    float resolution,
+    const fcl::Vector3f& env_min,
+    const fcl::Vector3f& env_max,
+    const std::vector<fcl::AABBf>& obstacles,
+    float inflation,
+    const fcl::Vector3f& goal)
+  {
+    dim_ = dim;
+    resolution_ = resolution;
+    min_ = env_min;
+    size_.fill(1);
+    for (size_t d = 0; d < dim_; ++d) {
+      size_[d] = std::max<int>(1, std::ceil((env_max[d] - env_min[d]) / resolution_));
+    }
+    key_ = computeKey(dim, resolution, env_min, env_max, obstacles, inflation, goal);
+
+    const size_t num_cells = size_[0] * size_[1] * size_[2];
+    const float inf = std::numeric_limits<float>::infinity();
+
+    // occupancy; the inflated obstacle (Minkowski sum with a sphere) contains
+    // the box grown by inflation / sqrt(dim) along each axis
+    std::vector<bool> occupied(num_cells, false);
+    const float grow = inflation / std::sqrt((float)dim_);
+    for (const auto& obs : obstacles) {
+      std::array<int, 3> lo = {0, 0, 0};
+      std::array<int, 3> hi = {0, 0, 0};
+      for (size_t d = 0; d < dim_; ++d) {
+        // cells that are completely inside the grown box
+        lo[d] = std::max<int>(0, std::ceil((obs.min_[d] - grow - min_[d]) / resolution_));
+        hi[d] = std::min<int>(size_[d] - 1, std::floor((obs.max_[d] + grow - min_[d]) / resolution_) - 1);
+      }
+      for (int x = lo[0]; x <= hi[0]; ++x) {
+        for (int y = lo[1]; y <= hi[1]; ++y) {
+          for (int z = lo[2]; z <= hi[2]; ++z) {
+            occupied[index(x, y, z)] = true;
+          }
+        }
+      }
+    }
+
+    // Dijkstra from the goal cell (8-connected in 2D, 26-connected in 3D)
+    std::vector<std::array<int, 3>> neighbors;
+    std::vector<float> neighbor_costs;
+    for (int dx = -1; dx <= 1; ++dx) {
+      for (int dy = -1; dy <= 1; ++dy) {
+        for (int dz = (dim_ == 3 ? -1 : 0); dz <= (dim_ == 3 ? 1 : 0); ++dz) {
+          if (dx != 0 || dy != 0 || dz != 0) {
+            neighbors.push_back({dx, dy, dz});
+            neighbor_costs.push_back(resolution_ * std::sqrt((float)(dx*dx + dy*dy + dz*dz)));
+          }
+        }
+      }
+    }
+
+    std::vector<float> distances(num_cells, inf);
+    typedef std::pair<float, size_t> entry_t;
+    std::priority_queue<entry_t, std::vector<entry_t>, std::greater<entry_t>> queue;
+    std::array<int, 3> goal_cell;
+    if (cell(goal, goal_cell)) {
+      distances[index(goal_cell[0], goal_cell[1], goal_cell[2])] = 0;
+      queue.push({0, index(goal_cell[0], goal_cell[1], goal_cell[2])});
+    }
+    while (!queue.empty()) {
+      const auto current = queue.top();
+      queue.pop();
+      if (current.first > distances[current.second]) {
+        continue;
+      }
+      const int x = current.second % size_[0];
+      const int y = (current.second / size_[0]) % size_[1];
+      const int z = current.second / (size_[0] * size_[1]);
+      for (size_t i = 0; i < neighbors.size(); ++i) {
+        const int nx = x + neighbors[i][0];
+        const int ny = y + neighbors[i][1];
+        const int nz = z + neighbors[i][2];
+        if (nx < 0 || ny < 0 || nz < 0 || nx >= size_[0] || ny >= size_[1] || nz >= size_[2]) {
+          continue;
+        }
+        const size_t n = index(nx, ny, nz);
+        const float dist = current.first + neighbor_costs[i];
+        if (!occupied[n] && dist < distances[n]) {
+          distances[n] = dist;
+          queue.push({dist, n});
+        }
+      }
+    }
+
+    // Grid paths overestimate Euclidean distances by at most 8% (2D) or 13%
+    // (3D), and positions are anywhere within a cell. Correct for both, so that
+    // the values are (up to discretization) lower bounds.
+    const float ratio = (dim_ == 3) ? 1.1281 : 1.0824;
+    const float slack = std::sqrt((float)dim_) * resolution_;
+    values_.resize(num_cells);
+    for (size_t i = 0; i < num_cells; ++i) {
+      // unreachable cells are unknown (negative), since db-A* can skip small gaps
+      values_[i] = std::isinf(distances[i]) ? -1 : std::max(0.0f, distances[i] / ratio - slack);
+    }
+  }
+
+  // lower bound on the path length from position p to the goal (negative if unknown)
+  float distance(const fcl::Vector3f& p) const
+  {
+    std::array<int, 3> c;
+    if (!cell(p, c)) {
+      return -1;
+    }
+    return values_[index(c[0], c[1], c[2])];
+  }
+
+  uint64_t key() const
+  {
+    return key_;
+  }
+
+  // hash of all inputs of compute()
+  static uint64_t computeKey(
+    size_t dim,
+    float resolution,
+    const fcl::Vector3f& env_min,
+    const fcl::Vector3f& env_max,
+    const std::vector<fcl::AABBf>& obstacles,
+    float inflation,
+    const fcl::Vector3f& goal)
+  {
+    std::vector<float> data = {(float)dim, resolution, inflation};
+    for (size_t d = 0; d < 3; ++d) {
+      data.push_back(env_min[d]);
+      data.push_back(env_max[d]);
+      data.push_back(goal[d]);
+    }
+    for (const auto& obs : obstacles) {
+      for (size_t d = 0; d < 3; ++d) {
+        data.push_back(obs.min_[d]);
+        data.push_back(obs.max_[d]);
+      }
+    }
+    // FNV-1a
+    uint64_t hash = 14695981039346656037ULL;
+    const auto bytes = reinterpret_cast<const unsigned char*>(data.data());
+    for (size_t i = 0; i < data.size() * sizeof(float); ++i) {
+      hash ^= bytes[i];
+      hash *= 1099511628211ULL;
+    }
+    return hash;
+  }
+
+  // returns false if the file does not exist or belongs to a different key
+  bool load(const std::string& filename, uint64_t key)
+  {
+    std::ifstream in(filename, std::ios::binary);
+    Header header;
+    if (!in.read(reinterpret_cast<char*>(&header), sizeof(header))
+        || memcmp(header.magic, MAGIC, sizeof(header.magic)) != 0
+        || header.version != VERSION
+        || header.key != key) {
+      return false;
+    }
+    dim_ = header.dim;
+    resolution_ = header.resolution;
+    key_ = header.key;
+    for (size_t d = 0; d < 3; ++d) {
+      min_[d] = header.min[d];
+      size_[d] = header.size[d];
+    }
+    values_.resize(size_[0] * size_[1] * size_[2]);
+    return (bool)in.read(reinterpret_cast<char*>(values_.data()), values_.size() * sizeof(float));
+  }
+
+  // write atomically, so that concurrent trials can share the cache
+  void save(const std::string& filename) const
+  {
+    Header header;
+    memcpy(header.magic, MAGIC, sizeof(header.magic));
+    header.version = VERSION;
+    header.dim = dim_;
+    header.key = key_;
+    header.resolution = resolution_;
+    for (size_t d = 0; d < 3; ++d) {
+      header.min[d] = min_[d];
+      header.size[d] = size_[d];
+    }
+    const std::string tmp_filename = filename + ".tmp" + std::to_string(getpid());
+    {
+      std::ofstream out(tmp_filename, std::ios::binary);
+      out.write(reinterpret_cast<const char*>(&header), sizeof(header));
+      out.write(reinterpret_cast<const char*>(values_.data()), values_.size() * sizeof(float));
+    }
+    std::rename(tmp_filename.c_str(), filename.c_str());
+  }
+
+private:
+  struct Header
+  {
+    char magic[8];
+    uint32_t version;
+    uint32_t dim;
+    uint64_t key;
+    float resolution;
+    float min[3];
+    int32_t size[3];
+  };
+
+  static constexpr const char* MAGIC = "DBAHEUR";
+  static const uint32_t VERSION = 1;
+
+  size_t index(int x, int y, int z) const
+  {
+    return (size_t)x + size_[0] * ((size_t)y + size_[1] * (size_t)z);
+  }
+
+  bool cell(const fcl::Vector3f& p, std::array<int, 3>& c) const
+  {
+    c.fill(0);
+    for (size_t d = 0; d < dim_; ++d) {
+      c[d] = std::floor((p[d] - min_[d]) / resolution_);
+      if (c[d] < 0 || c[d] >= size_[d]) {
+        return false;
+      }
+    }
+    return true;
+  }
+
+private:
+  size_t dim_;
+  float resolution_;
+  fcl::Vector3f min_;
+  std::array<int, 3> size_;
+  uint64_t key_;
+  std::vector<float> values_;
+};
@@ -106,8 +106,21 @@ int main(int argc, char* argv[]) {
     cfg["control_duration"][0].as<int>(),
     cfg["control_duration"][1].as<int>());
 
+  // optional fast path for 2D collision checks (see SdfCollisionChecker)
+  std::shared_ptr<SdfCollisionChecker> sdf;
+  const float sdfResolution = cfg["sdf_resolution"].as<float>(0);
+  if (sdfResolution > 0) {
+    fcl::Vector3f sdf_min(0, 0, 0);
+    fcl::Vector3f sdf_max(0, 0, 0);
+    for (size_t i = 0; i < env_min.size(); ++i) {
+      sdf_min[i] = env_min[i].as<float>();
+      sdf_max[i] = env_max[i].as<float>();
+    }
+    sdf.reset(new SdfCollisionChecker(robot, obstacles, sdf_min, sdf_max, sdfResolution));
+  }
+
   // set state validity checking for this space
-  auto stateValidityChecker(std::make_shared<fclStateValidityChecker>(si, bpcm_env, robot));
+  auto stateValidityChecker(std::make_shared<fclStateValidityChecker>(si, bpcm_env, robot, sdf));
   si->setStateValidityChecker(stateValidityChecker);
 
   // set the state propagator
@@ -0,0 +1,186 @@
+#pragma once
+
+// Reader for the binary motion library format (see scripts/motion_library.py).
+// The file is memory-mapped (read-only, shared), such that multiple processes
+// share the same pages and loading does not require any parsing.
+
+#include <cstdint>
+#include <cstring>
+#include <stdexcept>
+#include <string>
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+static const char MOTION_LIBRARY_MAGIC[8] = {'K', 'M', 'P', 'L', 'I', 'B', 0, 0};
+static const uint32_t MOTION_LIBRARY_VERSION = 1;
+
+// All values are little-endian. Each section starts at the given byte offset.
+struct MotionLibraryHeader
+{
+  char magic[8];
+  uint32_t version;
+  uint32_t state_dim;
+  uint32_t control_dim;
+  uint32_t reserved;
+  uint64_t num_motions;
+  uint64_t num_states;  // total over all motions
+  uint64_t num_actions; // total over all motions
+  char robot_type[64];
+  uint64_t offset_state_offsets;  // uint64[num_motions + 1]; first state of each motion
+  uint64_t offset_action_offsets; // uint64[num_motions + 1]; first action of each motion
+  uint64_t offset_states;         // float32[num_states][state_dim]
+  uint64_t offset_actions;        // float32[num_actions][control_dim]
+  uint64_t offset_aabbs;          // float32[num_motions][6]; min and max of the swept volume
+};
+static_assert(sizeof(MotionLibraryHeader) == 152, "Unexpected header layout");
+
+class MotionLibrary
+{
+public:
+  MotionLibrary()
+    : data_(nullptr)
+    , size_(0)
+    , header_(nullptr)
+  {
+  }
+
+  ~MotionLibrary()
+  {
+    close();
+  }
+
+  MotionLibrary(const MotionLibrary&) = delete;
+  MotionLibrary& operator=(const MotionLibrary&) = delete;
+
+  // returns true if the file starts with the magic bytes of this format
+  static bool isMotionLibrary(const std::string& filename)
+  {
+    char magic[8] = {0};
+    FILE* f = fopen(filename.c_str(), "rb");
+    if (!f) {
+      return false;
+    }
+    size_t read = fread(magic, 1, sizeof(magic), f);
+    fclose(f);
+    return read == sizeof(magic) && memcmp(magic, MOTION_LIBRARY_MAGIC, sizeof(magic)) == 0;
+  }
+
+  void open(const std::string& filename)
+  {
+    close();
+    int fd = ::open(filename.c_str(), O_RDONLY);
+    if (fd < 0) {
+      throw std::runtime_error("Could not open motion library " + filename);
+    }
+    struct stat st;
+    if (fstat(fd, &st) != 0 || (size_t)st.st_size < sizeof(MotionLibraryHeader)) {
+      ::close(fd);
+      throw std::runtime_error("Invalid motion library " + filename);
+    }
+    size_ = st.st_size;
+    void* data = mmap(nullptr, size_, PROT_READ, MAP_SHARED, fd, 0);
+    ::close(fd);
+    if (data == MAP_FAILED) {
+      size_ = 0;
+      throw std::runtime_error("Could not map motion library " + filename);
+    }
+    data_ = static_cast<const char*>(data);
+    header_ = reinterpret_cast<const MotionLibraryHeader*>(data_);
+
+    if (memcmp(header_->magic, MOTION_LIBRARY_MAGIC, sizeof(MOTION_LIBRARY_MAGIC)) != 0) {
+      close();
+      throw std::runtime_error("Not a motion library: " + filename);
+    }
+    if (header_->version != MOTION_LIBRARY_VERSION) {
+      close();
+      throw std::runtime_error("Unsupported motion library version in " + filename);
+    }
+    if (header_->offset_aabbs + numMotions() * 6 * sizeof(float) > size_) {
+      close();
+      throw std::runtime_error("Truncated motion library " + filename);
+    }
+  }
+
+  void close()
+  {
+    if (data_) {
+      munmap(const_cast<char*>(data_), size_);
+    }
+    data_ = nullptr;
+    size_ = 0;
+    header_ = nullptr;
+  }
+
+  size_t numMotions() const
+  {
+    return header_->num_motions;
+  }
+
+  size_t stateDim() const
+  {
+    return header_->state_dim;
+  }
+
+  size_t controlDim() const
+  {
+    return header_->control_dim;
+  }
+
+  std::string robotType() const
+  {
+    return std::string(header_->robot_type, strnlen(header_->robot_type, sizeof(header_->robot_type)));
+  }
+
+  size_t numStates(size_t motion) const
+  {
+    return stateOffsets()[motion + 1] - stateOffsets()[motion];
+  }
+
+  size_t numActions(size_t motion) const
+  {
+    return actionOffsets()[motion + 1] - actionOffsets()[motion];
+  }
+
+  // row-major num_states x state_dim
+  const float* states(size_t motion) const
+  {
+    return section<float>(header_->offset_states) + stateOffsets()[motion] * stateDim();
+  }
+
+  // row-major num_actions x control_dim
+  const float* actions(size_t motion) const
+  {
+    return section<float>(header_->offset_actions) + actionOffsets()[motion] * controlDim();
+  }
+
+  // min (3) and max (3) of the swept volume of the motion
+  const float* aabb(size_t motion) const
+  {
+    return section<float>(header_->offset_aabbs) + motion * 6;
+  }
+
+private:
+  template<typename T>
+  const T* section(uint64_t offset) const
+  {
+    return reinterpret_cast<const T*>(data_ + offset);
+  }
+
+  const uint64_t* stateOffsets() const
+  {
+    return section<uint64_t>(header_->offset_state_offsets);
+  }
+
+  const uint64_t* actionOffsets() const
+  {
+    return section<uint64_t>(header_->offset_action_offsets);
+  }
+
+private:
+  const char* data_;
+  size_t size_;
+  const MotionLibraryHeader* header_;
+};
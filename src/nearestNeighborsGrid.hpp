@@ -0,0 +1,231 @@
+#pragma once
+
+// Nearest neighbor data structure that hashes elements into a grid over a few
+// coordinates (e.g., position and yaw). Radius queries only compute the
+// distances to elements in the cells that can contain neighbors, which is
+// exact (see StateGrid).
+
+#include <algorithm>
+#include <cmath>
+#include <functional>
+#include <unordered_map>
+#include <vector>
+
+#include <ompl/datastructures/NearestNeighbors.h>
+#include <ompl/util/Exception.h>
+
+#include "stateGrid.hpp"
+
+template<typename _T>
+class NearestNeighborsGrid : public ompl::NearestNeighbors<_T>
+{
+public:
+  static constexpr size_t MAX_DIMS = StateGrid::MAX_DIMS;
+
+  // values writes the state of an element as floats (see FlatStateSpace);
+  // coordinates are the indices of the hashed coordinates (see StateGrid).
+  // Cells have a size such that radius queries with the given resolution
+  // only need to check the neighboring cells.
+  NearestNeighborsGrid(
+    const FlatStateSpace& space,
+    const std::vector<size_t>& coordinates,
+    double resolution,
+    const std::function<void(const _T&, float*)>& values)
+    : values_(values)
+    , buffer_(space.dim())
+    , grid_(space, coordinates, resolution)
+    , size_(0)
+  {
+  }
+
+  // change the cell size (re-hashes all elements)
+  void setResolution(double resolution)
+  {
+    grid_.setResolution(resolution);
+    std::vector<_T> data;
+    list(data);
+    cells_.clear();
+    size_ = 0;
+    add(data);
+  }
+
+  double resolution() const
+  {
+    return grid_.resolution();
+  }
+
+  void add(const _T& data) override
+  {
+    cells_[key(data)].push_back(data);
+    ++size_;
+  }
+
+  void add(const std::vector<_T>& data) override
+  {
+    for (const auto& d : data) {
+      add(d);
+    }
+  }
+
+  bool remove(const _T& data) override
+  {
+    auto iter = cells_.find(key(data));
+    if (iter == cells_.end()) {
+      return false;
+    }
+    auto& cell = iter->second;
+    auto pos = std::find(cell.begin(), cell.end(), data);
+    if (pos == cell.end()) {
+      return false;
+    }
+    cell.erase(pos);
+    if (cell.empty()) {
+      cells_.erase(iter);
+    }
+    --size_;
+    return true;
+  }
+
+  _T nearest(const _T& data) const override
+  {
+    std::vector<_T> nbh;
+    nearestK(data, 1, nbh);
+    if (nbh.empty()) {
+      throw ompl::Exception("No elements found in nearest neighbors data structure");
+    }
+    return nbh[0];
+  }
+
+  void nearestK(const _T& data, std::size_t k, std::vector<_T>& nbh) const override
+  {
+    nbh.clear();
+    if (k == 0 || size_ == 0) {
+      return;
+    }
+    std::vector<std::pair<double, _T>> candidates;
+    const Key center = key(data);
+    // Search cells in rings of growing (Chebyshev) distance around the cell of
+    // the query; elements outside of ring m are at least m * resolution away.
+    for (int ring = 0; ; ++ring) {
+      if (grid_.numCells(ring) > cells_.size()) {
+        // cheaper to check all elements
+        candidates.clear();
+        for (const auto& cell : cells_) {
+          for (const auto& d : cell.second) {
+            candidates.push_back({this->distFun_(data, d), d});
+          }
+        }
+        break;
+      }
+      forEachCell(center, ring, true, [&](const std::vector<_T>& cell) {
+        for (const auto& d : cell) {
+          candidates.push_back({this->distFun_(data, d), d});
+        }
+      });
+      if (candidates.size() >= k) {
+        std::nth_element(candidates.begin(), candidates.begin() + k - 1, candidates.end(), compare);
+        if (candidates[k - 1].first <= ring * grid_.resolution() || grid_.covered(ring)) {
+          break;
+        }
+      } else if (grid_.covered(ring)) {
+        break;
+      }
+    }
+    std::sort(candidates.begin(), candidates.end(), compare);
+    for (size_t i = 0; i < std::min(k, candidates.size()); ++i) {
+      nbh.push_back(candidates[i].second);
+    }
+  }
+
+  void nearestR(const _T& data, double radius, std::vector<_T>& nbh) const override
+  {
+    nbh.clear();
+    std::vector<std::pair<double, _T>> candidates;
+    const int rings = std::ceil(radius / grid_.resolution());
+    if (grid_.numCells(rings) > cells_.size()) {
+      for (const auto& cell : cells_) {
+        addWithinRadius(data, radius, cell.second, candidates);
+      }
+    } else {
+      forEachCell(key(data), rings, false, [&](const std::vector<_T>& cell) {
+        addWithinRadius(data, radius, cell, candidates);
+      });
+    }
+    std::sort(candidates.begin(), candidates.end(), compare);
+    for (const auto& c : candidates) {
+      nbh.push_back(c.second);
+    }
+  }
+
+  std::size_t size() const override
+  {
+    return size_;
+  }
+
+  void list(std::vector<_T>& data) const override
+  {
+    data.clear();
+    for (const auto& cell : cells_) {
+      data.insert(data.end(), cell.second.begin(), cell.second.end());
+    }
+  }
+
+  void clear() override
+  {
+    cells_.clear();
+    size_ = 0;
+  }
+
+  bool reportsSortedResults() const override
+  {
+    return true;
+  }
+
+private:
+  typedef StateGrid::Key Key;
+
+  static bool compare(const std::pair<double, _T>& a, const std::pair<double, _T>& b)
+  {
+    return a.first < b.first;
+  }
+
+  Key key(const _T& data) const
+  {
+    values_(data, buffer_.data());
+    return grid_.key(buffer_.data());
+  }
+
+  // call fn for each non-empty cell within the given number of rings around
+  // center (each cell once); if only_outer, only for the cells on the outermost ring
+  template<typename F>
+  void forEachCell(const Key& center, int rings, bool only_outer, F fn) const
+  {
+    grid_.forEachKey(center, rings, only_outer, [&](const Key& k) {
+      auto iter = cells_.find(k);
+      if (iter != cells_.end()) {
+        fn(iter->second);
+      }
+    });
+  }
+
+  void addWithinRadius(
+    const _T& data,
+    double radius,
+    const std::vector<_T>& cell,
+    std::vector<std::pair<double, _T>>& candidates) const
+  {
+    for (const auto& d : cell) {
+      const double dist = this->distFun_(data, d);
+      if (dist <= radius) {
+        candidates.push_back({dist, d});
+      }
+    }
+  }
+
+private:
+  std::function<void(const _T&, float*)> values_;
+  mutable std::vector<float> buffer_;
+  StateGrid grid_;
+  std::unordered_map<Key, std::vector<_T>, StateGrid::KeyHash> cells_;
+  size_t size_;
+};
@@ -0,0 +1,331 @@
+#pragma once
+
+// Compact storage for search nodes: nodes and their states (as floats) are
+// allocated in blocks, nodes refer to each other by index, and the open list
+// is a binary heap of node indices.
+
+#include <cmath>
+#include <cstdint>
+#include <memory>
+#include <stdexcept>
+#include <vector>
+
+#include <ompl/base/StateSpace.h>
+
+// OMPL state space with states stored as float arrays (in the order of
+// copyToReals). Distances are computed without virtual calls, using the same
+// metric as OMPL. Supports (compound) spaces of real vectors, SO(2), and SO(3).
+class FlatStateSpace
+{
+public:
+  FlatStateSpace(const ompl::base::StateSpacePtr& space)
+    : space_(space)
+    , dim_(0)
+  {
+    addSpace(space.get(), 1.0);
+    if (dim_ != space->getValueLocations().size()) {
+      throw std::runtime_error("Unexpected value locations of state space " + space->getName());
+    }
+  }
+
+  size_t dim() const
+  {
+    return dim_;
+  }
+
+  void fromState(const ompl::base::State* state, float* values) const
+  {
+    const auto& locations = space_->getValueLocations();
+    for (size_t i = 0; i < dim_; ++i) {
+      values[i] = *space_->getValueAddressAtLocation(state, locations[i]);
+    }
+  }
+
+  void toState(const float* values, ompl::base::State* state) const
+  {
+    const auto& locations = space_->getValueLocations();
+    for (size_t i = 0; i < dim_; ++i) {
+      *space_->getValueAddressAtLocation(state, locations[i]) = values[i];
+    }
+  }
+
+  // OMPL type of the component the given coordinate belongs to (e.g., STATE_SPACE_SO2)
+  int coordinateType(size_t i) const
+  {
+    return component(i).type;
+  }
+
+  // weight of the component the given coordinate belongs to; for real vector
+  // and SO(2) coordinates, the distance of two states is at least
+  // weight * |difference of this coordinate| (wrapped for SO(2))
+  float coordinateWeight(size_t i) const
+  {
+    return component(i).weight;
+  }
+
+  float distance(const float* a, const float* b) const
+  {
+    float dist = 0;
+    for (const auto& c : components_) {
+      const float* x = a + c.offset;
+      const float* y = b + c.offset;
+      float d = 0;
+      if (c.type == ompl::base::STATE_SPACE_REAL_VECTOR) {
+        for (size_t k = 0; k < c.dim; ++k) {
+          d += (x[k] - y[k]) * (x[k] - y[k]);
+        }
+        d = std::sqrt(d);
+      } else if (c.type == ompl::base::STATE_SPACE_SO2) {
+        d = std::fabs(x[0] - y[0]);
+        d = (d > M_PI) ? 2 * M_PI - d : d;
+      } else {
+        // SO(3), quaternions (x, y, z, w)
+        const float dq = std::fabs(x[0] * y[0] + x[1] * y[1] + x[2] * y[2] + x[3] * y[3]);
+        d = (dq >= 1) ? 0 : std::acos(dq);
+      }
+      dist += c.weight * d;
+    }
+    return dist;
+  }
+
+private:
+  void addSpace(const ompl::base::StateSpace* space, float weight)
+  {
+    if (space->isCompound()) {
+      const auto compound = space->as<ompl::base::CompoundStateSpace>();
+      for (unsigned int i = 0; i < compound->getSubspaceCount(); ++i) {
+        addSpace(compound->getSubspace(i).get(), weight * compound->getSubspaceWeight(i));
+      }
+      return;
+    }
+    Component c;
+    c.type = space->getType();
+    c.offset = dim_;
+    c.weight = weight;
+    if (c.type == ompl::base::STATE_SPACE_REAL_VECTOR) {
+      c.dim = space->getDimension();
+    } else if (c.type == ompl::base::STATE_SPACE_SO2) {
+      c.dim = 1;
+    } else if (c.type == ompl::base::STATE_SPACE_SO3) {
+      c.dim = 4;
+    } else {
+      throw std::runtime_error("Unsupported state space " + space->getName());
+    }
+    dim_ += c.dim;
+    components_.push_back(c);
+  }
+
+  struct Component
+  {
+    int type;
+    size_t offset;
+    size_t dim;
+    float weight;
+  };
+
+  const Component& component(size_t i) const
+  {
+    for (const auto& c : components_) {
+      if (i < c.offset + c.dim) {
+        return c;
+      }
+    }
+    throw std::out_of_range("Invalid coordinate");
+  }
+
+private:
+  ompl::base::StateSpacePtr space_;
+  size_t dim_;
+  std::vector<Component> components_;
+};
+
+// Nodes and their states, allocated in blocks of fixed size. Nodes (and
+// states) never move, so that pointers to them stay valid until clear().
+// Blocks are kept for the next search.
+template<typename Node>
+class NodePool
+{
+public:
+  static constexpr uint32_t NONE = UINT32_MAX;
+
+  NodePool(size_t block_size = 4096)
+    : block_size_(block_size)
+    , state_dim_(0)
+    , size_(0)
+  {
+  }
+
+  NodePool(const NodePool&) = delete;
+  NodePool& operator=(const NodePool&) = delete;
+
+  void setStateDim(size_t state_dim)
+  {
+    state_dim_ = state_dim;
+    size_ = 0;
+    node_blocks_.clear();
+    state_blocks_.clear();
+  }
+
+  // returns the index of a new (default initialized) node
+  uint32_t allocate()
+  {
+    if (size_ == node_blocks_.size() * block_size_) {
+      node_blocks_.emplace_back(new Node[block_size_]);
+      state_blocks_.emplace_back(new float[block_size_ * state_dim_]);
+    }
+    (*this)[size_] = Node();
+    return size_++;
+  }
+
+  Node& operator[](uint32_t idx)
+  {
+    return node_blocks_[idx / block_size_][idx % block_size_];
+  }
+
+  const Node& operator[](uint32_t idx) const
+  {
+    return node_blocks_[idx / block_size_][idx % block_size_];
+  }
+
+  float* state(uint32_t idx)
+  {
+    return &state_blocks_[idx / block_size_][(idx % block_size_) * state_dim_];
+  }
+
+  size_t size() const
+  {
+    return size_;
+  }
+
+  void clear()
+  {
+    size_ = 0;
+  }
+
+  // number of memory allocations so far (excluding the block lists)
+  size_t numAllocations() const
+  {
+    return node_blocks_.size() + state_blocks_.size();
+  }
+
+  size_t numBytes() const
+  {
+    return node_blocks_.size() * block_size_ * (sizeof(Node) + state_dim_ * sizeof(float));
+  }
+
+private:
+  size_t block_size_;
+  size_t state_dim_;
+  size_t size_;
+  std::vector<std::unique_ptr<Node[]>> node_blocks_;
+  std::vector<std::unique_ptr<float[]>> state_blocks_;
+};
+
+// Binary heap of node indices; the top is the node with the lowest fScore
+// (ties: highest gScore). Each node stores its position in heap_index, so that
+// its key can be decreased in place.
+template<typename Node>
+class NodeHeap
+{
+public:
+  NodeHeap(NodePool<Node>& pool)
+    : pool_(pool)
+  {
+  }
+
+  bool empty() const
+  {
+    return heap_.empty();
+  }
+
+  size_t size() const
+  {
+    return heap_.size();
+  }
+
+  uint32_t top() const
+  {
+    return heap_.front();
+  }
+
+  void push(uint32_t idx)
+  {
+    heap_.push_back(idx);
+    pool_[idx].heap_index = heap_.size() - 1;
+    siftUp(heap_.size() - 1);
+  }
+
+  void pop()
+  {
+    heap_.front() = heap_.back();
+    pool_[heap_.front()].heap_index = 0;
+    heap_.pop_back();
+    if (!heap_.empty()) {
+      siftDown(0);
+    }
+  }
+
+  // call after the fScore of a node in the heap was decreased
+  void decreaseKey(uint32_t idx)
+  {
+    siftUp(pool_[idx].heap_index);
+  }
+
+  void clear()
+  {
+    heap_.clear();
+  }
+
+private:
+  bool before(uint32_t a, uint32_t b) const
+  {
+    const Node& na = pool_[a];
+    const Node& nb = pool_[b];
+    if (na.fScore != nb.fScore) {
+      return na.fScore < nb.fScore;
+    }
+    return na.gScore > nb.gScore;
+  }
+
+  void siftUp(size_t pos)
+  {
+    const uint32_t idx = heap_[pos];
+    while (pos > 0) {
+      const size_t parent = (pos - 1) / 2;
+      if (!before(idx, heap_[parent])) {
+        break;
+      }
+      heap_[pos] = heap_[parent];
+      pool_[heap_[pos]].heap_index = pos;
+      pos = parent;
+    }
+    heap_[pos] = idx;
+    pool_[idx].heap_index = pos;
+  }
+
+  void siftDown(size_t pos)
+  {
+    const uint32_t idx = heap_[pos];
+    while (true) {
+      size_t child = 2 * pos + 1;
+      if (child >= heap_.size()) {
+        break;
+      }
+      if (child + 1 < heap_.size() && before(heap_[child + 1], heap_[child])) {
+        ++child;
+      }
+      if (!before(heap_[child], idx)) {
+        break;
+      }
+      heap_[pos] = heap_[child];
+      pool_[heap_[pos]].heap_index = pos;
+      pos = child;
+    }
+    heap_[pos] = idx;
+    pool_[idx].heap_index = pos;
+  }
+
+private:
+  NodePool<Node>& pool_;
+  std::vector<uint32_t> heap_;
+};
@@ -3,6 +3,10 @@
 #include <pybind11/stl_bind.h>
 #include <pybind11/numpy.h>
 #include <pybind11/eigen.h>
+#include <pybind11/functional.h>
+
+#include <mutex>
+#include <optional>
 
 // FCL
 #include <fcl/fcl.h>
@@ -18,6 +22,8 @@
 // local
 #include "robots.h"
 #include "robotStatePropagator.hpp"
+#include "dbastar.h"
+#include "signedDistanceField.hpp"
 
 namespace py = pybind11;
 using namespace pybind11::literals;
@@ -25,6 +31,8 @@ using namespace pybind11::literals;
 namespace ob = ompl::base;
 namespace oc = ompl::control;
 
+typedef py::array_t<double, py::array::c_style | py::array::forcecast> ArrayD;
+
 class RobotHelper
 {
 public:
@@ -133,6 +141,124 @@ public:
     return robot_->is2D();
   }
 
+  // Batch versions of step, distance, and interpolate: states and actions are
+  // given as (row-major) arrays, which are used without copying if they are
+  // already C-contiguous doubles. The GIL is released during the computation,
+  // so each call uses its own OMPL states and control (see Buffers) rather than
+  // the ones shared with the scalar methods.
+
+  // states (T+1 x state dimension) from x0 by applying each row of actions
+  // (T x control dimension) for duration
+  ArrayD rollout(const ArrayD& x0, const ArrayD& actions, double duration)
+  {
+    const size_t state_dim = checkStates(x0, 1, "x0", true);
+    const size_t num_actions = checkActions(actions, "actions");
+    ArrayD states({num_actions + 1, state_dim});
+    double* states_data = states.mutable_data();
+    std::copy(x0.data(), x0.data() + state_dim, states_data);
+    {
+      py::gil_scoped_release release;
+      Buffers buffers(robot_->getSpaceInformation());
+      for (size_t t = 0; t < num_actions; ++t) {
+        stepReals(buffers, states_data + t * state_dim, actions.data(t, 0), duration, states_data + (t + 1) * state_dim);
+      }
+    }
+    return states;
+  }
+
+  // step() for each row of states (N x state dimension) and actions (N x control dimension)
+  ArrayD stepBatch(const ArrayD& states, const ArrayD& actions, double duration)
+  {
+    const size_t num_states = checkActions(actions, "actions");
+    const size_t state_dim = checkStates(states, num_states, "states");
+    ArrayD next_states({num_states, state_dim});
+    double* next_states_data = next_states.mutable_data();
+    {
+      py::gil_scoped_release release;
+      Buffers buffers(robot_->getSpaceInformation());
+      for (size_t i = 0; i < num_states; ++i) {
+        stepReals(buffers, states.data(i, 0), actions.data(i, 0), duration, next_states_data + i * state_dim);
+      }
+    }
+    return next_states;
+  }
+
+  // distance() for each pair of rows of statesA and statesB (N x state dimension)
+  ArrayD distanceBatch(const ArrayD& statesA, const ArrayD& statesB)
+  {
+    const size_t num_states = statesA.ndim() == 2 ? statesA.shape(0) : 0;
+    checkStates(statesA, num_states, "statesA");
+    checkStates(statesB, num_states, "statesB");
+    ArrayD distances(num_states);
+    double* distances_data = distances.mutable_data();
+    {
+      py::gil_scoped_release release;
+      auto si = robot_->getSpaceInformation();
+      Buffers buffers(si);
+      for (size_t i = 0; i < num_states; ++i) {
+        fromReals(statesA.data(i, 0), buffers.state_a);
+        fromReals(statesB.data(i, 0), buffers.state_b);
+        distances_data[i] = si->distance(buffers.state_a, buffers.state_b);
+      }
+    }
+    return distances;
+  }
+
+  // interpolate() for each pair of rows of statesFrom and statesTo (N x state
+  // dimension), where t has N elements (or a single one for all rows)
+  ArrayD interpolateBatch(const ArrayD& statesFrom, const ArrayD& statesTo, const ArrayD& t)
+  {
+    const size_t num_states = statesFrom.ndim() == 2 ? statesFrom.shape(0) : 0;
+    const size_t state_dim = checkStates(statesFrom, num_states, "statesFrom");
+    checkStates(statesTo, num_states, "statesTo");
+    if (t.size() != 1 && (size_t)t.size() != num_states) {
+      throw std::runtime_error("t needs to have one element or one per state!");
+    }
+    ArrayD states({num_states, state_dim});
+    double* states_data = states.mutable_data();
+    {
+      py::gil_scoped_release release;
+      auto space = robot_->getSpaceInformation()->getStateSpace();
+      Buffers buffers(robot_->getSpaceInformation());
+      for (size_t i = 0; i < num_states; ++i) {
+        fromReals(statesFrom.data(i, 0), buffers.state_a);
+        fromReals(statesTo.data(i, 0), buffers.state_b);
+        space->interpolate(buffers.state_a, buffers.state_b, t.data()[t.size() == 1 ? 0 : i], buffers.state_a);
+        toReals(buffers.state_a, states_data + i * state_dim);
+      }
+    }
+    return states;
+  }
+
+  // axis-aligned bounding box (min and max) of all robot parts over all states (T x state dimension)
+  std::vector<float> motionAABB(const ArrayD& states)
+  {
+    auto si = robot_->getSpaceInformation();
+    const size_t dim = si->getStateSpace()->getValueLocations().size();
+    if (states.ndim() != 2 || (size_t)states.shape(1) != dim || states.shape(0) == 0) {
+      throw std::runtime_error("states need to have shape (T, state dimension)!");
+    }
+    fcl::AABBf aabb;
+    std::vector<double> reals(dim);
+    for (size_t k = 0; k < (size_t)states.shape(0); ++k) {
+      std::copy(states.data(k, 0), states.data(k, 0) + dim, reals.begin());
+      si->getStateSpace()->copyFromReals(tmp_state_a_, reals);
+      for (size_t part = 0; part < robot_->numParts(); ++part) {
+        const auto &transform = robot_->getTransform(tmp_state_a_, part);
+        fcl::CollisionObjectf co(robot_->getCollisionGeometry(part));
+        co.setTranslation(transform.translation());
+        co.setRotation(transform.rotation());
+        co.computeAABB();
+        if (k == 0 && part == 0) {
+          aabb = co.getAABB();
+        } else {
+          aabb += co.getAABB();
+        }
+      }
+    }
+    return {aabb.min_[0], aabb.min_[1], aabb.min_[2], aabb.max_[0], aabb.max_[1], aabb.max_[2]};
+  }
+
   std::vector<size_t> sortMotions(
     const std::vector<std::vector<double>> &x0s,
     const std::vector<std::vector<double>> &xfs,
@@ -235,7 +361,88 @@ public:
     return used_motions;
   }
 
-private: 
+private:
+  // copy reals (as in copyFromReals) to a state without allocating
+  void fromReals(const double* reals, ob::State* state) const
+  {
+    auto space = robot_->getSpaceInformation()->getStateSpace();
+    const auto& locations = space->getValueLocations();
+    for (size_t i = 0; i < locations.size(); ++i) {
+      *space->getValueAddressAtLocation(state, locations[i]) = reals[i];
+    }
+  }
+
+  void toReals(const ob::State* state, double* reals) const
+  {
+    auto space = robot_->getSpaceInformation()->getStateSpace();
+    const auto& locations = space->getValueLocations();
+    for (size_t i = 0; i < locations.size(); ++i) {
+      reals[i] = *space->getValueAddressAtLocation(state, locations[i]);
+    }
+  }
+
+  // OMPL states and control used by a single (batch) call
+  struct Buffers
+  {
+    Buffers(const std::shared_ptr<oc::SpaceInformation>& si)
+      : si(si)
+      , state_a(si->allocState())
+      , state_b(si->allocState())
+      , control(si->allocControl())
+    {
+    }
+
+    ~Buffers()
+    {
+      si->freeState(state_a);
+      si->freeState(state_b);
+      si->freeControl(control);
+    }
+
+    Buffers(const Buffers&) = delete;
+    Buffers& operator=(const Buffers&) = delete;
+
+    std::shared_ptr<oc::SpaceInformation> si;
+    ob::State* state_a;
+    ob::State* state_b;
+    oc::Control* control;
+  };
+
+  void stepReals(Buffers& buffers, const double* state, const double* action, double duration, double* next_state)
+  {
+    auto si = robot_->getSpaceInformation();
+    fromReals(state, buffers.state_a);
+    const size_t dim = si->getControlSpace()->getDimension();
+    for (size_t d = 0; d < dim; ++d) {
+      *si->getControlSpace()->getValueAddressAtIndex(buffers.control, d) = action[d];
+    }
+    robot_->propagate(buffers.state_a, buffers.control, duration, buffers.state_b);
+    toReals(buffers.state_b, next_state);
+  }
+
+  // checks that states has shape (num_states, state dimension), or, if
+  // allow_single, (state dimension) for a single state; returns the state dimension
+  size_t checkStates(const ArrayD& states, size_t num_states, const std::string& name, bool allow_single = false) const
+  {
+    const size_t dim = robot_->getSpaceInformation()->getStateSpace()->getValueLocations().size();
+    const bool single = allow_single && states.ndim() == 1 && num_states == 1 && (size_t)states.shape(0) == dim;
+    if (!single && (states.ndim() != 2 || (size_t)states.shape(0) != num_states || (size_t)states.shape(1) != dim)) {
+      throw std::runtime_error(name + " need to have shape (" + std::to_string(num_states) + ", state dimension)!");
+    }
+    return dim;
+  }
+
+  // checks that actions has shape (N, control dimension); returns N
+  size_t checkActions(const ArrayD& actions, const std::string& name) const
+  {
+    const size_t dim = robot_->getSpaceInformation()->getControlSpace()->getDimension();
+    if (actions.ndim() != 2 || (size_t)actions.shape(1) != dim) {
+      throw std::runtime_error(name + " need to have shape (N, control dimension)!");
+    }
+    return actions.shape(0);
+  }
+
+private:
   std::shared_ptr<Robot> robot_;
   ob::StateSamplerPtr state_sampler_;
   oc::ControlSamplerPtr control_sampler_;
@@ -248,24 +455,16 @@ class CollisionChecker
 {
 public:
   CollisionChecker()
-    : tmp_state_(nullptr)
+    : sdf_margin_(0)
   {
 
   }
 
-  ~CollisionChecker()
-  {
-    if (robot_ && tmp_state_) {
-      auto si = robot_->getSpaceInformation();
-      si->freeState(tmp_state_);
-    }
-  }
-
   void load(const std::string& filename)
   {
-    if (robot_ && tmp_state_) {
-      auto si = robot_->getSpaceInformation();
-      si->freeState(tmp_state_);
+    {
+      std::lock_guard<std::mutex> lock(thread_pool_mutex_);
+      thread_pool_.reset();
     }
 
     YAML::Node env = YAML::LoadFile(filename);
@@ -289,6 +488,8 @@ public:
         throw std::runtime_error("Unknown obstacle type!");
       }
     }
+    obstacles_ = obstacles;
+    sdf_.reset();
     env_.reset(new fcl::DynamicAABBTreeCollisionManagerf());
     // std::shared_ptr<fcl::BroadPhaseCollisionManagerf> bpcm_env(new fcl::NaiveCollisionManagerf());
     env_->registerObjects(obstacles);
@@ -299,58 +500,301 @@ public:
     const auto &env_min = env["environment"]["min"];
     const auto &env_max = env["environment"]["max"];
     ob::RealVectorBounds position_bounds(env_min.size());
+    env_min_.setZero();
+    env_max_.setZero();
     for (size_t i = 0; i < env_min.size(); ++i) {
       position_bounds.setLow(i, env_min[i].as<double>());
       position_bounds.setHigh(i, env_max[i].as<double>());
+      env_min_[i] = env_min[i].as<float>();
+      env_max_[i] = env_max[i].as<float>();
     }
     robot_ = create_robot(robotType, position_bounds);
 
     auto si = robot_->getSpaceInformation();
     si->getStateSpace()->setup();
+  }
 
-    tmp_state_ = si->allocState();
+  // Use a signed distance field (see SdfCollisionChecker) for 2D robots:
+  // parts whose (conservative) distance bound exceeds margin report this
+  // bound; closer parts use the exact distance. A resolution <= 0 disables it.
+  void setSignedDistanceField(float resolution, float margin)
+  {
+    if (!robot_) {
+      throw std::runtime_error("Environment needs to be loaded before setting the signed distance field!");
+    }
+    sdf_.reset();
+    if (resolution > 0) {
+      sdf_.reset(new SdfCollisionChecker(robot_, obstacles_, env_min_, env_max_, resolution));
+    }
+    sdf_margin_ = margin;
   }
 
   auto distance(const std::vector<double>& state)
   {
+    auto si = robot_->getSpaceInformation();
+    Workspace workspace(robot_);
+    si->getStateSpace()->copyFromReals(workspace.state, state);
+
+    float dist;
+    fcl::Vector3f p_obstacle;
+    fcl::Vector3f p_robot;
+    computeDistance(workspace, dist, p_obstacle, p_robot);
+    return std::make_tuple(dist, p_obstacle, p_robot);
+  }
 
+  // distance() for each row of states (T x state dimension); returns the
+  // distances (T), and the nearest points (T x 3) as in distance(). The rows
+  // are split across num_threads threads. Each call uses its own workspaces;
+  // concurrent calls (from Python threads) take turns using the thread pool.
+  py::tuple distanceBatch(const ArrayD& states, size_t num_threads)
+  {
     auto si = robot_->getSpaceInformation();
-    si->getStateSpace()->copyFromReals(tmp_state_, state);
+    const auto& locations = si->getStateSpace()->getValueLocations();
+    if (states.ndim() != 2 || (size_t)states.shape(1) != locations.size()) {
+      throw std::runtime_error("states need to have shape (T, state dimension)!");
+    }
+    if (num_threads == 0) {
+      throw std::runtime_error("Need at least one thread!");
+    }
+    const size_t num_states = states.shape(0);
+    py::array_t<float> dist_np(num_states);
+    py::array_t<float> p_obstacle_np({num_states, (size_t)3});
+    py::array_t<float> p_robot_np({num_states, (size_t)3});
+    const double* states_data = states.data();
+    float* dist = dist_np.mutable_data();
+    float* p_obstacle = p_obstacle_np.mutable_data();
+    float* p_robot = p_robot_np.mutable_data();
+    {
+      py::gil_scoped_release release;
+      std::vector<std::unique_ptr<Workspace>> workspaces;
+      for (size_t thread = 0; thread < num_threads; ++thread) {
+        workspaces.emplace_back(new Workspace(robot_));
+      }
+      // parallelFor can't be re-entered
+      std::lock_guard<std::mutex> lock(thread_pool_mutex_);
+      if (!thread_pool_ || thread_pool_->size() != num_threads) {
+        thread_pool_.reset(new ThreadPool(num_threads));
+      }
+      thread_pool_->parallelFor(num_states, [&](size_t t, size_t thread) {
+        Workspace& workspace = *workspaces[thread];
+        for (size_t i = 0; i < locations.size(); ++i) {
+          *si->getStateSpace()->getValueAddressAtLocation(workspace.state, locations[i]) = states_data[t * locations.size() + i];
+        }
+        fcl::Vector3f p_o;
+        fcl::Vector3f p_r;
+        computeDistance(workspace, dist[t], p_o, p_r);
+        std::copy(p_o.data(), p_o.data() + 3, p_obstacle + 3 * t);
+        std::copy(p_r.data(), p_r.data() + 3, p_robot + 3 * t);
+      });
+    }
+    return py::make_tuple(dist_np, p_obstacle_np, p_robot_np);
+  }
 
-    std::vector<fcl::DefaultDistanceData<float>> distance_data(robot_->numParts());
-    size_t min_idx = 0;
-    for (size_t part = 0; part < robot_->numParts(); ++part) {
-      const auto &transform = robot_->getTransform(tmp_state_, part);
-      fcl::CollisionObjectf robot(robot_->getCollisionGeometry(part)); //, robot_->getTransform(state));
-      robot.setTranslation(transform.translation());
-      robot.setRotation(transform.rotation());
-      robot.computeAABB();
-      distance_data[part].request.enable_signed_distance = true;
-      env_->distance(&robot, &distance_data[part], fcl::DefaultDistanceFunction<float>);
-      if (distance_data[part].result.min_distance < distance_data[min_idx].result.min_distance) {
-        min_idx = part;
+private:
+  // state and collision objects (one per part) used by one thread of a call
+  struct Workspace
+  {
+    Workspace(const std::shared_ptr<Robot>& robot)
+      : robot(robot)
+      , state(robot->getSpaceInformation()->allocState())
+    {
+      for (size_t part = 0; part < robot->numParts(); ++part) {
+        parts.emplace_back(new fcl::CollisionObjectf(robot->getCollisionGeometry(part)));
       }
     }
 
-    return std::make_tuple(
-      distance_data[min_idx].result.min_distance,
-      distance_data[min_idx].result.nearest_points[0],
-      distance_data[min_idx].result.nearest_points[1]);
+    ~Workspace()
+    {
+      robot->getSpaceInformation()->freeState(state);
+    }
+
+    Workspace(const Workspace&) = delete;
+    Workspace& operator=(const Workspace&) = delete;
+
+    std::shared_ptr<Robot> robot;
+    ob::State* state;
+    std::vector<std::unique_ptr<fcl::CollisionObjectf>> parts;
+  };
+
+  // signed distance of the robot at workspace.state to the obstacles, and the
+  // nearest points on the obstacle and on the robot
+  void computeDistance(Workspace& workspace, float& dist, fcl::Vector3f& p_obstacle, fcl::Vector3f& p_robot) const
+  {
+    dist = std::numeric_limits<float>::infinity();
+    for (size_t part = 0; part < robot_->numParts(); ++part) {
+      const auto &transform = robot_->getTransform(workspace.state, part);
+      if (sdf_) {
+        fcl::Vector3f p_o;
+        fcl::Vector3f p_r;
+        const float bound = sdf_->distanceBound(transform, part, p_o, p_r);
+        if (bound > sdf_margin_) {
+          if (bound < dist) {
+            dist = bound;
+            p_obstacle = p_o;
+            p_robot = p_r;
+          }
+          continue;
+        }
+      }
+      fcl::CollisionObjectf* robot = workspace.parts[part].get();
+      robot->setTranslation(transform.translation());
+      robot->setRotation(transform.rotation());
+      robot->computeAABB();
+      fcl::DefaultDistanceData<float> distance_data;
+      distance_data.request.enable_signed_distance = true;
+      env_->distance(robot, &distance_data, fcl::DefaultDistanceFunction<float>);
+      if (distance_data.result.min_distance < dist) {
+        dist = distance_data.result.min_distance;
+        p_obstacle = distance_data.result.nearest_points[0];
+        p_robot = distance_data.result.nearest_points[1];
+      }
+    }
   }
 
 private:
   std::shared_ptr<fcl::CollisionGeometryf> geom_;
   std::shared_ptr<fcl::BroadPhaseCollisionManagerf> env_;
   std::shared_ptr<Robot> robot_;
-  ob::State *tmp_state_;
+  std::unique_ptr<ThreadPool> thread_pool_;
+  std::mutex thread_pool_mutex_;
+  std::vector<fcl::CollisionObjectf *> obstacles_;
+  fcl::Vector3f env_min_;
+  fcl::Vector3f env_max_;
+  std::shared_ptr<SdfCollisionChecker> sdf_;
+  float sdf_margin_;
 };
 
+typedef py::array_t<float, py::array::c_style | py::array::forcecast> ArrayF;
+
+size_t dbastarAddMotions(
+  DBAstar& dbastar,
+  const std::vector<ArrayD>& states,
+  const std::vector<ArrayD>& actions,
+  const std::optional<ArrayF>& aabbs)
+{
+  if (states.size() != actions.size()) {
+    throw std::runtime_error("Need the same number of states and actions arrays!");
+  }
+  if (aabbs && (aabbs->ndim() != 2 || (size_t)aabbs->shape(0) != states.size() || aabbs->shape(1) != 6)) {
+    throw std::runtime_error("aabbs need to have shape (number of motions, 6)!");
+  }
+  std::vector<MotionView> views(states.size());
+  for (size_t i = 0; i < states.size(); ++i) {
+    if (states[i].ndim() != 2 || (size_t)states[i].shape(1) != dbastar.stateDim()) {
+      throw std::runtime_error("states need to have shape (T+1, state dimension)!");
+    }
+    if (actions[i].ndim() != 2 || (size_t)actions[i].shape(1) != dbastar.controlDim()
+        || actions[i].shape(0) + 1 != states[i].shape(0)) {
+      throw std::runtime_error("actions need to have shape (T, control dimension)!");
+    }
+    views[i].states = states[i].data();
+    views[i].num_states = states[i].shape(0);
+    views[i].actions = actions[i].data();
+    views[i].num_actions = actions[i].shape(0);
+    views[i].aabb = aabbs ? aabbs->data(i, 0) : nullptr;
+  }
+  // the arrays are kept alive by the caller
+  py::gil_scoped_release release;
+  return dbastar.addMotions(views);
+}
+
+typedef py::array_t<uint64_t, py::array::c_style | py::array::forcecast> ArrayU64;
+
+// motions given as contiguous blocks (e.g., a range of a motion library):
+// motion i consists of states[state_offsets[i]:state_offsets[i+1]] and
+// actions[action_offsets[i]:action_offsets[i+1]]
+size_t dbastarAddMotionsFlat(
+  DBAstar& dbastar,
+  const ArrayD& states,
+  const ArrayU64& state_offsets,
+  const ArrayD& actions,
+  const ArrayU64& action_offsets,
+  const std::optional<ArrayF>& aabbs)
+{
+  if (states.ndim() != 2 || (size_t)states.shape(1) != dbastar.stateDim()) {
+    throw std::runtime_error("states need to have shape (number of states, state dimension)!");
+  }
+  if (actions.ndim() != 2 || (size_t)actions.shape(1) != dbastar.controlDim()) {
+    throw std::runtime_error("actions need to have shape (number of actions, control dimension)!");
+  }
+  if (state_offsets.ndim() != 1 || action_offsets.ndim() != 1
+      || state_offsets.shape(0) != action_offsets.shape(0) || state_offsets.shape(0) < 1) {
+    throw std::runtime_error("Need the same number of state and action offsets (number of motions + 1)!");
+  }
+  const size_t num_motions = state_offsets.shape(0) - 1;
+  if (aabbs && (aabbs->ndim() != 2 || (size_t)aabbs->shape(0) != num_motions || aabbs->shape(1) != 6)) {
+    throw std::runtime_error("aabbs need to have shape (number of motions, 6)!");
+  }
+  std::vector<MotionView> views(num_motions);
+  for (size_t i = 0; i < num_motions; ++i) {
+    const uint64_t s0 = state_offsets.at(i), s1 = state_offsets.at(i + 1);
+    const uint64_t a0 = action_offsets.at(i), a1 = action_offsets.at(i + 1);
+    if (s1 > (uint64_t)states.shape(0) || a1 > (uint64_t)actions.shape(0)
+        || a0 > a1 || s1 != s0 + (a1 - a0) + 1) {
+      throw std::runtime_error("Invalid offsets of motion " + std::to_string(i) + "!");
+    }
+    views[i].states = states.data(s0, 0);
+    views[i].num_states = s1 - s0;
+    views[i].actions = actions.data() + a0 * actions.shape(1);
+    views[i].num_actions = a1 - a0;
+    views[i].aabb = aabbs ? aabbs->data(i, 0) : nullptr;
+  }
+  // the arrays are kept alive by the caller
+  py::gil_scoped_release release;
+  return dbastar.addMotions(views);
+}
+
+// (start, goal) of the current query
+py::tuple dbastarGetStartGoal(const DBAstar& dbastar)
+{
+  std::vector<double> start;
+  std::vector<double> goal;
+  dbastar.getStartGoal(start, goal);
+  ArrayD start_np(start.size(), start.data());
+  ArrayD goal_np(goal.size(), goal.data());
+  return py::make_tuple(start_np, goal_np);
+}
+
+py::dict dbastarGetSolution(DBAstar& dbastar)
+{
+  std::vector<double> states;
+  std::vector<double> actions;
+  std::map<size_t, size_t> motion_stats;
+  dbastar.getSolution(states, actions, motion_stats);
+
+  const size_t state_dim = dbastar.stateDim();
+  const size_t control_dim = dbastar.controlDim();
+  ArrayD states_np({states.size() / state_dim, state_dim});
+  std::copy(states.begin(), states.end(), states_np.mutable_data());
+  ArrayD actions_np({actions.size() / control_dim, control_dim});
+  std::copy(actions.begin(), actions.end(), actions_np.mutable_data());
+  // rows of (motion idx, usage count)
+  py::array_t<size_t> motion_stats_np({motion_stats.size(), (size_t)2});
+  auto stats = motion_stats_np.mutable_unchecked<2>();
+  size_t row = 0;
+  for (const auto& kv : motion_stats) {
+    stats(row, 0) = kv.first;
+    stats(row, 1) = kv.second;
+    ++row;
+  }
+
+  return py::dict(
+    "states"_a = states_np,
+    "actions"_a = actions_np,
+    "motion_stats"_a = motion_stats_np,
+    "cost"_a = dbastar.cost(),
+    "delta"_a = dbastar.delta(),
+    "exact"_a = dbastar.isExactSolution());
+}
+
 PYBIND11_MODULE(motionplanningutils, m)
 {
   pybind11::class_<CollisionChecker>(m, "CollisionChecker")
       .def(pybind11::init())
       .def("load", &CollisionChecker::load)
-      .def("distance", &CollisionChecker::distance);
+      .def("distance", &CollisionChecker::distance)
+      .def("distance_batch", &CollisionChecker::distanceBatch, py::arg("states"), py::arg("num_threads") = 1)
+      .def("setSignedDistanceField", &CollisionChecker::setSignedDistanceField, py::arg("resolution"), py::arg("margin") = 0.1);
 
   pybind11::class_<RobotHelper>(m, "RobotHelper")
       .def(pybind11::init<const std::string &, float>(), py::arg("robot_type"), py::arg("pos_limit") = 2)
@@ -359,6 +803,63 @@ PYBIND11_MODULE(motionplanningutils, m)
       .def("sampleControlUniform", &RobotHelper::sampleControlUniform)
       .def("step", &RobotHelper::step)
       .def("interpolate", &RobotHelper::interpolate)
+      .def("rollout", &RobotHelper::rollout, py::arg("x0"), py::arg("actions"), py::arg("duration"))
+      .def("step_batch", &RobotHelper::stepBatch, py::arg("states"), py::arg("actions"), py::arg("duration"))
+      .def("distance_batch", &RobotHelper::distanceBatch, py::arg("statesA"), py::arg("statesB"))
+      .def("interpolate_batch", &RobotHelper::interpolateBatch, py::arg("statesFrom"), py::arg("statesTo"), py::arg("t"))
       .def("is2D", &RobotHelper::is2D)
+      .def("motionAABB", &RobotHelper::motionAABB)
       .def("sortMotions", &RobotHelper::sortMotions);
+
+  pybind11::class_<DBAstar>(m, "DBAstar")
+      .def(pybind11::init())
+      .def("loadEnvironment", &DBAstar::loadEnvironment)
+      .def("setStartGoal", &DBAstar::setStartGoal, py::arg("start"), py::arg("goal"))
+      .def("getStartGoal", &dbastarGetStartGoal)
+      .def("addMotionsFromFile", py::overload_cast<const std::string &>(&DBAstar::addMotions))
+      .def("addMotions", &dbastarAddMotions, py::arg("states"), py::arg("actions"), py::arg("aabbs") = py::none())
+      .def("addMotionsFlat", &dbastarAddMotionsFlat,
+           py::arg("states"),
+           py::arg("state_offsets"),
+           py::arg("actions"),
+           py::arg("action_offsets"),
+           py::arg("aabbs") = py::none())
+      .def("plan", &DBAstar::plan,
+           py::arg("delta"),
+           py::arg("epsilon") = 1.0,
+           py::arg("alpha") = 0.5,
+           py::arg("filter_duplicates") = true,
+           py::arg("max_cost") = std::numeric_limits<float>::infinity(),
+           py::call_guard<py::gil_scoped_release>())
+      .def("planAnytime", &DBAstar::planAnytime,
+           py::arg("delta"),
+           py::arg("epsilon"),
+           py::arg("alpha") = 0.5,
+           py::arg("filter_duplicates") = true,
+           py::arg("max_cost") = std::numeric_limits<float>::infinity(),
+           py::arg("final_epsilon") = 1.0,
+           py::arg("epsilon_step") = 0.5,
+           py::arg("on_solution") = py::none(),
+           py::call_guard<py::gil_scoped_release>())
+      .def("tightenMaxCost", &DBAstar::tightenMaxCost)
+      .def("requestStop", &DBAstar::requestStop)
+      .def("setGridHeuristic", &DBAstar::setGridHeuristic, py::arg("resolution"), py::arg("cache_directory") = "")
+      .def("setNumThreads", &DBAstar::setNumThreads)
+      .def("numThreads", &DBAstar::numThreads)
+      .def("setLazy", &DBAstar::setLazy)
+      .def("setNearestNeighbors", &DBAstar::setNearestNeighbors)
+      .def("nearestNeighbors", &DBAstar::nearestNeighbors)
+      .def("setApplicabilityTable", &DBAstar::setApplicabilityTable)
+      .def("applicabilityTable", &DBAstar::applicabilityTable)
+      .def("setSignedDistanceField", &DBAstar::setSignedDistanceField)
+      .def("setCollisionCache", &DBAstar::setCollisionCache, py::arg("resolution"), py::arg("capacity") = 100000)
+      .def("collisionCacheHits", &DBAstar::collisionCacheHits)
+      .def("collisionCacheMisses", &DBAstar::collisionCacheMisses)
+      .def("lazy", &DBAstar::lazy)
+      .def("writeResult", &DBAstar::writeResult, py::call_guard<py::gil_scoped_release>())
+      .def("getSolution", &dbastarGetSolution)
+      .def("numMotions", &DBAstar::numMotions)
+      .def("delta", &DBAstar::delta)
+      .def("cost", &DBAstar::cost)
+      .def("isExactSolution", &DBAstar::isExactSolution);
 }
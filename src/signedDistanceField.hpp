@@ -0,0 +1,251 @@
+#pragma once
+
+// Fast path for collision checks of 2D robots against axis-aligned box
+// obstacles: a precomputed signed distance field (SDF) of the obstacles is
+// interpolated at the centers of circles that cover each part of the robot.
+// Only parts that are neither clearly free nor clearly in collision need an
+// exact check with FCL.
+
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <memory>
+#include <stdexcept>
+#include <vector>
+
+#include <fcl/fcl.h>
+
+#include "robots.h"
+
+// Signed distance (negative inside) to the union of axis-aligned boxes in the
+// plane, sampled on a grid and bilinearly interpolated. Points outside of the
+// grid use the exact distance.
+class SignedDistanceField2D
+{
+public:
+  // boxes are given by their AABB (z is ignored); the grid covers [min, max]
+  SignedDistanceField2D(
+    const std::vector<fcl::AABBf>& boxes,
+    const fcl::Vector3f& min,
+    const fcl::Vector3f& max,
+    float resolution)
+    : boxes_(boxes)
+    , min_(min)
+    , resolution_(resolution)
+  {
+    if (resolution <= 0) {
+      throw std::runtime_error("Resolution of the signed distance field needs to be positive!");
+    }
+    num_x_ = std::ceil((max.x() - min.x()) / resolution) + 1;
+    num_y_ = std::ceil((max.y() - min.y()) / resolution) + 1;
+    values_.resize(num_x_ * num_y_);
+    for (size_t iy = 0; iy < num_y_; ++iy) {
+      for (size_t ix = 0; ix < num_x_; ++ix) {
+        values_[iy * num_x_ + ix] = exactDistance(min_.x() + ix * resolution_, min_.y() + iy * resolution_);
+      }
+    }
+  }
+
+  float resolution() const
+  {
+    return resolution_;
+  }
+
+  // upper bound of the difference between the interpolated and the exact
+  // distance (the distance is 1-Lipschitz)
+  float maxError() const
+  {
+    return resolution_;
+  }
+
+  // interpolated distance at p (z is ignored); optionally the gradient
+  // (pointing away from the obstacles, not normalized)
+  float distance(const fcl::Vector3f& p, fcl::Vector3f* gradient = nullptr) const
+  {
+    const float x = (p.x() - min_.x()) / resolution_;
+    const float y = (p.y() - min_.y()) / resolution_;
+    if (!(x >= 0 && y >= 0 && x < num_x_ - 1 && y < num_y_ - 1)) {
+      return exactDistance(p, gradient);
+    }
+    const size_t ix = x;
+    const size_t iy = y;
+    const float fx = x - ix;
+    const float fy = y - iy;
+    const float v00 = values_[iy * num_x_ + ix];
+    const float v10 = values_[iy * num_x_ + ix + 1];
+    const float v01 = values_[(iy + 1) * num_x_ + ix];
+    const float v11 = values_[(iy + 1) * num_x_ + ix + 1];
+    if (gradient) {
+      gradient->x() = ((v10 - v00) * (1 - fy) + (v11 - v01) * fy) / resolution_;
+      gradient->y() = ((v01 - v00) * (1 - fx) + (v11 - v10) * fx) / resolution_;
+      gradient->z() = 0;
+    }
+    return (v00 * (1 - fx) + v10 * fx) * (1 - fy) + (v01 * (1 - fx) + v11 * fx) * fy;
+  }
+
+  // exact distance at p (z is ignored); optionally the gradient
+  float exactDistance(const fcl::Vector3f& p, fcl::Vector3f* gradient = nullptr) const
+  {
+    const float dist = exactDistance(p.x(), p.y());
+    if (gradient) {
+      const float eps = 1e-3;
+      gradient->x() = (exactDistance(p.x() + eps, p.y()) - exactDistance(p.x() - eps, p.y())) / (2 * eps);
+      gradient->y() = (exactDistance(p.x(), p.y() + eps) - exactDistance(p.x(), p.y() - eps)) / (2 * eps);
+      gradient->z() = 0;
+    }
+    return dist;
+  }
+
+private:
+  float exactDistance(float x, float y) const
+  {
+    float dist = std::numeric_limits<float>::infinity();
+    for (const auto& box : boxes_) {
+      // positive outside of the box along each axis
+      const float dx = std::max(box.min_.x() - x, x - box.max_.x());
+      const float dy = std::max(box.min_.y() - y, y - box.max_.y());
+      if (dx > 0 || dy > 0) {
+        dist = std::min(dist, std::hypot(std::max(dx, 0.0f), std::max(dy, 0.0f)));
+      } else {
+        dist = std::min(dist, std::max(dx, dy));
+      }
+    }
+    return dist;
+  }
+
+private:
+  std::vector<fcl::AABBf> boxes_;
+  fcl::Vector3f min_;
+  float resolution_;
+  size_t num_x_;
+  size_t num_y_;
+  std::vector<float> values_; // row-major (y, x)
+};
+
+// circle (in the frame of a robot part) that is part of a cover of the part
+struct CoverCircle
+{
+  fcl::Vector3f center;
+  float radius;
+};
+
+// Circles whose union contains the given (2D) box: the box is split along its
+// longer side into pieces that are at most half as long as the shorter side,
+// and each piece is covered by its circumcircle. The centers lie inside the box.
+inline std::vector<CoverCircle> circleCover(const fcl::Boxf& box)
+{
+  const bool along_x = box.side.x() >= box.side.y();
+  const float length = along_x ? box.side.x() : box.side.y();
+  const float width = along_x ? box.side.y() : box.side.x();
+  const size_t num = std::max<size_t>(1, std::ceil(2 * length / width));
+  const float piece = length / num;
+  std::vector<CoverCircle> circles;
+  for (size_t i = 0; i < num; ++i) {
+    CoverCircle c;
+    const float pos = -length / 2 + (i + 0.5f) * piece;
+    c.center = along_x ? fcl::Vector3f(pos, 0, 0) : fcl::Vector3f(0, pos, 0);
+    c.radius = 0.5f * std::hypot(piece, width);
+    circles.push_back(c);
+  }
+  return circles;
+}
+
+// Collision checks of the parts of a 2D robot (boxes) against box obstacles,
+// using the signed distance field at the centers of the cover circles: a part
+// is free if all circles are clear of the obstacles, and in collision if
+// a center (which lies inside the part) is inside an obstacle, both with a
+// margin for the interpolation error. Otherwise, the result is unknown and
+// the caller checks the part with FCL.
+class SdfCollisionChecker
+{
+public:
+  enum Result
+  {
+    FREE,
+    COLLISION,
+    UNKNOWN,
+  };
+
+  // obstacles need to be (unrotated) boxes; the field covers [env_min, env_max]
+  // enlarged by the size of the robot
+  SdfCollisionChecker(
+    std::shared_ptr<Robot> robot,
+    const std::vector<fcl::CollisionObjectf*>& obstacles,
+    const fcl::Vector3f& env_min,
+    const fcl::Vector3f& env_max,
+    float resolution)
+  {
+    if (!robot->is2D()) {
+      throw std::runtime_error("The signed distance field requires a 2D robot!");
+    }
+    float max_radius = 0;
+    for (size_t part = 0; part < robot->numParts(); ++part) {
+      const auto geom = robot->getCollisionGeometry(part);
+      if (geom->getNodeType() != fcl::GEOM_BOX) {
+        throw std::runtime_error("The signed distance field requires box-shaped robots!");
+      }
+      circles_.push_back(circleCover(static_cast<const fcl::Boxf&>(*geom)));
+      max_radius = std::max(max_radius, static_cast<const fcl::Boxf&>(*geom).side.head(2).norm());
+    }
+    std::vector<fcl::AABBf> boxes;
+    for (const auto co : obstacles) {
+      if (co->collisionGeometry()->getNodeType() != fcl::GEOM_BOX || !co->getRotation().isIdentity()) {
+        throw std::runtime_error("The signed distance field requires axis-aligned box obstacles!");
+      }
+      boxes.push_back(co->getAABB());
+    }
+    const fcl::Vector3f margin(max_radius, max_radius, 0);
+    field_.reset(new SignedDistanceField2D(boxes, env_min - margin, env_max + margin, resolution));
+  }
+
+  const SignedDistanceField2D& field() const
+  {
+    return *field_;
+  }
+
+  // classify the given part placed at transform
+  Result classify(const fcl::Transform3f& transform, size_t part) const
+  {
+    const float error = field_->maxError();
+    bool free = true;
+    for (const auto& c : circles_[part]) {
+      const float dist = field_->distance(transform * c.center);
+      if (dist + error < 0) {
+        return COLLISION;
+      }
+      free &= dist - error > c.radius;
+    }
+    return free ? FREE : UNKNOWN;
+  }
+
+  // lower bound of the distance of the given part (placed at transform) to
+  // the obstacles, and the corresponding points on the obstacle and the cover
+  // of the part
+  float distanceBound(
+    const fcl::Transform3f& transform,
+    size_t part,
+    fcl::Vector3f& p_obstacle,
+    fcl::Vector3f& p_robot) const
+  {
+    float bound = std::numeric_limits<float>::infinity();
+    for (const auto& c : circles_[part]) {
+      const fcl::Vector3f center = transform * c.center;
+      fcl::Vector3f gradient;
+      const float dist = field_->distance(center, &gradient);
+      const float d = dist - field_->maxError() - c.radius;
+      if (d < bound) {
+        bound = d;
+        const float norm = gradient.norm();
+        const fcl::Vector3f dir = norm > 0 ? fcl::Vector3f(gradient / norm) : fcl::Vector3f(0, 0, 0);
+        p_robot = center - c.radius * dir;
+        p_obstacle = center - dist * dir;
+      }
+    }
+    return bound;
+  }
+
+private:
+  std::unique_ptr<SignedDistanceField2D> field_;
+  // cover of each part
+  std::vector<std::vector<CoverCircle>> circles_;
+};
@@ -0,0 +1,188 @@
+#pragma once
+
+// Grid over a few coordinates of states stored as floats (see
+// FlatStateSpace). Cells have a size such that states whose cells are more
+// than m rings apart have a distance larger than m * resolution, since the
+// distance is bounded from below by the weighted difference of each hashed
+// coordinate (see FlatStateSpace::coordinateWeight).
+
+#include <algorithm>
+#include <array>
+#include <cmath>
+#include <stdexcept>
+#include <vector>
+
+#include "nodePool.hpp"
+
+class StateGrid
+{
+public:
+  static constexpr size_t MAX_DIMS = 4;
+
+  typedef std::array<int, MAX_DIMS> Key;
+
+  struct KeyHash
+  {
+    size_t operator()(const Key& key) const
+    {
+      size_t hash = 0;
+      for (int k : key) {
+        hash = hash * 1000003 + std::hash<int>()(k);
+      }
+      return hash;
+    }
+  };
+
+  // coordinates are the indices of the hashed coordinates (real vector or
+  // SO(2), at most MAX_DIMS)
+  StateGrid(
+    const FlatStateSpace& space,
+    const std::vector<size_t>& coordinates,
+    double resolution)
+  {
+    if (coordinates.size() > MAX_DIMS) {
+      throw std::runtime_error("Too many coordinates for the grid!");
+    }
+    for (size_t i : coordinates) {
+      Dim d;
+      d.coordinate = i;
+      d.weight = space.coordinateWeight(i);
+      d.is_angle = space.coordinateType(i) == ompl::base::STATE_SPACE_SO2;
+      if (space.coordinateType(i) != ompl::base::STATE_SPACE_REAL_VECTOR && !d.is_angle) {
+        throw std::runtime_error("Only real vector and SO(2) coordinates can be hashed!");
+      }
+      if (d.weight > 0) {
+        dims_.push_back(d);
+      }
+    }
+    setResolution(resolution);
+  }
+
+  // change the cell size (invalidates all keys)
+  void setResolution(double resolution)
+  {
+    resolution_ = resolution;
+    for (auto& d : dims_) {
+      // slightly larger, so that rounding errors can't hide neighbors
+      d.cell_size = resolution / d.weight * (1 + 1e-4);
+      if (d.is_angle) {
+        // the cells cover the circle, and are at least as large as requested
+        d.num_cells = std::max<int>(1, std::floor(2 * M_PI / d.cell_size));
+        d.cell_size = 2 * M_PI / d.num_cells;
+      }
+    }
+  }
+
+  double resolution() const
+  {
+    return resolution_;
+  }
+
+  Key key(const float* values) const
+  {
+    Key key;
+    key.fill(0);
+    for (size_t i = 0; i < dims_.size(); ++i) {
+      float value = values[dims_[i].coordinate];
+      if (dims_[i].is_angle) {
+        // wrap to [0, 2 pi)
+        value = value + M_PI - 2 * M_PI * std::floor((value + M_PI) / (2 * M_PI));
+        key[i] = std::min<int>(dims_[i].num_cells - 1, value / dims_[i].cell_size);
+      } else {
+        key[i] = std::floor(value / dims_[i].cell_size);
+      }
+    }
+    return key;
+  }
+
+  // number of different cells within the given number of rings
+  size_t numCells(int rings) const
+  {
+    size_t num = 1;
+    for (const auto& d : dims_) {
+      size_t n = 2 * rings + 1;
+      if (d.is_angle) {
+        n = std::min<size_t>(n, d.num_cells);
+      }
+      num *= n;
+    }
+    return num;
+  }
+
+  // true if the given number of rings covers all cells
+  bool covered(int rings) const
+  {
+    for (const auto& d : dims_) {
+      if (!d.is_angle || 2 * rings + 1 < d.num_cells) {
+        return false;
+      }
+    }
+    return true;
+  }
+
+  // call fn for the key of each cell within the given number of rings around
+  // center (each cell once); if only_outer, only for the cells on the outermost ring
+  template<typename F>
+  void forEachKey(const Key& center, int rings, bool only_outer, F fn) const
+  {
+    std::array<int, MAX_DIMS> lo;
+    std::array<int, MAX_DIMS> hi;
+    for (size_t i = 0; i < dims_.size(); ++i) {
+      lo[i] = -rings;
+      hi[i] = rings;
+      if (dims_[i].is_angle && 2 * rings + 1 >= dims_[i].num_cells) {
+        // visit each cell of the circle once
+        lo[i] = 0;
+        hi[i] = dims_[i].num_cells - 1;
+      }
+    }
+    std::array<int, MAX_DIMS> offset = lo;
+    Key k;
+    k.fill(0);
+    while (true) {
+      bool on_ring = false;
+      for (size_t i = 0; i < dims_.size(); ++i) {
+        if (dims_[i].is_angle && lo[i] == 0 && hi[i] == dims_[i].num_cells - 1) {
+          k[i] = offset[i];
+          // circular distance to the center cell
+          const int dist = std::abs(offset[i] - center[i]);
+          on_ring |= std::min(dist, dims_[i].num_cells - dist) == rings;
+        } else {
+          k[i] = center[i] + offset[i];
+          if (dims_[i].is_angle) {
+            k[i] = ((k[i] % dims_[i].num_cells) + dims_[i].num_cells) % dims_[i].num_cells;
+          }
+          on_ring |= std::abs(offset[i]) == rings;
+        }
+      }
+      if (!only_outer || on_ring || dims_.empty()) {
+        fn(static_cast<const Key&>(k));
+      }
+      // next offset
+      size_t i = 0;
+      for (; i < dims_.size(); ++i) {
+        if (offset[i] < hi[i]) {
+          ++offset[i];
+          break;
+        }
+        offset[i] = lo[i];
+      }
+      if (i == dims_.size()) {
+        break;
+      }
+    }
+  }
+
+private:
+  struct Dim
+  {
+    size_t coordinate;
+    float weight;
+    bool is_angle;
+    double cell_size;
+    int num_cells; // angles only
+  };
+
+  std::vector<Dim> dims_;
+  double resolution_;
+};
@@ -0,0 +1,114 @@
+#pragma once
+
+#include <atomic>
+#include <condition_variable>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+// Fixed set of worker threads to process loops in parallel. The calling
+// thread participates as thread 0, so a pool of size 1 has no workers.
+class ThreadPool
+{
+public:
+  explicit ThreadPool(size_t num_threads)
+    : fn_(nullptr)
+    , n_(0)
+    , next_(0)
+    , generation_(0)
+    , num_busy_(0)
+    , stop_(false)
+  {
+    for (size_t t = 1; t < num_threads; ++t) {
+      workers_.emplace_back(&ThreadPool::work, this, t);
+    }
+  }
+
+  ~ThreadPool()
+  {
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      stop_ = true;
+    }
+    start_cv_.notify_all();
+    for (auto& worker : workers_) {
+      worker.join();
+    }
+  }
+
+  ThreadPool(const ThreadPool&) = delete;
+  ThreadPool& operator=(const ThreadPool&) = delete;
+
+  size_t size() const
+  {
+    return workers_.size() + 1;
+  }
+
+  // calls fn(i, thread) for all i in [0, n), where thread is in [0, size());
+  // returns once all calls finished
+  void parallelFor(size_t n, const std::function<void(size_t, size_t)>& fn)
+  {
+    if (workers_.empty() || n <= 1) {
+      for (size_t i = 0; i < n; ++i) {
+        fn(i, 0);
+      }
+      return;
+    }
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      fn_ = &fn;
+      n_ = n;
+      next_ = 0;
+      num_busy_ = workers_.size();
+      ++generation_;
+    }
+    start_cv_.notify_all();
+    run(0);
+    std::unique_lock<std::mutex> lock(mutex_);
+    done_cv_.wait(lock, [this] { return num_busy_ == 0; });
+    fn_ = nullptr;
+  }
+
+private:
+  void run(size_t thread)
+  {
+    for (size_t i = next_++; i < n_; i = next_++) {
+      (*fn_)(i, thread);
+    }
+  }
+
+  void work(size_t thread)
+  {
+    size_t generation = 0;
+    while (true) {
+      {
+        std::unique_lock<std::mutex> lock(mutex_);
+        start_cv_.wait(lock, [&] { return stop_ || generation_ != generation; });
+        if (stop_) {
+          return;
+        }
+        generation = generation_;
+      }
+      run(thread);
+      {
+        std::lock_guard<std::mutex> lock(mutex_);
+        if (--num_busy_ == 0) {
+          done_cv_.notify_one();
+        }
+      }
+    }
+  }
+
+private:
+  std::vector<std::thread> workers_;
+  std::mutex mutex_;
+  std::condition_variable start_cv_;
+  std::condition_variable done_cv_;
+  const std::function<void(size_t, size_t)>* fn_;
+  size_t n_;
+  std::atomic<size_t> next_;
+  size_t generation_;
+  size_t num_busy_;
+  bool stop_;
+};
@@ -0,0 +1,320 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+sys.path.append(os.getcwd() + "/../scripts")
+from motionplanningutils import DBAstar, CollisionChecker
+import checker
+import numpy as np
+import pytest
+import yaml
+
+
+FILENAME_ENV = "../benchmark/unicycle_first_order_0/parallelpark_0.yaml"
+
+
+@pytest.fixture(scope="module")
+def motions():
+    # motions that (when chained) reproduce a known valid solution
+    return checker.extract_valid_motions(FILENAME_ENV, "../test/unicycle_first_order_0/parallelpark_0_sst.yaml", validity_checked=True)
+
+
+@pytest.fixture
+def load_dbastar(motions):
+    # DBAstar with the environment and motions loaded; configure(dbastar) is
+    # called before loading the environment, configure_env(dbastar) after
+    def load(configure=None, configure_env=None):
+        dbastar = DBAstar()
+        if configure is not None:
+            configure(dbastar)
+        dbastar.loadEnvironment(FILENAME_ENV)
+        if configure_env is not None:
+            configure_env(dbastar)
+        num_added = dbastar.addMotions(
+            [np.array(m["states"]) for m in motions],
+            [np.array(m["actions"]) for m in motions])
+        assert num_added == len(motions)
+        return dbastar
+    return load
+
+
+def test_dbastar_binding_unicycle_first_order_0_parallelpark_0(load_dbastar, motions):
+    assert len(motions) > 0
+
+    dbastar = load_dbastar()
+    assert dbastar.numMotions() == len(motions)
+
+    assert dbastar.plan(0.5, 1.0, 0.5, False)
+    solution = dbastar.getSolution()
+    states = solution["states"]
+    actions = solution["actions"]
+    assert states.shape[1] == 3
+    assert actions.shape[1] == 2
+    assert states.shape[0] == actions.shape[0] + 1
+    assert np.allclose(states[0], [0.7, 0.8, 0])
+    assert np.isclose(solution["cost"], actions.shape[0] * 0.1, atol=1e-4)
+    assert solution["motion_stats"].shape[1] == 2
+
+
+def test_dbastar_motion_library_unicycle_first_order_0_parallelpark_0(tmp_path, motions):
+    import motion_library
+
+    filename_library = tmp_path / "motions.mlib"
+    motion_library.write(filename_library, motions, "unicycle_first_order_0")
+
+    library = motion_library.MotionLibrary(filename_library)
+    assert len(library) == len(motions)
+    assert np.allclose(library[0]["states"], motions[0]["states"], atol=1e-6)
+    assert np.allclose(library[-1]["actions"], motions[-1]["actions"], atol=1e-6)
+    assert np.all(library.aabbs[:, 0:3] <= library.aabbs[:, 3:6])
+    assert [m["T"] for m in library] == [len(m["actions"]) for m in motions]
+
+    states, state_offsets, actions, action_offsets, aabbs = library.flat(1, 3)
+    assert len(state_offsets) == 3 and state_offsets[0] == 0
+    assert np.allclose(states[state_offsets[1]:state_offsets[2]], motions[2]["states"], atol=1e-6)
+    assert np.allclose(actions[action_offsets[0]:action_offsets[1]], motions[1]["actions"], atol=1e-6)
+
+    dbastar = DBAstar()
+    dbastar.loadEnvironment(FILENAME_ENV)
+    assert dbastar.addMotionsFromFile(str(filename_library)) == len(motions)
+    # the library is only read once
+    assert dbastar.addMotionsFromFile(str(filename_library)) == 0
+    assert dbastar.plan(0.5, 1.0, 0.5, False)
+
+    # ranges of the library, without a copy per motion
+    dbastar = DBAstar()
+    dbastar.loadEnvironment(FILENAME_ENV)
+    assert dbastar.addMotionsFlat(*library.flat(0, 2)) == 2
+    assert dbastar.addMotionsFlat(*library.flat(2, len(library))) == len(motions) - 2
+    assert dbastar.plan(0.5, 1.0, 0.5, False)
+
+
+def test_dbastar_threads_unicycle_first_order_0_parallelpark_0(load_dbastar):
+    solutions = []
+    for num_threads in [1, 4]:
+        dbastar = load_dbastar(lambda dbastar: dbastar.setNumThreads(num_threads))
+        assert dbastar.plan(0.5, 1.0, 0.5, False)
+        solutions.append(dbastar.getSolution())
+    # the search does not depend on the number of threads
+    assert np.allclose(solutions[0]["states"], solutions[1]["states"])
+    assert np.allclose(solutions[0]["actions"], solutions[1]["actions"])
+
+
+def test_dbastar_anytime_unicycle_first_order_0_parallelpark_0(load_dbastar):
+    dbastar = load_dbastar()
+
+    costs = []
+    def on_solution():
+        costs.append(dbastar.cost())
+        return True
+
+    assert dbastar.planAnytime(0.5, 2.0, 0.5, False, on_solution=on_solution)
+    assert len(costs) > 0
+    # each solution improves on the previous one
+    assert all(c1 > c2 for c1, c2 in zip(costs, costs[1:]))
+    assert np.isclose(dbastar.cost(), costs[-1])
+
+
+def test_dbastar_anytime_final_epsilon_unicycle_first_order_0_parallelpark_0(load_dbastar):
+    max_cost = 100.0
+    dbastar = load_dbastar()
+    assert dbastar.plan(0.5, 1.0, 0.5, False, max_cost)
+    cost = dbastar.cost()
+
+    # improved expanded nodes are re-opened before the anytime search ends
+    dbastar = load_dbastar()
+    assert dbastar.planAnytime(0.5, 3.0, 0.5, False, max_cost, final_epsilon=1.0, epsilon_step=1.0)
+    assert np.isclose(dbastar.cost(), cost)
+
+
+def test_dbastar_inflated_max_cost_unicycle_first_order_0_parallelpark_0(load_dbastar):
+    dbastar = load_dbastar()
+
+    assert dbastar.plan(0.5, 1.0, 0.5, False)
+    max_cost = dbastar.cost() * 1.01
+    # Euclidean heuristic of the start: distance to the goal / max speed (0.5 m/s)
+    h_start = np.linalg.norm(np.array([1.9, 0.3]) - np.array([0.7, 0.8])) / 0.5
+    # the inflated f-score of the start exceeds the bound, but the solution does not
+    epsilon = 2 * max_cost / h_start
+    assert epsilon > 1
+    assert dbastar.plan(0.5, epsilon, 0.5, False, max_cost)
+    assert dbastar.cost() <= max_cost
+
+
+def test_dbastar_grid_heuristic_unicycle_first_order_0_parallelpark_0(tmp_path, load_dbastar):
+    for _ in range(2):
+        # the second iteration loads the cached grid
+        dbastar = load_dbastar(configure_env=lambda dbastar: dbastar.setGridHeuristic(0.1, str(tmp_path)))
+        assert len(list(tmp_path.glob("*.bin"))) == 1
+        assert dbastar.plan(0.5, 1.0, 0.5, False)
+        assert dbastar.isExactSolution()
+
+
+def test_dbastar_search_stats_unicycle_first_order_0_parallelpark_0(tmp_path, load_dbastar):
+    dbastar = load_dbastar()
+    stats = []
+    for k in range(2):
+        assert dbastar.plan(0.5, 1.0, 0.5, False)
+        dbastar.writeResult(str(tmp_path / "result_{}.yaml".format(k)))
+        with open(tmp_path / "result_{}.yaml".format(k)) as f:
+            stats.append(yaml.safe_load(f)["search_stats"])
+    assert stats[0]["nodes"] > 0
+    assert stats[0]["peak_memory_kb"] > 0
+    # the second search reuses the memory of the first one
+    assert stats[1]["nodes"] == stats[0]["nodes"]
+    assert stats[1]["node_allocations"] == stats[0]["node_allocations"]
+
+
+def test_dbastar_lazy_unicycle_first_order_0_parallelpark_0(tmp_path, load_dbastar):
+    stats = []
+    for lazy in [False, True]:
+        dbastar = load_dbastar(lambda dbastar: dbastar.setLazy(lazy))
+        assert dbastar.plan(0.5, 1.0, 0.5, False)
+        assert dbastar.isExactSolution()
+        dbastar.writeResult(str(tmp_path / "result.yaml"))
+        with open(tmp_path / "result.yaml") as f:
+            stats.append(yaml.safe_load(f)["search_stats"])
+    assert stats[0]["collision_checks_saved"] == 0
+    assert stats[1]["collision_checks"] <= stats[0]["collision_checks"]
+
+
+def test_dbastar_start_goal_unicycle_first_order_0_parallelpark_0(load_dbastar):
+    with open(FILENAME_ENV) as f:
+        env = yaml.safe_load(f)
+
+    dbastar = load_dbastar()
+    start, goal = dbastar.getStartGoal()
+    assert np.allclose(start, env["robots"][0]["start"])
+    assert np.allclose(goal, env["robots"][0]["goal"])
+    assert dbastar.plan(0.5, 1.0, 0.5, False)
+    cost = dbastar.cost()
+
+    # queries reuse the environment and motions
+    dbastar.setStartGoal(env["robots"][0]["goal"], env["robots"][0]["start"])
+    start, goal = dbastar.getStartGoal()
+    assert np.allclose(start, env["robots"][0]["goal"])
+    assert np.allclose(goal, env["robots"][0]["start"])
+    for _ in range(2):
+        dbastar.setStartGoal(env["robots"][0]["start"], env["robots"][0]["goal"])
+        assert dbastar.plan(0.5, 1.0, 0.5, False)
+        assert np.isclose(dbastar.cost(), cost)
+    with pytest.raises(RuntimeError):
+        dbastar.setStartGoal([0, 0], [0, 0])
+    # a failed query keeps start and goal
+    start, goal = dbastar.getStartGoal()
+    assert np.allclose(start, env["robots"][0]["start"])
+    assert np.allclose(goal, env["robots"][0]["goal"])
+
+
+def test_dbastar_nearest_neighbors_unicycle_first_order_0_parallelpark_0(load_dbastar):
+    costs = []
+    for nearest_neighbors in ["gnat", "sqrtapprox", "grid"]:
+        dbastar = load_dbastar(lambda dbastar: dbastar.setNearestNeighbors(nearest_neighbors))
+        assert dbastar.plan(0.5, 1.0, 0.5, True)
+        costs.append(dbastar.cost())
+    # all data structures answer radius queries exactly
+    assert np.allclose(costs, costs[0])
+    with pytest.raises(RuntimeError):
+        DBAstar().setNearestNeighbors("kdtree")
+
+
+def test_dbastar_applicability_table_unicycle_first_order_0_parallelpark_0(load_dbastar):
+    results = []
+    for applicability_table in [False, True]:
+        dbastar = load_dbastar(lambda dbastar: dbastar.setApplicabilityTable(applicability_table))
+        assert dbastar.plan(0.5, 1.0, 0.5, True)
+        # the table is rebuilt for a different delta
+        assert dbastar.plan(0.4, 1.0, 0.5, True)
+        results.append((dbastar.cost(), dbastar.getSolution()["states"]))
+    # the table returns the same motions as T_m
+    assert np.isclose(results[0][0], results[1][0])
+    assert np.allclose(results[0][1], results[1][1])
+
+
+def test_dbastar_collision_cache_unicycle_first_order_0_parallelpark_0(tmp_path, load_dbastar):
+    results = []
+    for resolution in [0, 0.05]:
+        dbastar = load_dbastar(lambda dbastar: dbastar.setCollisionCache(resolution))
+        assert dbastar.plan(0.5, 1.0, 0.5, False)
+        dbastar.writeResult(str(tmp_path / "result.yaml"))
+        with open(tmp_path / "result.yaml") as f:
+            stats = yaml.safe_load(f)["search_stats"]
+        assert stats["collision_cache_hits"] == dbastar.collisionCacheHits()
+        assert stats["collision_cache_misses"] == dbastar.collisionCacheMisses()
+        results.append((dbastar.cost(), stats))
+    # cached results are conservative
+    assert np.isclose(results[0][0], results[1][0])
+    assert results[0][1]["collision_cache_misses"] == 0
+    assert results[1][1]["collision_cache_hits"] + results[1][1]["collision_cache_misses"] == results[1][1]["collision_checks"]
+
+
+def test_dbastar_sdf_unicycle_first_order_0_parallelpark_0(load_dbastar):
+    costs = []
+    for resolution in [0, 0.02]:
+        dbastar = load_dbastar(configure_env=lambda dbastar: dbastar.setSignedDistanceField(resolution))
+        assert dbastar.plan(0.5, 1.0, 0.5, False)
+        costs.append(dbastar.cost())
+    # FCL decides all cases that the distance field can't
+    assert np.isclose(costs[0], costs[1])
+
+
+def test_collision_checker_sdf_unicycle_first_order_0_parallelpark_0():
+    cc = CollisionChecker()
+    cc.load(FILENAME_ENV)
+    cc_sdf = CollisionChecker()
+    cc_sdf.load(FILENAME_ENV)
+    cc_sdf.setSignedDistanceField(0.02, 0.1)
+
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        state = [rng.uniform(0, 3), rng.uniform(0, 1.2), rng.uniform(-np.pi, np.pi)]
+        dist, _, _ = cc.distance(state)
+        dist_sdf, p_obs, p_robot = cc_sdf.distance(state)
+        if dist_sdf > 0.1:
+            # conservative bound far from obstacles
+            assert dist_sdf <= dist + 1e-4
+            assert np.dot(p_robot - p_obs, p_robot - p_obs) > 0
+        else:
+            assert np.isclose(dist_sdf, dist, atol=1e-4)
+
+
+def test_collision_checker_distance_batch_unicycle_first_order_0_parallelpark_0():
+    cc = CollisionChecker()
+    cc.load(FILENAME_ENV)
+
+    rng = np.random.default_rng(0)
+    states = np.column_stack([rng.uniform(0, 3, 100), rng.uniform(0, 1.2, 100), rng.uniform(-np.pi, np.pi, 100)])
+    for num_threads in [1, 4]:
+        dists, p_obs, p_robot = cc.distance_batch(states, num_threads)
+        assert dists.shape == (100,)
+        assert p_obs.shape == (100, 3)
+        assert p_robot.shape == (100, 3)
+        for t in range(states.shape[0]):
+            dist, p_o, p_r = cc.distance(states[t])
+            assert np.isclose(dists[t], dist)
+            assert np.allclose(p_obs[t], p_o)
+            assert np.allclose(p_robot[t], p_r)
+    with pytest.raises(RuntimeError):
+        cc.distance_batch(np.zeros((10, 2)))
+
+
+def test_collision_checker_distance_batch_threads_unicycle_first_order_0_parallelpark_0():
+    # distance_batch releases the GIL; concurrent calls on the same checker
+    # (with different numbers of threads, and scalar calls in between) must
+    # not interfere
+    from concurrent.futures import ThreadPoolExecutor
+    cc = CollisionChecker()
+    cc.load(FILENAME_ENV)
+
+    rng = np.random.default_rng(0)
+    states = np.column_stack([rng.uniform(0, 3, 1000), rng.uniform(0, 1.2, 1000), rng.uniform(-np.pi, np.pi, 1000)])
+    expected = cc.distance_batch(states, 1)
+
+    def run(k):
+        dist, _, _ = cc.distance(states[k])
+        assert np.isclose(dist, expected[0][k])
+        return cc.distance_batch(states, 1 + k % 4)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for result in executor.map(run, range(16)):
+            for array, expected_array in zip(result, expected):
+                assert np.array_equal(array, expected_array)
@@ -8,6 +8,9 @@ import robots
 import numpy as np
 import subprocess as sp
 from main_komo import run_komo
+import checker
+import yaml
+import jax
 
 
 
@@ -25,6 +28,81 @@ def _test_dynamics_cpp_py(robot_type):
         assert np.allclose(next_state_cpp, next_state_py, rtol=1.e-4, atol=1.e-7)
 
 
+def _test_batch_cpp(robot_type):
+    robot_cpp = RobotHelper(robot_type)
+    dt = robots.create_robot(robot_type).dt
+
+    N = 20
+    states = np.array([robot_cpp.sampleUniform() for _ in range(N)])
+    goals = np.array([robot_cpp.sampleUniform() for _ in range(N)])
+    actions = np.array([robot_cpp.sampleControlUniform() for _ in range(N)])
+    t = np.linspace(0, 1, N)
+
+    next_states = robot_cpp.step_batch(states, actions, dt)
+    distances = robot_cpp.distance_batch(states, goals)
+    interpolated = robot_cpp.interpolate_batch(states, goals, t)
+    for i in range(N):
+        assert np.allclose(next_states[i], robot_cpp.step(states[i], actions[i], dt))
+        assert np.isclose(distances[i], robot_cpp.distance(states[i], goals[i]), rtol=1.e-5)
+        assert np.allclose(interpolated[i], robot_cpp.interpolate(states[i], goals[i], t[i]))
+
+    # a single state is only accepted as x0 of rollout
+    with pytest.raises(RuntimeError):
+        robot_cpp.step_batch(states[0], actions[0:1], dt)
+
+    rollout = robot_cpp.rollout(states[0], actions, dt)
+    assert rollout.shape == (N + 1, states.shape[1])
+    assert np.allclose(rollout[0], states[0])
+    for i in range(N):
+        assert np.allclose(rollout[i+1], robot_cpp.step(rollout[i], actions[i], dt))
+
+
+def _test_batch_threads_cpp(robot_type):
+    # the batch methods release the GIL; concurrent calls on the same
+    # RobotHelper (and scalar calls in between) must not interfere
+    from concurrent.futures import ThreadPoolExecutor
+    robot_cpp = RobotHelper(robot_type)
+    dt = robots.create_robot(robot_type).dt
+
+    N = 1000
+    states = np.array([robot_cpp.sampleUniform() for _ in range(N)])
+    goals = np.array([robot_cpp.sampleUniform() for _ in range(N)])
+    actions = np.array([robot_cpp.sampleControlUniform() for _ in range(N)])
+    expected_next_states = robot_cpp.step_batch(states, actions, dt)
+    expected_distances = robot_cpp.distance_batch(states, goals)
+
+    def run(k):
+        robot_cpp.step(states[k], actions[k], dt)
+        return robot_cpp.step_batch(states, actions, dt), robot_cpp.distance_batch(states, goals)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for next_states, distances in executor.map(run, range(16)):
+            assert np.array_equal(next_states, expected_next_states)
+            assert np.array_equal(distances, expected_distances)
+
+
+def _test_rollout_linearize_py(robot_type):
+    robot = robots.create_robot(robot_type)
+    robot_cpp = RobotHelper(robot_type)
+
+    T = 10
+    x0 = np.array(robot_cpp.sampleUniform())
+    actions = np.array([robot_cpp.sampleControlUniform() for _ in range(T)])
+
+    states = robot.rollout(x0, actions)
+    assert states.shape == (T + 1, len(robot.state_desc))
+    assert np.allclose(states[0], x0, rtol=1.e-4, atol=1.e-7)
+    for t in range(T):
+        assert np.allclose(states[t+1], robot.step(states[t], actions[t]), rtol=1.e-4, atol=1.e-7)
+
+    f, A, B = robot.linearize_trajectory(states, actions)
+    assert np.allclose(f, states[1:], rtol=1.e-4, atol=1.e-7)
+    assert A.shape == (T, len(robot.state_desc), len(robot.state_desc))
+    assert B.shape == (T, len(robot.state_desc), len(robot.action_desc))
+    assert np.allclose(A[3], jax.jacfwd(robot.step, 0)(states[3], actions[3]), rtol=1.e-4, atol=1.e-7)
+    assert np.allclose(B[3], jax.jacfwd(robot.step, 1)(states[3], actions[3]), rtol=1.e-4, atol=1.e-7)
+
+
 def _test_dynamics_cpp_komo(robot_type, instance):
     # the key idea is to use a (correct) solution as computed by sst
     # and let KOMO verify that this does not violate any constraints
@@ -42,6 +120,42 @@ def test_dynamics_cpp_py_unicycle_first_order_0():
     _test_dynamics_cpp_py('unicycle_first_order_0')
 
 
+def test_batch_cpp_unicycle_first_order_0():
+    _test_batch_cpp('unicycle_first_order_0')
+
+
+def test_batch_cpp_car_first_order_with_1_trailers_0():
+    _test_batch_cpp('car_first_order_with_1_trailers_0')
+
+
+def test_batch_threads_cpp_unicycle_first_order_0():
+    _test_batch_threads_cpp('unicycle_first_order_0')
+
+
+def test_check_trajectory_unicycle_first_order_0():
+    filename = "../test/unicycle_first_order_0/kink_0_sst.yaml"
+    with open(filename) as f:
+        result = yaml.safe_load(f)["result"][0]
+    states = np.array(result["states"])
+    actions = np.array(result["actions"])
+
+    checks = checker.check_trajectory('unicycle_first_order_0', states, actions)
+    assert checks["valid"].all()
+
+    # a wrong state breaks the dynamics before and after it
+    states[10, 0] += 0.5
+    checks = checker.check_trajectory('unicycle_first_order_0', states, actions)
+    assert list(np.flatnonzero(~checks["valid"])) == [9, 10]
+
+
+def test_rollout_linearize_py_unicycle_first_order_0():
+    _test_rollout_linearize_py('unicycle_first_order_0')
+
+
+def test_rollout_linearize_py_quadrotor_0():
+    _test_rollout_linearize_py('quadrotor_0')
+
+
 def test_dynamics_cpp_komo_unicycle_first_order_0_parallelpark_0():
     _test_dynamics_cpp_komo('unicycle_first_order_0', 'parallelpark_0')
 
@@ -0,0 +1,46 @@
+import sys
+import os
+import subprocess
+import tempfile
+sys.path.append(os.getcwd() + "/../scripts")
+import horizon_search
+
+
+def _probe_command(T):
+    # succeeds for T >= 37
+    return [sys.executable, "-c", "import sys; sys.exit(0 if {} >= 37 else 1)".format(T)]
+
+
+def test_binary_search():
+    best_T, probes = horizon_search.search(_probe_command, 5, None, "binarySearch", 1)
+    assert best_T == 37
+
+
+def test_binary_search_parallel():
+    best_T, probes = horizon_search.search(_probe_command, 5, 100, "binarySearch", 4)
+    assert best_T == 37
+    assert all(p["result"] != "success" or p["T"] >= 37 for p in probes)
+
+
+def test_linear_candidates():
+    best_T, probes = horizon_search.search(_probe_command, 30, 44, "linear", 3, candidates=[30, 37, 44])
+    assert best_T == 37
+    assert {p["T"] for p in probes} <= {30, 37, 44}
+
+
+def test_linear_reverse():
+    best_T, probes = horizon_search.search(_probe_command, 1, 45, "linearReverse", 4)
+    assert best_T == 37
+
+
+def test_scp_probe():
+    # tests run from the build directory, where main_scp.py does not exist
+    from main_scp import scp_probe_command
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        filename_result = os.path.join(tmpdirname, "result.yaml")
+        cmd = scp_probe_command("../benchmark/unicycle_first_order_0/kink_0.yaml",
+                                "../test/unicycle_first_order_0/scp_kink_0_sol0.yaml",
+                                151, filename_result, "osqp")
+        result = subprocess.run(cmd)
+        assert result.returncode == 0
+        assert os.path.exists(filename_result)
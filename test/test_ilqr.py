@@ -0,0 +1,41 @@
+import sys
+import os
+import pytest
+sys.path.append(os.getcwd() + "/../scripts")
+from main_ilqr import run_ilqr
+import checker
+
+
+def _run_check(filename_env: str, filename_guess: str, filename_result: str, free_time: bool = False):
+    result = run_ilqr(filename_env,
+                        filename_guess,
+                        filename_result,
+                        free_time=free_time)
+    assert result == True
+    result = checker.check(filename_env, filename_result)
+    assert result == True
+
+
+def test_unicycle_first_order_0_parallelpark_0():
+    _run_check("../benchmark/unicycle_first_order_0/parallelpark_0.yaml",
+             "../test/unicycle_first_order_0/guess_parallelpark_0_sol0.yaml",
+             "tmp.yaml")
+
+
+def test_unicycle_first_order_0_kink_0():
+    _run_check("../benchmark/unicycle_first_order_0/kink_0.yaml",
+               "../test/unicycle_first_order_0/guess_kink_0_sol0.yaml",
+               "tmp.yaml")
+
+
+def test_unicycle_second_order_0_parallelpark_0():
+    _run_check("../benchmark/unicycle_second_order_0/parallelpark_0.yaml",
+               "../test/unicycle_second_order_0/guess_parallelpark_0_sol0.yaml",
+               "tmp.yaml")
+
+
+def test_unicycle_first_order_0_kink_0_free_time():
+    _run_check("../benchmark/unicycle_first_order_0/kink_0.yaml",
+               "../test/unicycle_first_order_0/guess_kink_0_sol0.yaml",
+               "tmp.yaml",
+               free_time=True)
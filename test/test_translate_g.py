@@ -0,0 +1,26 @@
+import sys
+import os
+import tempfile
+sys.path.append(os.getcwd() + "/../scripts")
+import translate_g
+
+
+def test_write_cached():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        filename_env = "../benchmark/unicycle_first_order_0/kink_0.yaml"
+        filename_g = translate_g.write_cached(filename_env, cache_dir)
+        assert translate_g.write_cached(filename_env, cache_dir) == filename_g
+
+        filename_ref = os.path.join(cache_dir, "ref.g")
+        translate_g.write(filename_env, filename_ref)
+        with open(filename_g) as f, open(filename_ref) as f_ref:
+            assert f.read() == f_ref.read()
+
+
+def test_write_cfg_cached_size():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        filenames = [translate_g.write_cfg_cached("opt: {}".format(i), cache_dir, 2) for i in range(4)]
+        assert len(set(filenames)) == 4
+        assert len(os.listdir(cache_dir)) == 2
+        with open(filenames[-1]) as f:
+            assert f.read() == "opt: 3"